@@ -0,0 +1,101 @@
+from bisect import bisect_right
+from collections import deque
+from contextvars import ContextVar
+import copy
+import hashlib
+import logging
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Пользователь, для которого идут запросы к таблице (ставит StorageUserMiddleware)
+current_user = ContextVar('sheets_user', default=None)
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+
+class HashRing:
+    """Consistent hashing: each node owns `replicas` points on a ring
+
+    Adding or removing a node only moves the keys next to its points, so
+    most users keep their account when the pool changes.
+    """
+
+    def __init__(self, nodes, replicas=64):
+        points = sorted((_hash(f"{node}#{i}"), node) for node in nodes for i in range(replicas))
+        self._hashes = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def nodes_for(self, key):
+        """Distinct nodes in ring order starting from the key's owner"""
+        if not self._nodes:
+            return []
+        start = bisect_right(self._hashes, _hash(key))
+        seen = []
+        for index in range(len(self._nodes)):
+            node = self._nodes[(start + index) % len(self._nodes)]
+            if node not in seen:
+                seen.append(node)
+        return seen
+
+
+class AccountPool:
+    """Google API identities sharing the Sheets traffic
+
+    A key (spreadsheet and user) is served by its owner on the hash ring.
+    When the owner has used its per-minute quota, or was throttled (429)
+    and is cooling down, the call moves to the next account on the ring,
+    so the load spreads over the pool instead of waiting for one quota.
+    """
+
+    def __init__(self, clients, quota_per_minute=None, cooldown_seconds=60.0):
+        # name -> gspread HTTPClient
+        self.clients = dict(clients)
+        self.quota_per_minute = quota_per_minute
+        self.cooldown_seconds = cooldown_seconds
+        self.ring = HashRing(self.clients)
+        self._calls = {name: deque() for name in self.clients}
+        self._cooling_until = {name: 0.0 for name in self.clients}
+
+    def __len__(self):
+        return len(self.clients)
+
+    def _used(self, name, now):
+        calls = self._calls[name]
+        while calls and now - calls[0] >= 60:
+            calls.popleft()
+        return len(calls)
+
+    def _available(self, name, now):
+        if now < self._cooling_until[name]:
+            return False
+        return not self.quota_per_minute or self._used(name, now) < self.quota_per_minute
+
+    def choose(self, key):
+        """Account for the next call on a key, recorded as used"""
+        now = time.monotonic()
+        candidates = self.ring.nodes_for(key)
+        name = next((name for name in candidates if self._available(name, now)), None)
+        if name is None:
+            # Все заняты - тот, чья квота освободится раньше
+            name = min(candidates, key=lambda n: (self._cooling_until[n], self._used(n, now)))
+        if name != candidates[0]:
+            metrics.SHEETS_REROUTED.inc(account=name)
+        self._calls[name].append(now)
+        metrics.SHEETS_ACCOUNT_CALLS.inc(account=name)
+        return name
+
+    def throttled(self, name):
+        """The account got a 429: route its keys elsewhere for a while"""
+        self._cooling_until[name] = time.monotonic() + self.cooldown_seconds
+        logger.warning(f"⏳ Google account {name} is throttled, moving its traffic for {self.cooldown_seconds:g}s")
+
+    def bind(self, target, name):
+        """Copy of a gspread Spreadsheet/Worksheet sending its requests as the account"""
+        bound = copy.copy(target)
+        bound.client = self.clients[name]
+        return bound
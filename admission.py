@@ -0,0 +1,109 @@
+from collections import deque
+import asyncio
+import logging
+import time
+
+import metrics
+from config import (
+    ADMISSION_MAX_IN_FLIGHT, ADMISSION_MAX_PER_USER, ADMISSION_MAX_QUEUED_PER_USER, ADMISSION_QUEUE_SIZE
+)
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionController:
+    """Limits updates being handled, globally and per user
+
+    An update runs when fewer than max_in_flight updates run in total and
+    fewer than max_per_user run for its user. Otherwise it waits in one
+    FIFO queue of queue_size places; waiters whose user is at the limit
+    are skipped, not blocking the others. A user may hold at most
+    max_queued_per_user of those places, so one flooding chat is shed
+    before it fills the queue for everyone. When either bound is hit the
+    update is rejected right away.
+    """
+
+    def __init__(self, max_in_flight=32, max_per_user=2, queue_size=64, max_queued_per_user=4):
+        self.max_in_flight = max_in_flight
+        self.max_per_user = max_per_user
+        self.queue_size = queue_size
+        self.max_queued_per_user = max_queued_per_user
+        self.in_flight = 0
+        self._users = {}
+        self._queued = {}
+        self._waiters = deque()
+
+    def _can_run(self, user_id):
+        return self.in_flight < self.max_in_flight and self._users.get(user_id, 0) < self.max_per_user
+
+    def _start(self, user_id):
+        self.in_flight += 1
+        self._users[user_id] = self._users.get(user_id, 0) + 1
+        metrics.ADMISSION_IN_FLIGHT.set(self.in_flight)
+
+    async def acquire(self, user_id):
+        """Wait for a slot, False if the update has to be shed"""
+        # Очередь других пользователей не мешает: их ждущие заблокированы своим лимитом,
+        # свободный общий слот им и так выдал бы _grant
+        if not self._queued.get(user_id) and self._can_run(user_id):
+            self._start(user_id)
+            return True
+
+        # Сначала лимит пользователя: его поток не должен вытеснять остальных
+        if self._queued.get(user_id, 0) >= self.max_queued_per_user:
+            metrics.ADMISSION_SHED.inc(reason='user')
+            return False
+        if len(self._waiters) >= self.queue_size:
+            metrics.ADMISSION_SHED.inc(reason='queue')
+            return False
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = (user_id, future)
+        self._waiters.append(waiter)
+        self._queued[user_id] = self._queued.get(user_id, 0) + 1
+        metrics.ADMISSION_QUEUE.set(len(self._waiters))
+        started = time.perf_counter()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Слот уже выдан - вернуть его
+                self.release(user_id)
+            else:
+                self._dequeue(waiter)
+                metrics.ADMISSION_QUEUE.set(len(self._waiters))
+            raise
+        finally:
+            metrics.ADMISSION_WAIT.observe(time.perf_counter() - started)
+        return True
+
+    def _dequeue(self, waiter):
+        self._waiters.remove(waiter)
+        user_id = waiter[0]
+        self._queued[user_id] -= 1
+        if not self._queued[user_id]:
+            del self._queued[user_id]
+
+    def release(self, user_id):
+        self.in_flight -= 1
+        self._users[user_id] -= 1
+        if not self._users[user_id]:
+            del self._users[user_id]
+        metrics.ADMISSION_IN_FLIGHT.set(self.in_flight)
+        self._grant()
+
+    def _grant(self):
+        for waiter in list(self._waiters):
+            if self.in_flight >= self.max_in_flight:
+                break
+            user_id, future = waiter
+            if self._can_run(user_id):
+                self._dequeue(waiter)
+                self._start(user_id)
+                future.set_result(None)
+        metrics.ADMISSION_QUEUE.set(len(self._waiters))
+
+
+admission = AdmissionController(
+    ADMISSION_MAX_IN_FLIGHT, ADMISSION_MAX_PER_USER, ADMISSION_QUEUE_SIZE, ADMISSION_MAX_QUEUED_PER_USER
+)
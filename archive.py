@@ -0,0 +1,136 @@
+from array import array
+from bisect import bisect_left
+import logging
+import mmap
+import os
+import struct
+import zlib
+
+from models import Shift, month_bounds, month_key
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'TSA1'
+_HEADER = struct.Struct('<4sI')
+_BLOCK = struct.Struct('<I')
+# Column order inside a file; -1 stands for a missing amount, as in pack_shifts
+COLUMNS = ('day', 'start', 'end', 'revenue', 'tips')
+
+
+def encode_month(shifts):
+    """Archive file contents: header, then one zlib-compressed int64 array per column"""
+    shifts = sorted(shifts, key=lambda shift: shift.day)
+    parts = [_HEADER.pack(MAGIC, len(shifts))]
+    for name in COLUMNS:
+        values = array('q', (-1 if getattr(shift, name) is None else getattr(shift, name) for shift in shifts))
+        block = zlib.compress(values.tobytes(), 9)
+        parts.append(_BLOCK.pack(len(block)))
+        parts.append(block)
+    return b''.join(parts)
+
+
+def decode_columns(buffer):
+    """Column arrays of an archive file (buffer may be an mmap)"""
+    magic, rows = _HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a shift archive")
+    offset = _HEADER.size
+    columns = []
+    for _ in COLUMNS:
+        (size,) = _BLOCK.unpack_from(buffer, offset)
+        offset += _BLOCK.size
+        values = array('q')
+        values.frombytes(zlib.decompress(buffer[offset:offset + size]))
+        if len(values) != rows:
+            raise ValueError("Corrupted shift archive column")
+        columns.append(values)
+        offset += size
+    return columns
+
+
+class ShiftArchive:
+    """Closed months of shifts, one immutable columnar file per month
+
+    Files are written once (atomically, via rename) and only replaced when
+    a month is archived again, so decoded columns are cached per file.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._columns = {}
+        self.months = set()
+        for name in os.listdir(directory):
+            if name.startswith('shifts-') and name.endswith('.tsa'):
+                self.months.add(name[len('shifts-'):-len('.tsa')])
+        if self.months:
+            logger.info(f"📦 Shift archive: {len(self.months)} months in {directory}")
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"shifts-{key}.tsa")
+
+    def has(self, day):
+        """True if the day's month is archived"""
+        return month_key(day) in self.months
+
+    def write(self, key, shifts):
+        path = self._path(key)
+        tmp = f"{path}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(encode_month(shifts))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        self._columns.pop(key, None)
+        self.months.add(key)
+
+    def remove(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+        self._columns.pop(key, None)
+        self.months.discard(key)
+
+    def columns(self, key):
+        """(day, start, end, revenue, tips) arrays of an archived month"""
+        columns = self._columns.get(key)
+        if columns is None:
+            with open(self._path(key), 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                columns = self._columns[key] = decode_columns(buffer)
+        return columns
+
+    def month(self, key):
+        """Shifts of an archived month ordered by day"""
+        return [
+            Shift(day, start, end, None if revenue < 0 else revenue, None if tips < 0 else tips)
+            for day, start, end, revenue, tips in zip(*self.columns(key))
+        ]
+
+    def shifts(self, first_day=None, last_day=None):
+        """Archived shifts in a day range (inclusive, None - unbounded) ordered by day"""
+        result = []
+        for key in sorted(self.months):
+            first, last = month_bounds(key)
+            if (first_day is not None and last < first_day) or (last_day is not None and first > last_day):
+                continue
+            shifts = self.month(key)
+            if first_day is not None or last_day is not None:
+                shifts = [
+                    shift for shift in shifts
+                    if (first_day is None or shift.day >= first_day) and (last_day is None or shift.day <= last_day)
+                ]
+            result.extend(shifts)
+        return result
+
+    def shift(self, day):
+        """Archived shift of a day or None"""
+        key = month_key(day)
+        if key not in self.months:
+            return None
+        columns = self.columns(key)
+        index = bisect_left(columns[0], day)
+        if index == len(columns[0]) or columns[0][index] != day:
+            return None
+        day, start, end, revenue, tips = (column[index] for column in columns)
+        return Shift(day, start, end, None if revenue < 0 else revenue, None if tips < 0 else tips)
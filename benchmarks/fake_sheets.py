@@ -0,0 +1,512 @@
+"""In-process fake of the Google Sheets REST API.
+
+The fake is mounted as a requests transport adapter, so a real gspread
+client talks to it over the same HTTP calls it would send to Google:
+values.get/update/append, values:batchGet/batchUpdate/batchClear, spreadsheets.get,
+spreadsheets:batchUpdate (sheets, rows, sorting, updateCells) and Drive files.get (modifiedTime only). Latency, per-account quotas (429) and random
+server errors can be simulated; every request is counted by API method.
+"""
+from collections import Counter, deque
+from urllib.parse import unquote, urlparse, parse_qs
+import datetime
+import json
+import random
+import re
+import threading
+import time
+
+import gspread
+import requests
+from requests.adapters import BaseAdapter
+
+SHEETS_PREFIX = '/v4/spreadsheets/'
+DRIVE_PREFIX = '/drive/v3/files/'
+
+_CELL_RE = re.compile(r'^([A-Z]*)(\d*)$')
+
+
+def _column_index(letters):
+    index = 0
+    for char in letters:
+        index = index * 26 + (ord(char) - ord('A') + 1)
+    return index
+
+
+def _column_letters(index):
+    letters = ''
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(ord('A') + rem) + letters
+    return letters
+
+
+def _split_range(range_name):
+    """Split "'Title'!A1:B2" into (title, 'A1:B2' or '')"""
+    if '!' in range_name:
+        title, cells = range_name.rsplit('!', 1)
+    else:
+        title, cells = range_name, ''
+    if title.startswith("'") and title.endswith("'"):
+        title = title[1:-1].replace("''", "'")
+    return title, cells
+
+
+def _parse_cells(cells, row_count, col_count):
+    """A1 notation -> zero-based (row0, col0, row1, col1), end exclusive"""
+    if not cells:
+        return 0, 0, row_count, col_count
+    parts = cells.split(':')
+    start = _CELL_RE.match(parts[0])
+    end = _CELL_RE.match(parts[-1])
+    start_col = _column_index(start.group(1)) - 1 if start.group(1) else 0
+    start_row = int(start.group(2)) - 1 if start.group(2) else 0
+    end_col = _column_index(end.group(1)) if end.group(1) else col_count
+    end_row = int(end.group(2)) if end.group(2) else row_count
+    return start_row, start_col, end_row, end_col
+
+
+def _render(value, render_option):
+    if render_option == 'UNFORMATTED_VALUE':
+        if isinstance(value, str):
+            try:
+                return float(value) if '.' in value else int(value)
+            except ValueError:
+                return value
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _cell_value(cell):
+    """Stored value of an updateCells CellData, dates and times as typed text"""
+    entered = cell.get('userEnteredValue', {})
+    if 'numberValue' not in entered:
+        return next(iter(entered.values()), '')
+    number = entered['numberValue']
+    pattern = cell.get('userEnteredFormat', {}).get('numberFormat', {}).get('type')
+    if pattern == 'DATE':
+        day = datetime.date(1899, 12, 30) + datetime.timedelta(days=int(number))
+        return day.strftime('%d.%m.%Y')
+    if pattern == 'TIME':
+        minutes = round(number * 1440) % 1440
+        return f'{minutes // 60:02d}:{minutes % 60:02d}'
+    return number
+
+
+def _sort_key(value):
+    """Sheets order: numbers and dates (dd.mm.yyyy typed in) first, then text, blanks last"""
+    if value in ('', None):
+        return (2, '')
+    if isinstance(value, (int, float)):
+        return (0, value)
+    match = re.match(r'^(\d{2})\.(\d{2})\.(\d{4})$', value)
+    if match:
+        day, month, year = map(int, match.groups())
+        return (0, year * 10000 + month * 100 + day)
+    try:
+        return (0, float(value))
+    except ValueError:
+        return (1, value)
+
+
+def _trim(rows):
+    """Drop trailing empty cells and rows, like the real API does"""
+    trimmed = []
+    for row in rows:
+        while row and row[-1] in ('', None):
+            row = row[:-1]
+        trimmed.append(row)
+    while trimmed and not trimmed[-1]:
+        trimmed.pop()
+    return trimmed
+
+
+class FakeSheet:
+    def __init__(self, sheet_id, title, rows=1000, cols=26):
+        self.sheet_id = sheet_id
+        self.title = title
+        self.row_count = rows
+        self.col_count = cols
+        self.values = []
+
+    def properties(self, index):
+        return {
+            'sheetId': self.sheet_id,
+            'title': self.title,
+            'index': index,
+            'sheetType': 'GRID',
+            'gridProperties': {'rowCount': self.row_count, 'columnCount': self.col_count}
+        }
+
+    def read(self, cells, render_option=None):
+        row0, col0, row1, col1 = _parse_cells(cells, self.row_count, self.col_count)
+        rows = [
+            [_render(value, render_option) for value in row[col0:col1]]
+            for row in self.values[row0:row1]
+        ]
+        return _trim(rows)
+
+    def write(self, cells, values):
+        row0, col0, _, _ = _parse_cells(cells, self.row_count, self.col_count)
+        for r, row in enumerate(values):
+            target = row0 + r
+            if target >= self.row_count:
+                raise ValueError('Range exceeds grid limits')
+            while len(self.values) <= target:
+                self.values.append([])
+            current = self.values[target]
+            needed = col0 + len(row)
+            if len(current) < needed:
+                current.extend([''] * (needed - len(current)))
+            for offset, value in enumerate(row):
+                # null в values API пропускает ячейку
+                if value is not None:
+                    current[col0 + offset] = value
+        return row0, col0, row0 + len(values), col0 + max((len(r) for r in values), default=0)
+
+    def last_data_row(self):
+        for index in range(len(self.values) - 1, -1, -1):
+            if any(v not in ('', None) for v in self.values[index]):
+                return index + 1
+        return 0
+
+    def a1(self, row0, col0, row1, col1):
+        return f"'{self.title}'!{_column_letters(col0 + 1)}{row0 + 1}:{_column_letters(col1)}{row1}"
+
+
+class FakeSpreadsheet:
+    def __init__(self, spreadsheet_id, title='Tanuki'):
+        self.id = spreadsheet_id
+        self.title = title
+        self.sheets = []
+        self._next_sheet_id = 0
+        # Drive modifiedTime: moves on every change, tests call touch() after editing values by hand
+        self.revision = 0
+
+    def touch(self):
+        self.revision += 1
+
+    @property
+    def modified_time(self):
+        seconds, millis = divmod(self.revision, 1000)
+        return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(1_700_000_000 + seconds)) + f'.{millis:03d}Z'
+
+    def add_sheet(self, title, rows=1000, cols=26):
+        if self.find_sheet(title):
+            raise KeyError(f'A sheet with the name "{title}" already exists')
+        sheet = FakeSheet(self._next_sheet_id, title, rows, cols)
+        self._next_sheet_id += 1
+        self.sheets.append(sheet)
+        return sheet
+
+    def find_sheet(self, title=None, sheet_id=None):
+        for sheet in self.sheets:
+            if title is not None and sheet.title == title:
+                return sheet
+            if sheet_id is not None and sheet.sheet_id == sheet_id:
+                return sheet
+        return None
+
+    def metadata(self):
+        return {
+            'spreadsheetId': self.id,
+            'properties': {'title': self.title, 'locale': 'ru_RU', 'timeZone': 'Europe/Moscow'},
+            'sheets': [{'properties': sheet.properties(i)} for i, sheet in enumerate(self.sheets)]
+        }
+
+
+class FakeSheetsServer:
+    """State and behaviour of the fake API, shared by all mounted clients"""
+
+    def __init__(self, latency=0.0, jitter=0.0, quota_per_minute=None, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.quota_per_minute = quota_per_minute
+        self.error_rate = error_rate
+        self.spreadsheets = {}
+        self.calls = Counter()
+        self.throttled = Counter()
+        self._windows = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def create_spreadsheet(self, spreadsheet_id, title='Tanuki'):
+        spreadsheet = FakeSpreadsheet(spreadsheet_id, title)
+        self.spreadsheets[spreadsheet_id] = spreadsheet
+        return spreadsheet
+
+    def reset_counters(self):
+        self.calls.clear()
+        self.throttled.clear()
+
+    @property
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    def client(self, account='default'):
+        """gspread client whose HTTP traffic is served by this fake"""
+        session = requests.Session()
+        adapter = FakeSheetsAdapter(self, account)
+        session.mount('https://sheets.googleapis.com/', adapter)
+        session.mount('https://www.googleapis.com/', adapter)
+        return gspread.Client(auth=None, session=session)
+
+    def _over_quota(self, account):
+        if not self.quota_per_minute:
+            return False
+        now = time.monotonic()
+        window = self._windows.setdefault(account, deque())
+        while window and now - window[0] >= 60:
+            window.popleft()
+        if len(window) >= self.quota_per_minute:
+            return True
+        window.append(now)
+        return False
+
+    def handle(self, method, url, body, account):
+        """Dispatch one HTTP request, returns (status, payload)"""
+        if self.latency or self.jitter:
+            time.sleep(self.latency + self._random.random() * self.jitter)
+
+        parsed = urlparse(url)
+        query = parse_qs(parsed.query)
+        params = {k: v[-1] for k, v in query.items()}
+        params['ranges'] = query.get('ranges', [])
+        path = parsed.path
+
+        with self._lock:
+            if self._over_quota(account):
+                self.throttled[account] += 1
+                return 429, _error(429, 'Quota exceeded for quota metric', 'RESOURCE_EXHAUSTED')
+            if self.error_rate and self._random.random() < self.error_rate:
+                return 503, _error(503, 'The service is currently unavailable.', 'UNAVAILABLE')
+            try:
+                return self._route(method, path, params, body)
+            except KeyError as e:
+                return 404, _error(404, str(e), 'NOT_FOUND')
+            except ValueError as e:
+                return 400, _error(400, str(e), 'INVALID_ARGUMENT')
+
+    def _route(self, method, path, params, body):
+        if path.startswith(DRIVE_PREFIX):
+            self.calls['drive.files.get'] += 1
+            spreadsheet = self._spreadsheet(path[len(DRIVE_PREFIX):])
+            return 200, {
+                'id': spreadsheet.id, 'name': spreadsheet.title,
+                'createdTime': '2023-11-14T22:13:20.000Z', 'modifiedTime': spreadsheet.modified_time
+            }
+        if not path.startswith(SHEETS_PREFIX):
+            raise KeyError(f'Unknown endpoint {path}')
+        rest = path[len(SHEETS_PREFIX):]
+
+        if '/values' in rest:
+            spreadsheet_id, tail = rest.split('/values', 1)
+            spreadsheet = self._spreadsheet(spreadsheet_id)
+            if tail == ':batchGet':
+                return self._batch_get(spreadsheet, params)
+            if tail == ':batchUpdate':
+                return self._batch_update_values(spreadsheet, body)
+            if tail == ':batchClear':
+                return self._batch_clear(spreadsheet, body)
+            range_name = unquote(tail.lstrip('/'))
+            if range_name.endswith(':append'):
+                return self._append(spreadsheet, range_name[:-len(':append')], body)
+            if method == 'GET':
+                return self._get(spreadsheet, range_name, params)
+            return self._update(spreadsheet, range_name, body)
+
+        if rest.endswith(':batchUpdate'):
+            return self._batch_update(self._spreadsheet(rest[:-len(':batchUpdate')]), body)
+
+        self.calls['spreadsheets.get'] += 1
+        return 200, self._spreadsheet(rest).metadata()
+
+    def _spreadsheet(self, spreadsheet_id):
+        try:
+            return self.spreadsheets[spreadsheet_id]
+        except KeyError:
+            raise KeyError(f'Requested entity was not found: {spreadsheet_id}')
+
+    def _sheet(self, spreadsheet, range_name):
+        title, cells = _split_range(range_name)
+        sheet = spreadsheet.find_sheet(title=title)
+        if sheet is None:
+            raise ValueError(f'Unable to parse range: {range_name}')
+        return sheet, cells
+
+    def _get(self, spreadsheet, range_name, params):
+        self.calls['values.get'] += 1
+        sheet, cells = self._sheet(spreadsheet, range_name)
+        payload = {'range': range_name, 'majorDimension': 'ROWS'}
+        values = sheet.read(cells, params.get('valueRenderOption'))
+        if values:
+            payload['values'] = values
+        return 200, payload
+
+    def _batch_get(self, spreadsheet, params):
+        self.calls['values.batchGet'] += 1
+        value_ranges = []
+        for range_name in params['ranges']:
+            sheet, cells = self._sheet(spreadsheet, range_name)
+            entry = {'range': range_name, 'majorDimension': 'ROWS'}
+            values = sheet.read(cells, params.get('valueRenderOption'))
+            if values:
+                entry['values'] = values
+            value_ranges.append(entry)
+        return 200, {'spreadsheetId': spreadsheet.id, 'valueRanges': value_ranges}
+
+    def _update(self, spreadsheet, range_name, body):
+        self.calls['values.update'] += 1
+        spreadsheet.touch()
+        sheet, cells = self._sheet(spreadsheet, range_name)
+        bounds = sheet.write(cells, body.get('values', []))
+        return 200, {'spreadsheetId': spreadsheet.id, 'updatedRange': sheet.a1(*bounds)}
+
+    def _batch_update_values(self, spreadsheet, body):
+        self.calls['values.batchUpdate'] += 1
+        spreadsheet.touch()
+        responses = []
+        for entry in body.get('data', []):
+            sheet, cells = self._sheet(spreadsheet, entry['range'])
+            bounds = sheet.write(cells, entry.get('values', []))
+            responses.append({'updatedRange': sheet.a1(*bounds)})
+        return 200, {'spreadsheetId': spreadsheet.id, 'responses': responses}
+
+    def _batch_clear(self, spreadsheet, body):
+        self.calls['values.batchClear'] += 1
+        spreadsheet.touch()
+        for range_name in body.get('ranges', []):
+            sheet, cells = self._sheet(spreadsheet, range_name)
+            row0, col0, row1, col1 = _parse_cells(cells, sheet.row_count, sheet.col_count)
+            for row in sheet.values[row0:row1]:
+                for col in range(col0, min(col1, len(row))):
+                    row[col] = ''
+        return 200, {'spreadsheetId': spreadsheet.id, 'clearedRanges': body.get('ranges', [])}
+
+    def _append(self, spreadsheet, range_name, body):
+        self.calls['values.append'] += 1
+        spreadsheet.touch()
+        sheet, _ = self._sheet(spreadsheet, range_name)
+        rows = body.get('values', [])
+        start = sheet.last_data_row()
+        if start + len(rows) > sheet.row_count:
+            sheet.row_count = start + len(rows)
+        bounds = sheet.write(f'A{start + 1}', rows)
+        return 200, {'spreadsheetId': spreadsheet.id, 'updates': {'updatedRange': sheet.a1(*bounds)}}
+
+    def _batch_update(self, spreadsheet, body):
+        self.calls['spreadsheets.batchUpdate'] += 1
+        spreadsheet.touch()
+        replies = []
+        for request in body.get('requests', []):
+            (kind, spec), = request.items()
+            handler = getattr(self, f'_request_{kind}', None)
+            if handler is None:
+                raise ValueError(f'Unsupported request: {kind}')
+            replies.append(handler(spreadsheet, spec))
+        return 200, {'spreadsheetId': spreadsheet.id, 'replies': replies}
+
+    def _request_addSheet(self, spreadsheet, spec):
+        props = spec.get('properties', {})
+        grid = props.get('gridProperties', {})
+        sheet = spreadsheet.add_sheet(props['title'], grid.get('rowCount', 1000), grid.get('columnCount', 26))
+        return {'addSheet': {'properties': sheet.properties(len(spreadsheet.sheets) - 1)}}
+
+    def _request_updateSheetProperties(self, spreadsheet, spec):
+        props = spec['properties']
+        sheet = spreadsheet.find_sheet(sheet_id=props['sheetId'])
+        if 'title' in props:
+            sheet.title = props['title']
+        return {}
+
+    def _request_deleteSheet(self, spreadsheet, spec):
+        sheet = spreadsheet.find_sheet(sheet_id=spec['sheetId'])
+        if sheet is None:
+            raise KeyError(f"No grid with id: {spec['sheetId']}")
+        spreadsheet.sheets.remove(sheet)
+        return {}
+
+    def _request_deleteDimension(self, spreadsheet, spec):
+        rng = spec['range']
+        sheet = spreadsheet.find_sheet(sheet_id=rng['sheetId'])
+        start, end = rng['startIndex'], rng['endIndex']
+        if rng['dimension'] == 'ROWS':
+            del sheet.values[start:end]
+            sheet.row_count -= end - start
+        else:
+            for row in sheet.values:
+                del row[start:end]
+            sheet.col_count -= end - start
+        return {}
+
+    def _request_insertDimension(self, spreadsheet, spec):
+        rng = spec['range']
+        sheet = spreadsheet.find_sheet(sheet_id=rng['sheetId'])
+        start, end = rng['startIndex'], rng['endIndex']
+        if rng['dimension'] == 'ROWS':
+            while len(sheet.values) < start:
+                sheet.values.append([])
+            sheet.values[start:start] = [[] for _ in range(end - start)]
+            sheet.row_count += end - start
+        return {}
+
+    def _request_updateCells(self, spreadsheet, spec):
+        start = spec['start']
+        sheet = spreadsheet.find_sheet(sheet_id=start['sheetId'])
+        row0, col0 = start.get('rowIndex', 0), start.get('columnIndex', 0)
+        for offset, row in enumerate(spec.get('rows', [])):
+            while len(sheet.values) <= row0 + offset:
+                sheet.values.append([])
+            current = sheet.values[row0 + offset]
+            cells = row.get('values', [])
+            if len(current) < col0 + len(cells):
+                current.extend([''] * (col0 + len(cells) - len(current)))
+            for index, cell in enumerate(cells):
+                current[col0 + index] = _cell_value(cell)
+        return {}
+
+    def _request_sortRange(self, spreadsheet, spec):
+        rng = spec['range']
+        sheet = spreadsheet.find_sheet(sheet_id=rng['sheetId'])
+        start, end = rng.get('startRowIndex', 0), rng.get('endRowIndex', len(sheet.values))
+        while len(sheet.values) < end:
+            sheet.values.append([])
+        rows = sheet.values[start:end]
+        for sort in reversed(spec.get('sortSpecs', [])):
+            column = sort.get('dimensionIndex', 0)
+            rows.sort(
+                key=lambda row: _sort_key(row[column] if column < len(row) else ''),
+                reverse=sort.get('sortOrder') == 'DESCENDING'
+            )
+        sheet.values[start:end] = rows
+        return {}
+
+
+def _error(code, message, status):
+    return {'error': {'code': code, 'message': message, 'status': status}}
+
+
+class FakeSheetsAdapter(BaseAdapter):
+    """requests transport that answers from a FakeSheetsServer"""
+
+    def __init__(self, server, account):
+        super().__init__()
+        self.server = server
+        self.account = account
+
+    def send(self, request, **kwargs):
+        body = json.loads(request.body) if request.body else {}
+        status, payload = self.server.handle(request.method, request.url, body, self.account)
+
+        response = requests.Response()
+        response.status_code = status
+        response._content = json.dumps(payload).encode('utf-8')
+        response.headers['Content-Type'] = 'application/json; charset=UTF-8'
+        response.url = request.url
+        response.request = request
+        response.encoding = 'utf-8'
+        return response
+
+    def close(self):
+        pass
@@ -0,0 +1,297 @@
+"""Load generator replaying synthetic Telegram updates through the dispatcher.
+
+Virtual users walk through the bot's real button flows (add shift, revenue
+and tips entry, exports, deletes, help, admin statistics). Every update is
+fed into main.dp.feed_update; the bot talks to a fake Bot API session and
+the storage facade is pointed at an in-memory backend, so nothing leaves
+the process. Reports handler throughput and latency, event-loop lag and
+FSM storage growth.
+
+Usage (from the repository root):
+    python -m benchmarks.load_test --users 200 --concurrency 50 --rounds 5
+    python -m benchmarks.load_test --storage-latency-ms 150 --api-latency-ms 40
+"""
+from datetime import datetime
+from itertools import count
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('BOT_TOKEN', '123456:LOAD-TEST-TOKEN')
+os.environ.setdefault('GOOGLE_CREDENTIALS', '{}')
+os.environ.setdefault('SHEET_ID', 'load-test')
+os.environ.setdefault('STORAGE_TYPE', 'sqlite')
+os.environ.setdefault('USER_ID', '0')
+
+from aiogram.client.session.base import BaseSession  # noqa: E402
+from aiogram.dispatcher.event.bases import UNHANDLED  # noqa: E402
+from aiogram.types import Chat, Document, Message, Update, User  # noqa: E402
+
+from models import Shift, apply_field, format_date, format_money, parse_date, parse_time  # noqa: E402
+from benchmarks.run_benchmarks import generate_shifts, percentile  # noqa: E402
+
+
+class FakeBotSession(BaseSession):
+    """Answers every Bot API call locally after an optional delay"""
+
+    def __init__(self, latency=0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls = {}
+        self._message_ids = count(1)
+
+    async def make_request(self, bot, method, timeout=None):
+        name = type(method).__name__
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if name not in ('SendMessage', 'SendDocument'):
+            return True
+        message_id = next(self._message_ids)
+        return Message(
+            message_id=message_id,
+            date=datetime.now(),
+            chat=Chat(id=method.chat_id, type='private'),
+            text=getattr(method, 'text', None),
+            document=Document(file_id=f'file-{message_id}', file_unique_id=f'u{message_id}')
+            if name == 'SendDocument' else None
+        ).as_(bot)
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b''
+
+    async def close(self):
+        pass
+
+
+class InMemoryBackend:
+    """Storage backend with the same interface as DatabaseManager, kept in a dict"""
+
+    def __init__(self, shifts, latency=0.0):
+        self.shifts = {shift.day: shift for shift in shifts}
+        self.latency = latency
+
+    async def _delay(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def add_shift(self, date_msg, start, end, reset_financials=False):
+        await self._delay()
+        shift = Shift(parse_date(date_msg), parse_time(start), parse_time(end))
+        existing = self.shifts.get(shift.day)
+        if existing and not reset_financials:
+            shift = Shift(shift.day, shift.start, shift.end, existing.revenue, existing.tips)
+        self.shifts[shift.day] = shift
+        return True
+
+    async def update_value(self, date_msg, field, value):
+        await self._delay()
+        current = self.shifts.get(parse_date(date_msg))
+        updated = current and apply_field(current, field, value)
+        if not updated:
+            return False
+        self.shifts[updated.day] = updated
+        return True
+
+    async def get_profit(self, date_msg):
+        shift = await self.get_shift_data(date_msg)
+        return format_money(shift.profit) if shift else None
+
+    async def check_shift_exists(self, date_msg):
+        await self._delay()
+        return parse_date(date_msg) in self.shifts
+
+    async def has_shift_today(self, date_msg):
+        return await self.check_shift_exists(date_msg)
+
+    async def delete_shift(self, date_msg):
+        await self._delay()
+        return self.shifts.pop(parse_date(date_msg), None) is not None
+
+    async def get_shift_data(self, date_msg):
+        await self._delay()
+        return self.shifts.get(parse_date(date_msg))
+
+    async def get_all_shifts(self):
+        await self._delay()
+        return list(self.shifts.values())
+
+    async def get_shifts_in_period(self, start_date, end_date=None):
+        await self._delay()
+        first = parse_date(start_date)
+        last = parse_date(end_date) if end_date is not None else None
+        return [shift for shift in self.shifts.values() if shift.day >= first and (last is None or shift.day <= last)]
+
+
+def build_flows(today):
+    """Button sequences of the real user flows, one list of texts per flow"""
+    day = format_date(parse_date(today) - 1)
+    return {
+        'add_shift': ["📅 Добавить смену", day, "9-18"],
+        'revenue': ["💰 Выручка", day, "15000"],
+        'tips': ["💖 Чаевые", day, "1200"],
+        'delete': ["🗑️ Удалить", day, "✅ Да, удалить"],
+        'export_csv': ["📤 Экспорт", "📊 CSV файл"],
+        'export_text': ["📤 Экспорт", "📋 Текстовая сводка"],
+        'export_period': ["📤 Экспорт", "📅 За период", "📅 Месяц", "📈 Excel файл"],
+        'export_cancel': ["📤 Экспорт", "❌ Отмена"],
+        'help': ["/help"],
+        'statistics': ["📊 Статистика"],
+    }
+
+
+class LoadTest:
+    def __init__(self, dp, bot, users, concurrency, rounds, seed=0):
+        self.dp = dp
+        self.bot = bot
+        self.users = users
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.rounds = rounds
+        self.random = random.Random(seed)
+        self.flows = build_flows(datetime.now().date())
+        self.update_ids = count(1)
+        self.latencies = []
+        self.handled = 0
+        self.unhandled = {}
+        self.errors = 0
+        self.loop_lag = []
+
+    def make_update(self, user_id, text):
+        update_id = next(self.update_ids)
+        user = User(id=user_id, is_bot=False, first_name=f'user{user_id}')
+        return Update(update_id=update_id, message=Message(
+            message_id=update_id,
+            date=datetime.now(),
+            chat=Chat(id=user_id, type='private'),
+            from_user=user,
+            text=text
+        ))
+
+    async def run_user(self, user_id):
+        async with self.semaphore:
+            for _ in range(self.rounds):
+                flow = self.random.choice(list(self.flows))
+                for text in self.flows[flow]:
+                    started = time.perf_counter()
+                    try:
+                        result = await self.dp.feed_update(self.bot, self.make_update(user_id, text))
+                    except Exception:
+                        self.errors += 1
+                        continue
+                    finally:
+                        self.latencies.append(time.perf_counter() - started)
+                    if result is UNHANDLED:
+                        self.unhandled[flow] = self.unhandled.get(flow, 0) + 1
+                    else:
+                        self.handled += 1
+
+    async def sample_loop_lag(self, interval=0.01):
+        """Overshoot of a periodic sleep approximates event-loop lag"""
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            self.loop_lag.append(max(0.0, time.perf_counter() - started - interval))
+
+    async def run(self, first_user_id):
+        sampler = asyncio.create_task(self.sample_loop_lag())
+        started = time.perf_counter()
+        await asyncio.gather(*(self.run_user(first_user_id + i) for i in range(self.users)))
+        elapsed = time.perf_counter() - started
+        sampler.cancel()
+        return elapsed
+
+
+def fsm_storage_size(dp):
+    """(records, approximate bytes) held by the in-memory FSM storage"""
+    records = getattr(dp.storage, 'storage', {})
+    size = 0
+    for record in records.values():
+        size += sys.getsizeof(record) + sys.getsizeof(record.data)
+        size += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in record.data.items())
+    return len(records), size
+
+
+async def run(args):
+    import main
+    from config import ADMIN_ID
+    from storage import storage
+
+    # Per-update aiogram/handler log lines would dominate the measurement
+    logging.disable(logging.INFO)
+
+    # Telegram rate limits would dominate the run unless asked for
+    from outbox import outbox
+    outbox.enabled = args.telegram_limits
+
+    session = FakeBotSession(latency=args.api_latency_ms / 1000)
+    for middleware in main.bot.session.middleware[:]:
+        session.middleware(middleware)
+    main.bot.session = session
+
+    today = datetime.now().date()
+    storage.backend = InMemoryBackend(generate_shifts(args.shifts, today), args.storage_latency_ms / 1000)
+    storage.name = 'load_test'
+
+    # Fresh file_id cache so every run starts with cold uploads
+    from file_cache import file_cache
+    tmp = tempfile.TemporaryDirectory()
+    file_cache.db_path = os.path.join(tmp.name, 'file_cache.db')
+    file_cache._init_db()
+
+    # Worker start-up (a fresh interpreter each) is paid at bot start, not by the first export
+    from report_pool import report_pool
+    await asyncio.gather(*map(asyncio.wrap_future, report_pool.start()))
+
+    records_before, bytes_before = fsm_storage_size(main.dp)
+    started_at = time.perf_counter()
+    test = LoadTest(main.dp, main.bot, args.users, args.concurrency, args.rounds, args.seed)
+    # The admin gets a slot too so the statistics flow reaches its handler
+    elapsed = await test.run(first_user_id=ADMIN_ID - 1)
+    # Exports finish in the background after their handlers return
+    from export_jobs import export_queue
+    await export_queue.join()
+    exports_elapsed = time.perf_counter() - started_at
+    records_after, bytes_after = fsm_storage_size(main.dp)
+
+    total = len(test.latencies)
+    print(f"Updates fed:          {total} ({test.handled} handled, {sum(test.unhandled.values())} unhandled, {test.errors} errors)")
+    print(f"Elapsed:              {elapsed:.2f}s")
+    print(f"Throughput:           {total / elapsed:.1f} updates/s")
+    print(f"Export queue drained: {exports_elapsed:.2f}s")
+    print(f"Update latency:       p50 {percentile(test.latencies, 0.5) * 1000:.2f}ms  "
+          f"p95 {percentile(test.latencies, 0.95) * 1000:.2f}ms  "
+          f"p99 {percentile(test.latencies, 0.99) * 1000:.2f}ms")
+    if test.loop_lag:
+        print(f"Event-loop lag:       p50 {percentile(test.loop_lag, 0.5) * 1000:.2f}ms  "
+              f"p99 {percentile(test.loop_lag, 0.99) * 1000:.2f}ms  max {max(test.loop_lag) * 1000:.2f}ms")
+    print(f"FSM storage:          {records_before} -> {records_after} records, "
+          f"{bytes_before / 1024:.1f} -> {bytes_after / 1024:.1f} KB")
+    print(f"Bot API calls:        {dict(sorted(session.calls.items()))}")
+    if test.unhandled:
+        print(f"Unhandled by flow:    {dict(sorted(test.unhandled.items()))}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay synthetic Telegram traffic through the dispatcher')
+    parser.add_argument('--users', type=int, default=100, help='virtual users')
+    parser.add_argument('--concurrency', type=int, default=20, help='users active at the same time')
+    parser.add_argument('--rounds', type=int, default=5, help='flows per user')
+    parser.add_argument('--shifts', type=int, default=1000, help='shifts in the fake storage')
+    parser.add_argument('--storage-latency-ms', type=float, default=0.0)
+    parser.add_argument('--api-latency-ms', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--telegram-limits', action='store_true',
+                        help='apply the outbox global/per-chat rate limits to the fake API')
+    args = parser.parse_args(argv)
+    return asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
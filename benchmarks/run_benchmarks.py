@@ -0,0 +1,277 @@
+"""Storage benchmarks for the Google Sheets and SQLite backends.
+
+Runs the same workloads (add_shift, update_value, get_profit, get_all_shifts,
+export_data, check_incomplete_shifts) against SQLite and against
+GoogleSheetsManager talking to the in-process fake Sheets API, at several
+table sizes. Reports p50/p95/p99 latency, Sheets API calls per operation and
+peak memory, and exits with code 1 when API calls or peak memory regress
+against the stored baseline. Latency depends on the machine the baseline was
+recorded on, so a slower median is only reported, unless --gate-latency is
+given for a baseline re-measured on the same machine.
+
+Usage (from the repository root):
+    python -m benchmarks.run_benchmarks
+    python -m benchmarks.run_benchmarks --rows 1000,10000,100000 --latency-ms 80
+    python -m benchmarks.run_benchmarks --update-baseline
+    python -m benchmarks.run_benchmarks --update-baseline --baseline local.json && \
+        python -m benchmarks.run_benchmarks --baseline local.json --gate-latency
+"""
+from datetime import datetime
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault('USER_ID', '1')
+
+from models import Shift, format_date, parse_date  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+SPREADSHEET_ID = 'benchmark-sheet'
+HEADERS = ['Дата', 'Начало', 'Конец', 'Часы', 'Выручка', 'Чаевые', 'Прибыль']
+
+OPERATIONS = [
+    'add_shift', 'update_value', 'get_profit',
+    'get_all_shifts', 'export_data', 'check_incomplete_shifts'
+]
+
+# Full-table operations are repeated less often than point operations
+HEAVY_OPERATIONS = {'get_all_shifts', 'export_data'}
+
+
+def generate_shifts(rows, today):
+    """rows consecutive shifts ending yesterday, the last three without tips"""
+    rng = random.Random(rows)
+    first_day = parse_date(today) - rows
+    shifts = []
+    for i in range(rows):
+        day = first_day + i
+        incomplete = i >= rows - 3
+        shifts.append(Shift(
+            day=day,
+            start=9 * 60,
+            end=18 * 60 + rng.choice((0, 30)),
+            revenue=rng.randint(5_000, 40_000) * 100,
+            tips=None if incomplete else rng.randint(0, 3_000) * 100
+        ))
+    return shifts
+
+
+class SqliteTarget:
+    name = 'sqlite'
+
+    def __init__(self, shifts):
+        from database import DatabaseManager
+
+        self._tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(self._tmp.name, 'bench.db')
+        self.storage = DatabaseManager(path)
+        with sqlite3.connect(path) as conn:
+            conn.executemany(
+                'INSERT INTO shifts (day, start_min, end_min, revenue, tips) VALUES (?, ?, ?, ?, ?)',
+                [(s.day, s.start, s.end, s.revenue, s.tips) for s in shifts]
+            )
+
+    def api_calls(self):
+        return 0
+
+    def close(self):
+        self._tmp.cleanup()
+
+
+class SheetsTarget:
+    name = 'sheets'
+
+    def __init__(self, shifts, latency, quota):
+        from benchmarks.fake_sheets import FakeSheetsServer
+        from sheets import GoogleSheetsManager
+
+        self.server = FakeSheetsServer(latency=latency, quota_per_minute=quota)
+        spreadsheet = self.server.create_spreadsheet(SPREADSHEET_ID)
+        sheet = spreadsheet.add_sheet('Смены', rows=len(shifts) + 1000, cols=7)
+        sheet.values = [list(HEADERS)] + [shift.to_row() for shift in shifts]
+        self.storage = GoogleSheetsManager(client=self.server.client(), sheet_id=SPREADSHEET_ID)
+        if not self.storage.initialized:
+            raise RuntimeError('GoogleSheetsManager failed to initialize against the fake API')
+
+    def api_calls(self):
+        return self.server.total_calls
+
+    def close(self):
+        pass
+
+
+async def run_operation(target, op, shifts, today, iterations, rng):
+    """Run one operation, returns (latencies in seconds, api calls, peak bytes)"""
+    import notifications
+    from completeness import CompletenessIndex
+    from reports import filter_shifts_by_period, generate_csv_file
+
+    storage = target.storage
+    # The index follows writes made through the facade, like the bot's
+    if op == 'check_incomplete_shifts':
+        from storage import Storage
+        tracker = CompletenessIndex(Storage(storage, target.name))
+    existing = [shift.date_str for shift in shifts]
+    future_day = parse_date(today) + 1
+
+    async def once(i):
+        if op == 'add_shift':
+            await storage.add_shift(format_date(future_day + i), '10:00', '19:00')
+        elif op == 'update_value':
+            await storage.update_value(rng.choice(existing), 'выручка', str(rng.randint(5_000, 40_000)))
+        elif op == 'get_profit':
+            await storage.get_profit(rng.choice(existing))
+        elif op == 'get_all_shifts':
+            await storage.get_all_shifts()
+        elif op == 'export_data':
+            data = filter_shifts_by_period(await storage.get_all_shifts(), 'all')
+            generate_csv_file(data).getvalue().encode('utf-8-sig')
+        elif op == 'check_incomplete_shifts':
+            await notifications.check_incomplete_shifts(tracker)
+
+    latencies = []
+    calls_before = target.api_calls()
+    for i in range(iterations):
+        started = time.perf_counter()
+        await once(i)
+        latencies.append(time.perf_counter() - started)
+    api_calls = target.api_calls() - calls_before
+
+    # One extra traced run for peak memory, kept out of the timings
+    tracemalloc.start()
+    await once(iterations)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return latencies, api_calls, peak
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_suite(backends, sizes, iterations, latency, quota):
+    today = datetime.now().date()
+    results = {}
+    for rows in sizes:
+        shifts = generate_shifts(rows, today)
+        for backend in backends:
+            if backend == 'sqlite':
+                target = SqliteTarget(shifts)
+            else:
+                target = SheetsTarget(shifts, latency, quota)
+            rng = random.Random(42)
+            try:
+                for op in OPERATIONS:
+                    count = max(5, iterations // 5) if op in HEAVY_OPERATIONS else iterations
+                    latencies, api_calls, peak = await run_operation(target, op, shifts, today, count, rng)
+                    results[f'{backend}/{rows}/{op}'] = {
+                        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+                        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+                        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+                        'api_calls_per_op': round(api_calls / count, 2),
+                        'peak_kb': round(peak / 1024, 1)
+                    }
+            finally:
+                target.close()
+    return results
+
+
+def print_results(results):
+    print(f"{'benchmark':<45} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'api/op':>8} {'peak KB':>10}")
+    for key, r in results.items():
+        print(f"{key:<45} {r['p50_ms']:>10.3f} {r['p95_ms']:>10.3f} {r['p99_ms']:>10.3f} "
+              f"{r['api_calls_per_op']:>8.2f} {r['peak_kb']:>10.1f}")
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    """(regressions, slower medians) against the baseline, as human-readable lines
+
+    API calls and peak memory do not depend on the machine and are gated;
+    latency is returned separately and gated only on request.
+    """
+    regressions, slower = [], []
+    for key, r in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        if r['api_calls_per_op'] > base['api_calls_per_op'] + 1e-9:
+            regressions.append(f"{key}: api calls/op {base['api_calls_per_op']} -> {r['api_calls_per_op']}")
+        if r['peak_kb'] > base['peak_kb'] * tolerance + 64:
+            regressions.append(f"{key}: peak memory {base['peak_kb']}KB -> {r['peak_kb']}KB")
+        # Medians are compared: tail percentiles of short runs are too noisy even for a note
+        if r['p50_ms'] > base['p50_ms'] * tolerance + 1.0:
+            slower.append(f"{key}: p50 {base['p50_ms']}ms -> {r['p50_ms']}ms")
+    return regressions, slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark storage backends')
+    parser.add_argument('--backend', choices=['sqlite', 'sheets', 'all'], default='all')
+    parser.add_argument('--rows', default='1000,10000', help='comma-separated table sizes')
+    parser.add_argument('--iterations', type=int, default=30, help='runs per point operation')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='simulated Sheets API latency')
+    parser.add_argument('--quota', type=int, default=None, help='simulated Sheets requests per minute')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--tolerance', type=float, default=1.5, help='allowed slowdown / memory growth factor')
+    parser.add_argument('--gate-latency', action='store_true',
+                        help='fail on slower medians too (baseline measured on this machine)')
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args(argv)
+
+    backends = ['sqlite', 'sheets'] if args.backend == 'all' else [args.backend]
+    sizes = [int(size) for size in args.rows.split(',')]
+    results = asyncio.run(run_suite(backends, sizes, args.iterations, args.latency_ms / 1000, args.quota))
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, ensure_ascii=False, sort_keys=True)
+            f.write('\n')
+        print(f"✅ Baseline updated: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("ℹ️ No baseline stored - run with --update-baseline to create one")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions, slower = compare_with_baseline(results, baseline, args.tolerance)
+    if args.gate_latency:
+        regressions += slower
+    elif slower:
+        print("\nℹ️ Slower than baseline (timings depend on the machine, not gated):")
+        for line in slower:
+            print(f"  - {line}")
+    if regressions:
+        print("\n❌ Regressions against baseline:")
+        for line in regressions:
+            print(f"  - {line}")
+        return 1
+
+    print("\n✅ No regressions against baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
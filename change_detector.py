@@ -0,0 +1,121 @@
+import asyncio
+import logging
+
+import metrics
+from models import month_key, parse_date, shift_after_write
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeDetector:
+    """Notices edits made directly in the spreadsheet and feeds them to the caches
+
+    The source is polled for a cheap revision token (Drive modifiedTime).
+    Only when it moved are the rows read and compared with the last known
+    shifts; the bot's own writes keep that copy current through
+    Storage.subscribe, so just the days edited by hand reach
+    Storage.apply_external. The interval drops to min_interval after an
+    external edit and doubles up to max_interval while nothing changes.
+    Without a revision token every poll compares rows.
+    """
+
+    def __init__(self, storage, source, min_interval=15.0, max_interval=300.0):
+        self.storage = storage
+        self.source = source
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self._known = None
+        self._archived_months = set()
+        self._revision = None
+        self._task = None
+        storage.subscribe(self._on_write)
+
+    def _on_write(self, method, args):
+        if self._known is None or method == 'replace_shift':
+            return
+        day = parse_date(args[0])
+        shift = shift_after_write(self._known.get(day), method, *args)
+        if shift is None:
+            self._known.pop(day, None)
+        else:
+            self._known[day] = shift
+
+    def _live(self, shifts):
+        archive = self.storage.archive
+        return {shift.day: shift for shift in shifts if not (archive and archive.has(shift.day))}
+
+    def _archive_months(self):
+        archive = self.storage.archive
+        return set(archive.months) if archive else set()
+
+    async def check(self):
+        """One poll, returns the changes found ({day: Shift or None})
+
+        Months moved between the backend and the archive are not edits:
+        days archived since the last poll leave the known copy, and days of
+        months that were archived at the last poll (restored for editing)
+        are taken as they are.
+        """
+        if not getattr(self.storage.backend, 'healthy', True):
+            # В таблице нет записей из журнала - сравнение приняло бы их за удаленные
+            return {}
+
+        revision = await self.source.revision()
+        metrics.CHANGE_POLLS.inc(result='unchanged' if revision is not None and revision == self._revision else 'read')
+        if revision is not None and revision == self._revision:
+            return {}
+
+        version = self.storage.data_version
+        current = self._live(await self.source.snapshot())
+        if self.storage.data_version != version:
+            # Бот писал во время чтения - сравним в следующий раз
+            return {}
+
+        changes = {}
+        if self._known is not None:
+            known = self._live(self._known.values())
+            for day in known.keys() | current.keys():
+                if day not in known and month_key(day) in self._archived_months:
+                    continue
+                if known.get(day) != current.get(day):
+                    changes[day] = current.get(day)
+        self._known = current
+        self._archived_months = self._archive_months()
+        self._revision = revision
+
+        if changes:
+            metrics.EXTERNAL_CHANGES.inc(len(changes))
+            logger.info(f"✏️ {len(changes)} shifts were edited in the spreadsheet directly")
+            await self.storage.apply_external(changes)
+        return changes
+
+    async def _run(self):
+        while True:
+            try:
+                changes = await self.check()
+                if changes:
+                    self.interval = self.min_interval
+                else:
+                    self.interval = min(self.max_interval, self.interval * 2)
+            except Exception as e:
+                logger.error(f"❌ Spreadsheet change check failed: {e}")
+                self.interval = self.max_interval
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+
+
+def start_change_detector(storage, min_interval, max_interval):
+    """Start polling if the storage sits on a source with revision/snapshot (Google Sheets)"""
+    source = getattr(storage.backend, 'primary', storage.backend)
+    if not hasattr(source, 'revision'):
+        return None
+    logger.info(f"👀 Watching the spreadsheet for manual edits every {min_interval:g}-{max_interval:g}s")
+    return ChangeDetector(storage, source, min_interval, max_interval).start()
@@ -0,0 +1,128 @@
+from collections import deque
+from contextvars import ContextVar
+import asyncio
+import logging
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+STATES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Errors that the current call's backend handled itself (it returns False/None)
+_call_errors = ContextVar('call_errors', default=None)
+
+
+def note_error(error):
+    """Report an error swallowed inside a backend call to the enclosing breaker"""
+    errors = _call_errors.get()
+    if errors is not None:
+        errors.append(error)
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """Error-rate and latency circuit breaker
+
+    Outcomes of the last `window` calls are kept; a call fails if it raises,
+    times out, reports an error via note_error() or takes longer than
+    slow_call_seconds. Once at least min_calls outcomes are known and the
+    failure share reaches error_rate, the breaker opens and rejects calls
+    for open_seconds. After that one probe call is let through: success
+    closes the breaker, failure opens it again.
+    """
+
+    def __init__(self, name, window=20, min_calls=5, error_rate=0.5,
+                 slow_call_seconds=3.0, open_seconds=30.0, timeout=None):
+        self.name = name
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.timeout = timeout
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probing = False
+        self._set_state(CLOSED)
+
+    def _set_state(self, state):
+        self.state = state
+        metrics.BREAKER_STATE.set(STATES[state], breaker=self.name)
+
+    def allow(self):
+        """True if a call may go to the protected backend now"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._set_state(HALF_OPEN)
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record(self, ok):
+        if self.state == HALF_OPEN:
+            self._probing = False
+            if ok:
+                self._outcomes.clear()
+                self._transition(CLOSED)
+            else:
+                self._open()
+            return
+
+        self._outcomes.append(ok)
+        failures = self._outcomes.count(False)
+        if (self.state == CLOSED and len(self._outcomes) >= self.min_calls
+                and failures >= self.error_rate * len(self._outcomes)):
+            self._open()
+
+    def _open(self):
+        self._opened_at = time.monotonic()
+        self._transition(OPEN)
+
+    def _transition(self, state):
+        if state != self.state:
+            level = logging.INFO if state == CLOSED else logging.WARNING
+            logger.log(level, f"{'✅' if state == CLOSED else '⚡'} Circuit {self.name}: {self.state} -> {state}")
+            metrics.BREAKER_TRANSITIONS.inc(breaker=self.name, state=state)
+        self._set_state(state)
+
+    async def call(self, func, *args, **kwargs):
+        """Run func(*args, **kwargs) through the breaker
+
+        Raises CircuitOpenError when open, the timeout or the backend's
+        error when the call failed and produced no result.
+        """
+        if not self.allow():
+            raise CircuitOpenError(self.name)
+
+        errors = []
+        token = _call_errors.set(errors)
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(func(*args, **kwargs), self.timeout)
+        except asyncio.CancelledError:
+            # Отмена снаружи ничего не говорит о бэкенде
+            self._probing = False
+            raise
+        except asyncio.TimeoutError as e:
+            self.record(False)
+            raise asyncio.TimeoutError(f"{self.name} call {func.__name__} timed out after {self.timeout}s") from e
+        except Exception:
+            self.record(False)
+            raise
+        finally:
+            _call_errors.reset(token)
+
+        slow = time.monotonic() - started > self.slow_call_seconds
+        self.record(not errors and not slow)
+        if errors and not result:
+            raise errors[0]
+        return result
@@ -0,0 +1,101 @@
+import logging
+
+from models import FIELD_MAPPING, format_date, parse_date, parse_money, shift_after_write
+from storage import storage
+
+logger = logging.getLogger(__name__)
+
+
+class CompletenessIndex:
+    """Shifts still missing revenue or tips, maintained by the write path
+
+    The bot tracks a single user's shifts, so the index is one set for the
+    whole storage. A shift joins it when created and leaves once revenue
+    and tips are both filled. The only write it cannot resolve alone is
+    zeroing an amount on a complete shift: that day is marked stale and
+    read back on the next lookup.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self._incomplete = None
+        self._complete = set()
+        self._stale = set()
+        self._version = None
+        storage.subscribe(self._on_write)
+
+    @property
+    def ready(self):
+        return self._incomplete is not None
+
+    async def rebuild(self, attempts=3):
+        """Собрать индекс заново по всем сменам хранилища"""
+        for _ in range(attempts):
+            version = self.storage.data_version
+            shifts = await self.storage.get_all_shifts() or []
+            if self.storage.data_version == version:
+                break
+        else:
+            logger.warning("⚠️ Storage kept changing during completeness rebuild")
+
+        self._incomplete = {shift.day: shift for shift in shifts if not shift.is_complete}
+        self._complete = {shift.day for shift in shifts if shift.is_complete}
+        self._stale = set()
+        self._version = version
+        logger.info(f"✅ Completeness index built: {len(self._incomplete)} incomplete of {len(shifts)} shifts")
+        return True
+
+    async def incomplete(self, first_day, last_day):
+        """Незаполненные смены в днях [first_day, last_day], новые первыми"""
+        if not self.ready or self._version != self.storage.data_version:
+            await self.rebuild()
+
+        for day in [day for day in self._stale if first_day <= day <= last_day]:
+            shift = await self.storage.get_shift_data(format_date(day))
+            self._place(day, shift)
+
+        return sorted(
+            (shift for day, shift in self._incomplete.items() if first_day <= day <= last_day),
+            key=lambda shift: shift.day,
+            reverse=True
+        )
+
+    def _place(self, day, shift):
+        self._stale.discard(day)
+        self._incomplete.pop(day, None)
+        self._complete.discard(day)
+        if shift is None:
+            return
+        if shift.is_complete:
+            self._complete.add(day)
+        else:
+            self._incomplete[day] = shift
+
+    def _on_write(self, method, args):
+        if not self.ready:
+            return
+        if self._version != self.storage.data_version - 1:
+            # Пропущена запись - перестроим индекс при следующем запросе
+            self._incomplete = None
+            return
+        self._version = self.storage.data_version
+
+        day = parse_date(args[0])
+
+        if method == 'delete_shift':
+            self._place(day, None)
+        elif method == 'replace_shift':
+            self._place(day, args[1])
+        elif day in self._incomplete:
+            self._place(day, shift_after_write(self._incomplete[day], method, *args))
+        elif method == 'add_shift' and (day not in self._complete or (len(args) > 3 and args[3])):
+            # Новая смена или перезапись с обнулением выручки и чаевых
+            self._place(day, shift_after_write(None, method, *args))
+        elif method == 'update_value':
+            field = FIELD_MAPPING.get(args[1].lower())
+            if day not in self._complete or (field in ('revenue', 'tips') and not parse_money(args[2])):
+                self._stale.add(day)
+        # Иначе смена была и остается заполненной
+
+
+completeness = CompletenessIndex(storage)
@@ -10,3 +10,74 @@ USER_ID = int(os.getenv('USER_ID', '0'))
 if not USER_ID:
     print("⚠️  USER_ID not set - notifications will be disabled")
 
+# ID администратора (кнопка статистики)
+ADMIN_ID = int(os.getenv('ADMIN_ID', '462439834'))
+
+
+# Порт для /metrics в формате Prometheus (0 - выключено, на Render задается PORT)
+METRICS_PORT = int(os.getenv('METRICS_PORT', os.getenv('PORT', '0')))
+
+# Сторожевой таймер event loop: ищет блокирующие вызовы и пишет их стек в лог
+WATCHDOG_ENABLED = os.getenv('WATCHDOG_ENABLED', '0').lower() in ('1', 'true', 'yes')
+WATCHDOG_THRESHOLD_MS = int(os.getenv('WATCHDOG_THRESHOLD_MS', '250'))
+WATCHDOG_INTERVAL_MS = int(os.getenv('WATCHDOG_INTERVAL_MS', '100'))
+
+# Процессы для генерации отчетов и экспорта (0 - в потоке, без отдельных процессов)
+REPORT_WORKERS = int(os.getenv('REPORT_WORKERS', '2'))
+
+# Одновременно выполняемые экспорты (у каждого пользователя своя очередь)
+EXPORT_WORKERS = int(os.getenv('EXPORT_WORKERS', '2'))
+
+# Кэш file_id отправленных файлов (повторная отправка без загрузки)
+FILE_CACHE_PATH = os.getenv('FILE_CACHE_PATH', 'file_cache.db')
+FILE_CACHE_MAX_ENTRIES = int(os.getenv('FILE_CACHE_MAX_ENTRIES', '1000'))
+FILE_CACHE_MAX_AGE_DAYS = int(os.getenv('FILE_CACHE_MAX_AGE_DAYS', '30'))
+
+# Хранилище задач планировщика (пусто - в памяти, без догона пропусков и лиз)
+JOBSTORE_URL = os.getenv('JOBSTORE_URL', 'sqlite:///jobs.sqlite')
+# Сколько секунд после пропущенного времени задача еще выполняется
+JOB_MISFIRE_GRACE_SECONDS = int(os.getenv('JOB_MISFIRE_GRACE_SECONDS', '3600'))
+
+# Контроль нагрузки: сколько обновлений обрабатывается одновременно (всего и
+# на пользователя) и сколько ждет в очереди (всего и от одного пользователя);
+# сверх очереди - ответ "бот занят"
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv('ADMISSION_MAX_IN_FLIGHT', '32'))
+ADMISSION_MAX_PER_USER = int(os.getenv('ADMISSION_MAX_PER_USER', '2'))
+ADMISSION_MAX_QUEUED_PER_USER = int(os.getenv('ADMISSION_MAX_QUEUED_PER_USER', '4'))
+ADMISSION_QUEUE_SIZE = int(os.getenv('ADMISSION_QUEUE_SIZE', '100'))
+
+# Лимиты исходящих запросов к Telegram (~30 сообщений/с всего, ~1/с в чат)
+TELEGRAM_RATE_LIMIT = os.getenv('TELEGRAM_RATE_LIMIT', '1').lower() in ('1', 'true', 'yes')
+TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', '30'))
+TELEGRAM_CHAT_RATE = float(os.getenv('TELEGRAM_CHAT_RATE', '1'))
+TELEGRAM_CHAT_BURST = int(os.getenv('TELEGRAM_CHAT_BURST', '3'))
+
+# Автомат защиты Google Sheets: при ошибках или медленных ответах запросы
+# идут в локальную SQLite, записи журналируются и потом переносятся в таблицу
+SHEETS_FAILOVER = os.getenv('SHEETS_FAILOVER', '1').lower() in ('1', 'true', 'yes')
+SHEETS_CALL_TIMEOUT_MS = int(os.getenv('SHEETS_CALL_TIMEOUT_MS', '5000'))
+BREAKER_WINDOW = int(os.getenv('BREAKER_WINDOW', '20'))
+BREAKER_MIN_CALLS = int(os.getenv('BREAKER_MIN_CALLS', '5'))
+BREAKER_ERROR_RATE = float(os.getenv('BREAKER_ERROR_RATE', '0.5'))
+BREAKER_SLOW_CALL_MS = int(os.getenv('BREAKER_SLOW_CALL_MS', '2000'))
+BREAKER_OPEN_SECONDS = float(os.getenv('BREAKER_OPEN_SECONDS', '30'))
+
+# Несколько сервисных аккаунтов Google (GOOGLE_CREDENTIALS - JSON-список):
+# у каждого своя квота, запрос уходит к другому аккаунту, когда квота занята
+SHEETS_ACCOUNT_QUOTA_PER_MINUTE = int(os.getenv('SHEETS_ACCOUNT_QUOTA_PER_MINUTE', '60'))
+
+# Часы и прибыль в Google Sheets считают формулы (ставки на листе 'Ставки'):
+# правка времени, выручки или чаевых - запись одной ячейки
+SHEETS_FORMULAS = os.getenv('SHEETS_FORMULAS', '0').lower() in ('1', 'true', 'yes')
+
+# Архив закрытых месяцев (файлы по месяцу, пусто - выключено). Каталог должен
+# быть на постоянном диске: заархивированные смены удаляются из хранилища
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', '')
+# Сколько последних месяцев (включая текущий) остается в хранилище
+ARCHIVE_KEEP_MONTHS = int(os.getenv('ARCHIVE_KEEP_MONTHS', '2'))
+
+# Отслеживание ручных правок таблицы: время изменения файла опрашивается
+# с интервалом от MIN (после правки) до MAX (пока ничего не меняется)
+CHANGE_DETECTION = os.getenv('CHANGE_DETECTION', '1').lower() in ('1', 'true', 'yes')
+CHANGE_POLL_MIN_SECONDS = float(os.getenv('CHANGE_POLL_MIN_SECONDS', '15'))
+CHANGE_POLL_MAX_SECONDS = float(os.getenv('CHANGE_POLL_MAX_SECONDS', '300'))
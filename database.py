@@ -1,11 +1,28 @@
 import sqlite3
 import logging
-from datetime import datetime
-import json
-import os
+
+from models import (
+    HOURLY_RATE, REVENUE_SHARE_PER_MILLE, Shift, apply_field, format_date, format_money,
+    month_bounds, parse_date, parse_time
+)
 
 logger = logging.getLogger(__name__)
 
+# PRAGMA user_version of the current schema
+SCHEMA_VERSION = 1
+
+SHIFT_COLUMNS = 'day, start_min, end_min, revenue, tips'
+
+# Same rounding as models.calculate_profit, evaluated inside SQLite
+PROFIT_SQL = f'''
+    ((((end_min - start_min) % 1440 + 1440) % 1440 * {HOURLY_RATE} + 30) / 60
+     + IFNULL(tips, 0)
+     + (IFNULL(revenue, 0) * {REVENUE_SHARE_PER_MILLE} + 500) / 1000)
+'''
+
+# Open end of a period query
+MAX_DAY = 2 ** 31
+
 class DatabaseManager:
     def __init__(self, db_path='shifts.db'):
         self.db_path = db_path
@@ -14,48 +31,124 @@ class DatabaseManager:
     def _init_db(self):
         """Initialize database"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            # Автокоммит выключен вручную: вся миграция в одной транзакции,
+            # иначе DDL фиксируется сразу и сбой оставляет половину схемы
+            conn = sqlite3.connect(self.db_path, isolation_level=None)
+            try:
                 cursor = conn.cursor()
+                cursor.execute('BEGIN IMMEDIATE')
+                version = cursor.execute('PRAGMA user_version').fetchone()[0]
+                tables = {name for (name,) in cursor.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('shifts', 'shifts_legacy')"
+                )}
+                # shifts_legacy остается после прерванной миграции старой версии
+                leftover = 'shifts_legacy' in tables
+                legacy = 'shifts' in tables and version < 1 and not leftover
+                if leftover:
+                    logger.warning("⚠️ Found shifts_legacy from an interrupted migration, migrating it again")
+
+                if legacy:
+                    cursor.execute('ALTER TABLE shifts RENAME TO shifts_legacy')
+                    cursor.execute('DROP INDEX IF EXISTS idx_date')
+
+                # day - days since 1970-01-01, *_min - minutes since midnight,
+                # revenue/tips - integer kopecks (NULL while not entered)
                 cursor.execute('''
                     CREATE TABLE IF NOT EXISTS shifts (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        date TEXT UNIQUE NOT NULL,
-                        start_time TEXT NOT NULL,
-                        end_time TEXT NOT NULL,
-                        revenue REAL DEFAULT 0,
-                        tips REAL DEFAULT 0,
+                        day INTEGER UNIQUE NOT NULL,
+                        start_min INTEGER NOT NULL,
+                        end_min INTEGER NOT NULL,
+                        revenue INTEGER,
+                        tips INTEGER,
                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                         updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                     )
                 ''')
-                
-                # Create index for fast date search
-                cursor.execute('''
-                    CREATE INDEX IF NOT EXISTS idx_date ON shifts(date)
-                ''')
-                
-                conn.commit()
+
+                if legacy or leftover:
+                    self._migrate_legacy_shifts(cursor)
+
+                cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+                cursor.execute('COMMIT')
+            except Exception:
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+                raise
+            finally:
+                conn.close()
             logger.info("✅ SQLite database initialized")
         except Exception as e:
             logger.error(f"❌ Database initialization error: {e}")
 
+    def _migrate_legacy_shifts(self, cursor):
+        """Move rows from the old text/REAL schema into integer columns"""
+        rows = cursor.execute('''
+            SELECT date, start_time, end_time, revenue, tips, created_at, updated_at FROM shifts_legacy
+        ''').fetchall()
+
+        migrated = []
+        for date_str, start, end, revenue, tips, created_at, updated_at in rows:
+            try:
+                migrated.append((
+                    parse_date(date_str),
+                    parse_time(start),
+                    parse_time(end),
+                    None if revenue is None else round(revenue * 100),
+                    None if tips is None else round(tips * 100),
+                    created_at,
+                    updated_at
+                ))
+            except ValueError as e:
+                logger.warning(f"⚠️ Skipping legacy shift {date_str}: {e}")
+
+        cursor.executemany(f'''
+            INSERT OR REPLACE INTO shifts ({SHIFT_COLUMNS}, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', migrated)
+        cursor.execute('DROP TABLE shifts_legacy')
+        logger.info(f"✅ Migrated {len(migrated)} shifts to integer kopecks schema")
+
     def _get_connection(self):
         """Get database connection"""
         return sqlite3.connect(self.db_path)
 
-    async def add_shift(self, date_msg, start, end):
-        """Add shift to database"""
+    def _fetch_shift(self, conn, day):
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT {SHIFT_COLUMNS} FROM shifts WHERE day = ?
+        ''', (day,))
+        row = cursor.fetchone()
+        return Shift(*row) if row else None
+
+    async def add_shift(self, date_msg, start, end, reset_financials=False):
+        """Add shift to database with optional financial data reset"""
         try:
+            shift = Shift(day=parse_date(date_msg), start=parse_time(start), end=parse_time(end))
+
             with self._get_connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT OR REPLACE INTO shifts (date, start_time, end_time, updated_at)
-                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-                ''', (date_msg, start, end))
+                if reset_financials:
+                    cursor.execute(f'''
+                        INSERT OR REPLACE INTO shifts ({SHIFT_COLUMNS}, updated_at)
+                        VALUES (?, ?, ?, NULL, NULL, CURRENT_TIMESTAMP)
+                    ''', (shift.day, shift.start, shift.end))
+                else:
+                    cursor.execute(f'''
+                        INSERT INTO shifts ({SHIFT_COLUMNS}, updated_at)
+                        VALUES (?, ?, ?, NULL, NULL, CURRENT_TIMESTAMP)
+                        ON CONFLICT(day) DO UPDATE SET
+                            start_min = excluded.start_min,
+                            end_min = excluded.end_min,
+                            updated_at = CURRENT_TIMESTAMP
+                    ''', (shift.day, shift.start, shift.end))
                 conn.commit()
-            
-            logger.info(f"✅ Shift added to database: {date_msg}")
+
+            logger.info(f"✅ Shift added to database: {shift.date_str}")
             return True
+        except ValueError as e:
+            logger.error(f"❌ Invalid date/time format: {e}")
+            return False
         except Exception as e:
             logger.error(f"❌ Error adding shift to database: {e}")
             return False
@@ -63,47 +156,27 @@ class DatabaseManager:
     async def update_value(self, date_msg, field, value):
         """Update value in database"""
         try:
-            field_mapping = {
-                'начало': 'start_time',
-                'конец': 'end_time',
-                'выручка': 'revenue',
-                'чай': 'tips'
-            }
-            
-            db_field = field_mapping.get(field.lower())
-            if not db_field:
-                logger.error(f"❌ Unknown field: {field}")
-                return False
+            day = parse_date(date_msg)
 
             with self._get_connection() as conn:
-                cursor = conn.cursor()
-                
-                if db_field in ['revenue', 'tips']:
-                    # For numeric fields
-                    try:
-                        numeric_value = float(value)
-                    except ValueError:
-                        logger.error(f"❌ Invalid numeric value: {value}")
-                        return False
-                    
-                    cursor.execute(f'''
-                        UPDATE shifts SET {db_field} = ?, updated_at = CURRENT_TIMESTAMP
-                        WHERE date = ?
-                    ''', (numeric_value, date_msg))
-                else:
-                    # For text fields
-                    cursor.execute(f'''
-                        UPDATE shifts SET {db_field} = ?, updated_at = CURRENT_TIMESTAMP
-                        WHERE date = ?
-                    ''', (value, date_msg))
-                
-                if cursor.rowcount == 0:
-                    logger.warning(f"❌ No shift found for date: {date_msg}")
+                current = self._fetch_shift(conn, day)
+                if current is None:
+                    logger.warning(f"❌ No shift found for date: {format_date(day)}")
+                    return False
+
+                updated = apply_field(current, field, value)
+                if updated is None:
                     return False
-                
+
+                cursor = conn.cursor()
+                cursor.execute('''
+                    UPDATE shifts
+                    SET start_min = ?, end_min = ?, revenue = ?, tips = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE day = ?
+                ''', (updated.start, updated.end, updated.revenue, updated.tips, day))
                 conn.commit()
-            
-            logger.info(f"✅ Updated {field} for {date_msg} in database")
+
+            logger.info(f"✅ Updated {field} for {format_date(day)} in database")
             return True
         except Exception as e:
             logger.error(f"❌ Error updating value in database: {e}")
@@ -111,24 +184,10 @@ class DatabaseManager:
 
     async def get_profit(self, date_msg):
         """Get profit from database"""
-        try:
-            with self._get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT revenue, tips FROM shifts WHERE date = ?
-                ''', (date_msg,))
-                
-                result = cursor.fetchone()
-                if not result:
-                    return None
-                
-                revenue, tips = result
-                profit = (revenue or 0) + (tips or 0)
-                return str(profit)
-                
-        except Exception as e:
-            logger.error(f"❌ Error getting profit from database: {e}")
+        shift = await self.get_shift_data(date_msg)
+        if shift is None:
             return None
+        return format_money(shift.profit)
 
     async def check_shift_exists(self, date_msg):
         """Check if shift exists"""
@@ -136,70 +195,153 @@ class DatabaseManager:
             with self._get_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
-                    SELECT 1 FROM shifts WHERE date = ?
-                ''', (date_msg,))
-                
+                    SELECT 1 FROM shifts WHERE day = ?
+                ''', (parse_date(date_msg),))
+
                 return cursor.fetchone() is not None
-                
+
         except Exception as e:
             logger.error(f"❌ Error checking shift existence: {e}")
             return False
 
-    async def get_shifts_in_period(self, start_date, end_date):
-        """Get shifts for period"""
+    async def has_shift_today(self, date_msg):
+        """Check if shift exists for given date (for notifications)"""
+        return await self.check_shift_exists(date_msg)
+
+    async def delete_shift(self, date_msg):
+        """Delete shift by date"""
         try:
+            day = parse_date(date_msg)
             with self._get_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
-                    SELECT date, start_time, end_time, revenue, tips 
-                    FROM shifts 
-                    WHERE date BETWEEN ? AND ?
-                    ORDER BY date
-                ''', (start_date, end_date))
-                
-                shifts = []
-                for row in cursor.fetchall():
-                    shifts.append({
-                        'date': row[0],
-                        'start': row[1],
-                        'end': row[2],
-                        'revenue': row[3] or 0,
-                        'tips': row[4] or 0
-                    })
-                
-                return shifts
+                    DELETE FROM shifts WHERE day = ?
+                ''', (day,))
+                if cursor.rowcount == 0:
+                    logger.warning(f"Shift not found for deletion: {format_date(day)}")
+                    return False
+                conn.commit()
+
+            logger.info(f"✅ Deleted shift from database: {format_date(day)}")
+            return True
+        except Exception as e:
+            logger.error(f"❌ Error deleting shift from database: {e}")
+            return False
+
+    async def get_shift_data(self, date_msg):
+        """Get complete shift data for a specific date"""
+        try:
+            with self._get_connection() as conn:
+                return self._fetch_shift(conn, parse_date(date_msg))
+        except Exception as e:
+            logger.error(f"❌ Error getting shift data from database: {e}")
+            return None
+
+    async def get_all_shifts(self):
+        """Get all shifts from database"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    SELECT {SHIFT_COLUMNS} FROM shifts ORDER BY day
+                ''')
+                return [Shift(*row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"❌ Error getting all shifts from database: {e}")
+            return []
+
+    async def delete_month(self, key):
+        """Delete all shifts of a 'YYYY-MM' month (archived elsewhere)"""
+        try:
+            first, last = month_bounds(key)
+            with self._get_connection() as conn:
+                conn.execute('DELETE FROM shifts WHERE day BETWEEN ? AND ?', (first, last))
+                conn.commit()
+            return True
+        except Exception as e:
+            logger.error(f"❌ Error deleting month {key} from database: {e}")
+            return False
+
+    async def insert_shifts(self, shifts):
+        """Insert shifts, replacing the ones on the same days"""
+        try:
+            with self._get_connection() as conn:
+                conn.executemany(f'''
+                    INSERT OR REPLACE INTO shifts ({SHIFT_COLUMNS}) VALUES (?, ?, ?, ?, ?)
+                ''', [(s.day, s.start, s.end, s.revenue, s.tips) for s in shifts])
+                conn.commit()
+            return True
+        except Exception as e:
+            logger.error(f"❌ Error inserting shifts into database: {e}")
+            return False
+
+    async def replace_all(self, shifts):
+        """Replace the whole table with the given shifts (fallback copy of another backend)"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('DELETE FROM shifts')
+                cursor.executemany(f'''
+                    INSERT OR REPLACE INTO shifts ({SHIFT_COLUMNS}) VALUES (?, ?, ?, ?, ?)
+                ''', [(s.day, s.start, s.end, s.revenue, s.tips) for s in shifts])
+                conn.commit()
+            return True
+        except Exception as e:
+            logger.error(f"❌ Error replacing shifts in database: {e}")
+            return False
+
+    async def get_shifts_in_period(self, start_date, end_date=None):
+        """Get shifts for period (dates as 'dd.mm.yyyy' or date objects, no end - up to the last one)"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    SELECT {SHIFT_COLUMNS}
+                    FROM shifts
+                    WHERE day BETWEEN ? AND ?
+                    ORDER BY day
+                ''', (parse_date(start_date), parse_date(end_date) if end_date is not None else MAX_DAY))
+
+                return [Shift(*row) for row in cursor.fetchall()]
         except Exception as e:
             logger.error(f"❌ Error getting shifts in period: {e}")
             return []
 
     async def get_statistics(self, start_date, end_date):
-        """Get statistics for period"""
+        """Get statistics for period, all money values in integer kopecks"""
         try:
             with self._get_connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT 
+                cursor.execute(f'''
+                    SELECT
                         COUNT(*) as shift_count,
-                        SUM(revenue) as total_revenue,
-                        SUM(tips) as total_tips,
-                        AVG(revenue) as avg_revenue,
-                        AVG(tips) as avg_tips
-                    FROM shifts 
-                    WHERE date BETWEEN ? AND ?
-                ''', (start_date, end_date))
-                
+                        IFNULL(SUM(revenue), 0) as total_revenue,
+                        IFNULL(SUM(tips), 0) as total_tips,
+                        IFNULL(SUM({PROFIT_SQL}), 0) as total_profit,
+                        COUNT(revenue) as revenue_count,
+                        COUNT(tips) as tips_count
+                    FROM shifts
+                    WHERE day BETWEEN ? AND ?
+                ''', (parse_date(start_date), parse_date(end_date)))
+
                 result = cursor.fetchone()
                 if not result or not result[0]:
                     return None
-                
+
+                shift_count, total_revenue, total_tips, total_profit, revenue_count, tips_count = result
+
+                def average(total, count):
+                    # Незаполненные суммы (NULL) не считаются нулями в среднем
+                    return (total + count // 2) // count if count else 0
+
                 return {
-                    'shift_count': result[0],
-                    'total_revenue': result[1] or 0,
-                    'total_tips': result[2] or 0,
-                    'total_profit': (result[1] or 0) + (result[2] or 0),
-                    'avg_revenue': result[3] or 0,
-                    'avg_tips': result[4] or 0,
-                    'avg_profit': (result[3] or 0) + (result[4] or 0)
+                    'shift_count': shift_count,
+                    'total_revenue': total_revenue,
+                    'total_tips': total_tips,
+                    'total_profit': total_profit,
+                    'avg_revenue': average(total_revenue, revenue_count),
+                    'avg_tips': average(total_tips, tips_count),
+                    'avg_profit': average(total_profit, shift_count)
                 }
         except Exception as e:
             logger.error(f"❌ Error getting statistics: {e}")
@@ -0,0 +1,239 @@
+from collections import OrderedDict, deque
+from datetime import datetime
+import asyncio
+import logging
+
+from aiogram import types
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest
+
+import metrics
+from config import EXPORT_WORKERS
+from file_cache import content_hash, file_cache
+from outbox import BACKGROUND, priority
+from models import format_date
+from report_pool import report_pool
+from reports import period_start_day
+from storage import storage
+from summary_cache import summary_cache
+
+logger = logging.getLogger(__name__)
+
+PERIOD_TEXT = {
+    "week": "неделю",
+    "month": "месяц",
+    "quarter": "квартал",
+    "all": "весь период"
+}
+
+
+class ExportJob:
+    def __init__(self, msg, format_type, period):
+        self.msg = msg
+        self.format_type = format_type
+        self.period = period
+        self.status = None
+
+
+class ExportQueue:
+    """Exports as background jobs: a FIFO queue per user, bounded workers overall
+
+    Results are cached by (user, period, format, data version, day): a text
+    summary keeps its text, a file keeps the Telegram file_id of the first
+    upload, so a repeated export of unchanged data is sent without
+    regenerating or re-uploading anything.
+    """
+
+    def __init__(self, workers, per_user_limit=3, cache_size=256):
+        self._semaphore = asyncio.Semaphore(workers)
+        self.per_user_limit = per_user_limit
+        self.cache_size = cache_size
+        self._queues = {}
+        self._workers = {}
+        self._cache = OrderedDict()
+
+    async def submit(self, msg: types.Message, format_type: str, period: str):
+        """Поставить экспорт в очередь пользователя, False если не принят"""
+        user_id = msg.from_user.id
+        queue = self._queues.setdefault(user_id, deque())
+
+        if any(job.format_type == format_type and job.period == period for job in queue):
+            await msg.answer("⏳ Этот экспорт уже готовится, котик! 🐾")
+            return False
+        if len(queue) >= self.per_user_limit:
+            await msg.answer("⏳ Дождись готовых экспортов, котик! 🐾")
+            return False
+
+        job = ExportJob(msg, format_type, period)
+        job.status = await msg.answer(
+            "🔄 Подготавливаю данные для экспорта..." if not queue else "🕐 Экспорт в очереди..."
+        )
+        queue.append(job)
+        metrics.EXPORT_JOBS.inc(result='queued')
+
+        if user_id not in self._workers:
+            self._workers[user_id] = asyncio.create_task(self._drain(user_id, queue))
+        return True
+
+    async def cancel(self, user_id):
+        """Отменить очередь и текущий экспорт пользователя"""
+        queue = self._queues.pop(user_id, None)
+        worker = self._workers.pop(user_id, None)
+        if worker:
+            worker.cancel()
+        report_pool.cancel(user_id)
+        if not queue:
+            return False
+
+        for job in queue:
+            metrics.EXPORT_JOBS.inc(result='cancelled')
+            await self._progress(job, "🛑 Экспорт отменен")
+        logger.info(f"🛑 Exports cancelled for user {user_id}")
+        return True
+
+    async def join(self):
+        """Дождаться всех поставленных экспортов"""
+        while self._workers:
+            await asyncio.gather(*self._workers.values(), return_exceptions=True)
+
+    async def _drain(self, user_id, queue):
+        try:
+            while queue:
+                job = queue[0]
+                async with self._semaphore:
+                    await self._run(job)
+                if queue and queue[0] is job:
+                    queue.popleft()
+        finally:
+            if self._workers.get(user_id) is asyncio.current_task():
+                del self._workers[user_id]
+            if self._queues.get(user_id) is queue and not queue:
+                del self._queues[user_id]
+
+    async def _progress(self, job, text):
+        try:
+            # Прогресс не должен задерживать ответы пользователям
+            with priority(BACKGROUND):
+                await job.status.edit_text(text)
+        except TelegramAPIError as e:
+            # Сообщение не изменилось, удалено или Telegram недоступен
+            logger.debug(f"Export status not updated: {e}")
+
+    async def _run(self, job):
+        msg = job.msg
+        user_id = msg.from_user.id
+        today = datetime.now().date()
+        key = (user_id, job.period, job.format_type, storage.data_version, today)
+
+        try:
+            cached = self._cache.get(key)
+            if cached:
+                self._cache.move_to_end(key)
+                metrics.CACHE_REQUESTS.inc(cache='export', result='hit')
+                try:
+                    await self._deliver(job, key, *cached)
+                    metrics.EXPORT_JOBS.inc(result='done')
+                    return
+                except TelegramBadRequest as e:
+                    if job.format_type == "text":
+                        raise
+                    # Telegram больше не принимает file_id - собираем файл заново
+                    logger.warning(f"⚠️ Cached export file_id rejected, rebuilding: {e}")
+                    self._cache.pop(key, None)
+            metrics.CACHE_REQUESTS.inc(cache='export', result='miss')
+
+            if job.format_type == "text":
+                # Сводка считается по кэшу смен, который обновляется при записи
+                await self._progress(job, "⚙️ Считаю статистику...")
+                shifts_count, content = await summary_cache.summary(job.period, today)
+                if not shifts_count:
+                    await self._progress(job, "❌ Нет данных за выбранный период, котик! 🐾")
+                    return
+                await self._deliver(job, key, shifts_count, content)
+                metrics.EXPORT_JOBS.inc(result='done')
+                return
+
+            await self._progress(job, "🔄 Загружаю смены...")
+            start_day = period_start_day(job.period, today)
+            if start_day is None:
+                all_shifts = await storage.get_all_shifts()
+            else:
+                # Только листы за нужные месяцы, а не вся история
+                all_shifts = await storage.get_shifts_in_period(format_date(start_day))
+            if not all_shifts:
+                await self._progress(job, "❌ Нет данных для экспорта, котик! 🐾")
+                return
+
+            await self._progress(job, f"⚙️ Формирую отчет ({len(all_shifts)} смен)...")
+            result = await report_pool.render(user_id, all_shifts, job.format_type, job.period, today)
+            if result is None:
+                # Отменен кнопкой "❌ Отмена"
+                return
+
+            shifts_count, content = result
+            if not shifts_count:
+                await self._progress(job, "❌ Нет данных за выбранный период, котик! 🐾")
+                return
+
+            await self._deliver(job, key, shifts_count, content)
+            metrics.EXPORT_JOBS.inc(result='done')
+
+        except Exception as e:
+            metrics.EXPORT_JOBS.inc(result='failed')
+            logger.error(f"❌ Error in export job: {e}")
+            await self._progress(job, "❌ Ошибка при экспорте данных, котик! 🐾")
+
+    async def _deliver(self, job, key, shifts_count, content):
+        """Отправить результат; content - текст, байты файла или file_id"""
+        msg = job.msg
+
+        if job.format_type == "text":
+            await self._progress(job, "✅ Сводка готова!")
+            await msg.answer(content, parse_mode="Markdown")
+            self._remember(key, shifts_count, content)
+            return
+
+        period_text = PERIOD_TEXT.get(job.period, "весь период")
+        if job.format_type == "csv":
+            caption = f"📊 Экспорт данных за {period_text} ({shifts_count} смен)\n\nФайл готов для открытия в Excel! 📈"
+        else:
+            # Для Excel используем тот же CSV (Excel отлично открывает CSV)
+            caption = f"📈 Excel-совместимый файл за {period_text} ({shifts_count} смен)\n\nОткрой в Excel для красивого отображения! ✨"
+
+        await self._progress(job, "📤 Отправляю файл...")
+        if isinstance(content, bytes):
+            sent = await self._send_file(msg, content, caption)
+        else:
+            sent = await msg.answer_document(document=content, caption=caption)
+        await self._progress(job, "✅ Экспорт готов!")
+
+        if sent.document:
+            self._remember(key, shifts_count, sent.document.file_id)
+
+    async def _send_file(self, msg, content, caption):
+        """Отправить файл по file_id, если такой же уже загружался"""
+        digest = content_hash(content)
+        file_id = await asyncio.to_thread(file_cache.get, digest)
+        if file_id:
+            try:
+                return await msg.answer_document(document=file_id, caption=caption)
+            except TelegramBadRequest as e:
+                logger.warning(f"⚠️ Cached file_id rejected, uploading again: {e}")
+                await asyncio.to_thread(file_cache.discard, digest)
+
+        filename = f"смены_{datetime.now().strftime('%Y%m%d_%H%M')}.csv"
+        sent = await msg.answer_document(
+            document=types.BufferedInputFile(content, filename=filename),
+            caption=caption
+        )
+        if sent.document:
+            await asyncio.to_thread(file_cache.put, digest, sent.document.file_id)
+        return sent
+
+    def _remember(self, key, shifts_count, content):
+        self._cache[key] = (shifts_count, content)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+
+export_queue = ExportQueue(EXPORT_WORKERS)
@@ -0,0 +1,258 @@
+from datetime import date
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+
+import metrics
+from circuit_breaker import CircuitOpenError
+from models import format_date, parse_date
+
+logger = logging.getLogger(__name__)
+
+
+def _json_default(value):
+    """Dates in journaled arguments are stored the way users type them"""
+    if isinstance(value, date):
+        return format_date(parse_date(value))
+    return str(value)
+
+
+class WriteJournal:
+    """Writes accepted by the fallback while the primary was unavailable
+
+    Stored in the fallback's SQLite file, so the journal survives a
+    restart in the middle of an outage and is replayed in insertion order.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS write_journal (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    method TEXT NOT NULL,
+                    args TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            ''')
+            self.pending = conn.execute('SELECT COUNT(*) FROM write_journal').fetchone()[0]
+        metrics.JOURNAL_PENDING.set(self.pending)
+
+    def append(self, method, args):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                'INSERT INTO write_journal (method, args, created_at) VALUES (?, ?, ?)',
+                (method, json.dumps(args, default=_json_default), time.time())
+            )
+        self.pending += 1
+        metrics.JOURNAL_PENDING.set(self.pending)
+
+    def entries(self, limit=100):
+        with sqlite3.connect(self.db_path) as conn:
+            rows = conn.execute(
+                'SELECT id, method, args FROM write_journal ORDER BY id LIMIT ?', (limit,)
+            ).fetchall()
+        return [(entry_id, method, json.loads(args)) for entry_id, method, args in rows]
+
+    def remove(self, entry_id):
+        with sqlite3.connect(self.db_path) as conn:
+            removed = conn.execute('DELETE FROM write_journal WHERE id = ?', (entry_id,)).rowcount
+        self.pending -= removed
+        metrics.JOURNAL_PENDING.set(self.pending)
+
+
+class FailoverBackend:
+    """Primary storage behind a circuit breaker, local fallback when it trips
+
+    While the breaker is closed, calls go to the primary and writes are
+    mirrored into the fallback, which keeps a full copy. When the primary
+    fails or is open, reads are served and writes are accepted by the
+    fallback, and the writes are journaled. Until the journal is replayed
+    into the primary, all calls stay on the fallback so readers never see
+    the primary without those writes.
+    """
+
+    def __init__(self, primary, fallback, breaker, journal, probe_interval=None):
+        self.primary = primary
+        self.fallback = fallback
+        self.breaker = breaker
+        self.journal = journal
+        self.probe_interval = probe_interval or breaker.open_seconds
+        self._replay_task = None
+        self._monitor = None
+
+    async def _primary(self, method, *args):
+        return await self.breaker.call(getattr(self.primary, method), *args)
+
+    async def _read(self, method, *args):
+        if not self.journal.pending:
+            try:
+                return await self._primary(method, *args)
+            except CircuitOpenError:
+                pass
+            except Exception as e:
+                logger.warning(f"⚠️ {method} failed on primary storage, using fallback: {e}")
+        else:
+            self._start_replay()
+
+        metrics.FAILOVER_CALLS.inc(method=method)
+        return await getattr(self.fallback, method)(*args)
+
+    async def _write(self, method, *args):
+        if not self.journal.pending:
+            try:
+                result = await self._primary(method, *args)
+            except CircuitOpenError:
+                pass
+            except Exception as e:
+                logger.warning(f"⚠️ {method} failed on primary storage, journaling it: {e}")
+            else:
+                if result and not await getattr(self.fallback, method)(*args):
+                    logger.warning(f"⚠️ Fallback copy is out of sync after {method}{args}")
+                return result
+
+        metrics.FAILOVER_CALLS.inc(method=method)
+        result = await getattr(self.fallback, method)(*args)
+        if result:
+            self.journal.append(method, list(args))
+            logger.info(f"📒 Journaled {method}{tuple(args)} ({self.journal.pending} pending)")
+            self._start_replay()
+        return result
+
+    async def add_shift(self, date_msg, start, end, reset_financials=False):
+        return await self._write('add_shift', date_msg, start, end, reset_financials)
+
+    async def update_value(self, date_msg, field, value):
+        return await self._write('update_value', date_msg, field, value)
+
+    async def delete_shift(self, date_msg):
+        return await self._write('delete_shift', date_msg)
+
+    async def get_profit(self, date_msg):
+        return await self._read('get_profit', date_msg)
+
+    async def check_shift_exists(self, date_msg):
+        return await self._read('check_shift_exists', date_msg)
+
+    async def has_shift_today(self, date_msg):
+        return await self._read('has_shift_today', date_msg)
+
+    async def get_shift_data(self, date_msg):
+        return await self._read('get_shift_data', date_msg)
+
+    async def get_all_shifts(self):
+        return await self._read('get_all_shifts')
+
+    async def get_shifts_in_period(self, start_date, end_date=None):
+        return await self._read('get_shifts_in_period', start_date, end_date)
+
+    @property
+    def healthy(self):
+        """Primary is in use and has every write"""
+        return not self.journal.pending and self.breaker.state == 'closed'
+
+    async def apply_external(self, changes):
+        """Copy shifts edited directly in the primary (day -> Shift or None) into the fallback"""
+        await self.fallback.insert_shifts([shift for shift in changes.values() if shift is not None])
+        for day, shift in changes.items():
+            if shift is None:
+                await self.fallback.delete_shift(format_date(day))
+
+    async def _bulk(self, method, *args):
+        """Maintenance writes (archiving): both copies or nothing, never journaled"""
+        if not self.healthy:
+            logger.warning(f"⚠️ {method} postponed: primary storage is not healthy")
+            return False
+        try:
+            if not await self._primary(method, *args):
+                return False
+        except Exception as e:
+            logger.warning(f"⚠️ {method} failed on primary storage: {e}")
+            return False
+        return await getattr(self.fallback, method)(*args)
+
+    async def delete_month(self, key):
+        return await self._bulk('delete_month', key)
+
+    async def insert_shifts(self, shifts):
+        return await self._bulk('insert_shifts', shifts)
+
+    async def compact(self):
+        """Tombstone compaction and re-sort in the primary; the fallback needs neither"""
+        if not self.healthy:
+            logger.warning("⚠️ compact postponed: primary storage is not healthy")
+            return 0
+        try:
+            return await self._primary('compact')
+        except Exception as e:
+            logger.warning(f"⚠️ compact failed on primary storage: {e}")
+            return 0
+
+    def _start_replay(self):
+        if self._replay_task is None or self._replay_task.done():
+            self._replay_task = asyncio.create_task(self.replay())
+
+    async def replay(self):
+        """Apply journaled writes to the primary in order, True when the journal is empty"""
+        replayed = 0
+        while self.journal.pending:
+            entries = await asyncio.to_thread(self.journal.entries)
+            if not entries:
+                break
+            for entry_id, method, args in entries:
+                try:
+                    result = await self._primary(method, *args)
+                except CircuitOpenError:
+                    return False
+                except Exception as e:
+                    logger.warning(f"⚠️ Journal replay stopped at {method}{tuple(args)}: {e}")
+                    return False
+                if not result:
+                    # Например, удаление уже удаленной смены - повторять нечего
+                    logger.warning(f"⚠️ Journaled {method}{tuple(args)} was rejected by primary storage, dropping it")
+                await asyncio.to_thread(self.journal.remove, entry_id)
+                replayed += 1
+
+        if replayed:
+            logger.info(f"✅ Replayed {replayed} journaled writes into primary storage")
+        return True
+
+    async def sync_fallback(self):
+        """Copy every shift from the primary into the fallback"""
+        shifts = await self._primary('get_all_shifts')
+        await self.fallback.replace_all(shifts)
+        logger.info(f"✅ Fallback storage synced: {len(shifts)} shifts")
+
+    async def start(self):
+        """Bring the fallback up to date and start watching for recovery"""
+        if self.journal.pending:
+            # Остались записи с прошлого запуска: сначала довести их до основного хранилища
+            logger.warning(f"⚠️ {self.journal.pending} journaled writes left from the last run")
+            self._start_replay()
+            await self._replay_task
+        if not self.journal.pending:
+            try:
+                await self.sync_fallback()
+            except Exception as e:
+                logger.error(f"❌ Could not sync fallback storage: {e}")
+        self._monitor = asyncio.create_task(self._watch())
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.probe_interval)
+            try:
+                if self.journal.pending:
+                    self._start_replay()
+                    await self._replay_task
+                elif self.breaker.state != 'closed':
+                    # Пробный запрос, чтобы цепь закрылась и без запросов пользователей
+                    await self._read('check_shift_exists', date.today())
+            except Exception as e:
+                logger.error(f"❌ Storage recovery check failed: {e}")
+
+    async def stop(self):
+        for task in (self._monitor, self._replay_task):
+            if task and not task.done():
+                task.cancel()
@@ -0,0 +1,106 @@
+import hashlib
+import logging
+import sqlite3
+import time
+
+import metrics
+from config import FILE_CACHE_MAX_AGE_DAYS, FILE_CACHE_MAX_ENTRIES, FILE_CACHE_PATH
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+class FileIdCache:
+    """Content hash -> Telegram file_id of an already uploaded document
+
+    Persisted in SQLite so identical files are sent by reference across
+    restarts. Entries older than max_age_days are dropped, and beyond
+    max_entries the least recently used ones go first. Calls block on
+    SQLite, so async code runs them in a thread.
+    """
+
+    def __init__(self, db_path='file_cache.db', max_entries=1000, max_age_days=30):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 86400
+        self._init_db()
+
+    def _init_db(self):
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                columns = [row[1] for row in conn.execute('PRAGMA table_info(file_ids)')]
+                if 'size' in columns:
+                    # Старая схема с неиспользуемым размером - это только кэш, пересоздаем
+                    conn.execute('DROP TABLE file_ids')
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS file_ids (
+                        hash TEXT PRIMARY KEY,
+                        file_id TEXT NOT NULL,
+                        created_at REAL NOT NULL,
+                        last_used REAL NOT NULL
+                    )
+                ''')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_file_ids_last_used ON file_ids(last_used)')
+                conn.commit()
+        except Exception as e:
+            logger.error(f"❌ File cache initialization error: {e}")
+
+    def get(self, digest):
+        """file_id for the content hash or None"""
+        try:
+            now = time.time()
+            with sqlite3.connect(self.db_path) as conn:
+                row = conn.execute(
+                    'SELECT file_id FROM file_ids WHERE hash = ? AND created_at >= ?',
+                    (digest, now - self.max_age)
+                ).fetchone()
+                if row:
+                    conn.execute('UPDATE file_ids SET last_used = ? WHERE hash = ?', (now, digest))
+                    conn.commit()
+            metrics.CACHE_REQUESTS.inc(cache='file_id', result='hit' if row else 'miss')
+            return row[0] if row else None
+        except Exception as e:
+            logger.error(f"❌ Error reading file cache: {e}")
+            return None
+
+    def put(self, digest, file_id):
+        try:
+            now = time.time()
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute('''
+                    INSERT INTO file_ids (hash, file_id, created_at, last_used)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(hash) DO UPDATE SET
+                        file_id = excluded.file_id,
+                        created_at = excluded.created_at,
+                        last_used = excluded.last_used
+                ''', (digest, file_id, now, now))
+                self._evict(conn, now)
+                conn.commit()
+            return True
+        except Exception as e:
+            logger.error(f"❌ Error writing file cache: {e}")
+            return False
+
+    def discard(self, digest):
+        """Forget a file_id Telegram no longer accepts"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute('DELETE FROM file_ids WHERE hash = ?', (digest,))
+                conn.commit()
+        except Exception as e:
+            logger.error(f"❌ Error writing file cache: {e}")
+
+    def _evict(self, conn, now):
+        conn.execute('DELETE FROM file_ids WHERE created_at < ?', (now - self.max_age,))
+        conn.execute('''
+            DELETE FROM file_ids WHERE hash NOT IN (
+                SELECT hash FROM file_ids ORDER BY last_used DESC LIMIT ?
+            )
+        ''', (self.max_entries,))
+
+
+file_cache = FileIdCache(FILE_CACHE_PATH, FILE_CACHE_MAX_ENTRIES, FILE_CACHE_MAX_AGE_DAYS)
@@ -0,0 +1,10 @@
+from aiogram import Router
+
+from handlers import admin, common, export
+
+
+def setup_routers():
+    """Корневой роутер со всеми обработчиками по разделам"""
+    root = Router(name='root')
+    root.include_routers(admin.router, export.router, common.router)
+    return root
@@ -0,0 +1,24 @@
+from aiogram import Router, types
+
+from config import ADMIN_ID
+from handlers.export import export_data
+from handlers.menu import TextMenu
+
+router = Router(name='admin')
+menu = TextMenu(router)
+
+
+def is_admin(user_id: int) -> bool:
+    """Проверка, является ли пользователь администратором"""
+    return user_id == ADMIN_ID
+
+
+# КОМАНДА СТАТИСТИКИ (только для админа)
+@menu.button("📊 Статистика")
+async def statistics_button(msg: types.Message):
+    """Обработка кнопки статистики (только для админа)"""
+    if not is_admin(msg.from_user.id):
+        await msg.answer("❌ Эта функция доступна только администратору, котик! 🐾")
+        return
+    
+    await export_data(msg, "text", "all")
@@ -0,0 +1,57 @@
+import logging
+
+from aiogram import Router, types
+from aiogram.filters import Command
+from aiogram.fsm.context import FSMContext
+
+from keyboards import get_main_keyboard
+
+logger = logging.getLogger(__name__)
+
+router = Router(name='common')
+
+
+async def cancel_action(message: types.Message, state: FSMContext, text: str = "Действие отменено, котик! 🐾"):
+    """Универсальная функция отмены действия"""
+    await state.clear()
+    await message.answer(
+        f"{text}\nВозвращаю в главное меню! 🌸",
+        reply_markup=get_main_keyboard(message.from_user.id)
+    )
+
+
+# Обновленная функция помощи
+@router.message(Command("help"))
+async def help_cmd(msg: types.Message):
+    """Расширенная помощь с примерами"""
+    help_text = (
+        "🌸 *Помощь по командам:*\n\n"
+        
+        "📅 *ОСНОВНЫЕ КНОПКИ:*\n"
+        "• *📅 Добавить смену* - записать рабочее время\n"
+        "• *💰 Выручка* - добавить дневную выручку\n" 
+        "• *💖 Чаевые* - учесть чаевые\n"
+        "• *📊 Прибыль* - узнать заработок за день\n"
+        "• *🎯 Сегодня* - быстрый ввод за сегодня\n"
+        "• *🔄 Изменить* - исправить данные\n"
+        "• *🗑️ Удалить* - удалить смену (осторожно!)\n"
+        "• *📅 График* - посмотреть смены на неделю\n"
+        "• *📅 Неделя* - добавить смены на всю неделю\n"
+        "• *📤 Экспорт* - выгрузить данные в файл\n\n"
+        
+        "💫 *ПРИМЕРЫ ИСПОЛЬЗОВАНИЯ:*\n"
+        "• *Добавить смену:* \"15.03.2024 9-18\" или \"10:00-19:00\"\n"
+        "• *Быстрый ввод:* \"15000 1200\" (выручка и чаевые)\n"
+        "• *Формула прибыли:* (часы × 220) + чаевые + (выручка × 0.015)\n\n"
+        
+        "📊 *ЭКСПОРТ ДАННЫХ:*\n"
+        "• CSV файл - для анализа в Excel\n"
+        "• Текстовая сводка - статистика в сообщении\n"
+        "• За период - данные за неделю/месяц/квартал\n\n"
+        
+        "❓ *НУЖНА ПОМОЩЬ?*\n"
+        "Напиши /onboarding для повторного обучения\n"
+        "Или просто нажми любую кнопку - я подскажу! 🐾"
+    )
+    
+    await msg.answer(help_text, parse_mode="Markdown", reply_markup=get_main_keyboard(msg.from_user.id))
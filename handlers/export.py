@@ -0,0 +1,115 @@
+import logging
+
+from aiogram import Router, types
+from aiogram.fsm.context import FSMContext
+
+from export_jobs import export_queue
+from handlers.common import cancel_action
+from handlers.menu import TextMenu
+from handlers.states import Form
+from keyboards import get_export_keyboard, get_period_keyboard
+
+logger = logging.getLogger(__name__)
+
+router = Router(name='export')
+menu = TextMenu(router)
+
+
+# ФУНКЦИИ ЭКСПОРТА ДАННЫХ
+async def export_data(msg: types.Message, format_type: str = "csv", period: str = "all"):
+    """Постановка экспорта в фоновую очередь, прогресс показывается в статусном сообщении"""
+    try:
+        await export_queue.submit(msg, format_type, period)
+    except Exception as e:
+        logger.error(f"❌ Error in export_data: {e}")
+        await msg.answer("❌ Ошибка при экспорте данных, котик! 🐾")
+
+# ОБРАБОТЧИКИ ЭКСПОРТА
+@menu.button("📤 Экспорт")
+async def export_button(msg: types.Message, state: FSMContext):
+    """Обработка кнопки экспорта"""
+    await msg.answer(
+        "📤 **Экспорт данных**\n\n"
+        "Выбери формат экспорта:\n\n"
+        "• *📊 CSV файл* - для Excel и анализа\n"
+        "• *📈 Excel файл* - CSV с подсказкой для Excel\n" 
+        "• *📋 Текстовая сводка* - статистика в сообщении\n"
+        "• *📅 За период* - выбери период для экспорта",
+        parse_mode="Markdown",
+        reply_markup=get_export_keyboard()
+    )
+    await state.set_state(Form.waiting_for_export_format)
+
+@menu.button("📅 За период", state=Form.waiting_for_export_format)
+async def export_period_handler(msg: types.Message, state: FSMContext):
+    """Выбор периода для экспорта"""
+    await msg.answer(
+        "📅 **Выбери период для экспорта:**\n\n"
+        "• *Неделя* - данные за последние 7 дней\n"
+        "• *Месяц* - данные за последние 30 дней\n"
+        "• *Квартал* - данные за последние 90 дней\n"
+        "• *Все данные* - полная история смен",
+        parse_mode="Markdown",
+        reply_markup=get_period_keyboard()
+    )
+    await state.set_state(Form.waiting_for_export_period)
+
+@menu.button(state=Form.waiting_for_export_period)
+async def export_period_selected(msg: types.Message, state: FSMContext):
+    """Обработка выбора периода"""
+    period_map = {
+        "📅 Неделя": "week",
+        "📅 Месяц": "month", 
+        "📅 Квартал": "quarter",
+        "📅 Все данные": "all"
+    }
+    
+    if msg.text not in period_map:
+        await msg.answer("❌ Пожалуйста, выбери период из предложенных вариантов")
+        return
+    
+    period = period_map[msg.text]
+    
+    await msg.answer(
+        f"📤 **Экспорт данных за {period_map[msg.text]}**\n\n"
+        "Выбери формат экспорта:",
+        reply_markup=get_export_keyboard()
+    )
+    
+    # Сохраняем период в состоянии
+    await state.update_data(export_period=period)
+    await state.set_state(Form.waiting_for_export_format)
+
+# Форматы с учетом выбранного периода (по умолчанию - все данные)
+@menu.button("📊 CSV файл", state=Form.waiting_for_export_format)
+async def export_csv_with_period(msg: types.Message, state: FSMContext):
+    """Экспорт в CSV с учетом периода"""
+    user_data = await state.get_data()
+    period = user_data.get('export_period', 'all')
+    await export_data(msg, "csv", period)
+    await state.clear()
+
+@menu.button("📈 Excel файл", state=Form.waiting_for_export_format)
+async def export_excel_with_period(msg: types.Message, state: FSMContext):
+    """Экспорт в Excel с учетом периода"""
+    user_data = await state.get_data()
+    period = user_data.get('export_period', 'all')
+    await export_data(msg, "excel", period)
+    await state.clear()
+
+@menu.button("📋 Текстовая сводка", state=Form.waiting_for_export_format)
+async def export_text_with_period(msg: types.Message, state: FSMContext):
+    """Экспорт текстовой сводки с учетом периода"""
+    user_data = await state.get_data()
+    period = user_data.get('export_period', 'all')
+    await export_data(msg, "text", period)
+    await state.clear()
+
+# Отмена, в том числе уже поставленного в очередь экспорта
+@menu.button("❌ Отмена", state=Form.waiting_for_export_format)
+@menu.button("❌ Отмена", state=Form.waiting_for_export_period)
+@menu.button("❌ Отмена")
+async def cancel_export(msg: types.Message, state: FSMContext):
+    """Отмена экспорта (в том числе уже поставленного в очередь)"""
+    await export_queue.cancel(msg.from_user.id)
+    await cancel_action(msg, state, "Экспорт отменен, котик! 🐾")
@@ -0,0 +1,43 @@
+from aiogram.dispatcher.event.handler import CallableObject
+from aiogram.filters import Filter
+from aiogram.fsm.state import State
+
+# Любое состояние / любой текст
+ANY = '*'
+
+
+class TextMenu(Filter):
+    """Exact (FSM state, button text) lookup for one feature router
+
+    Instead of one handler per button with filters checked one by one,
+    the router gets a single handler guarded by this filter, and the
+    filter finds the callback with up to three dict lookups:
+    (state, text), then (state, any text), then (any state, text).
+    Registering the same pair twice raises instead of leaving dead code.
+    """
+
+    def __init__(self, router):
+        self._table = {}
+        router.message.register(self._dispatch, self)
+
+    def button(self, text=ANY, state=ANY):
+        def decorator(callback):
+            key = (state.state if isinstance(state, State) else state, text)
+            if key in self._table:
+                raise ValueError(f"Button {text!r} in state {key[0]!r} is already handled "
+                                 f"by {self._table[key].callback.__name__}")
+            self._table[key] = CallableObject(callback)
+            return callback
+        return decorator
+
+    async def __call__(self, message, raw_state=None):
+        text = message.text
+        if text is None:
+            return False
+        table = self._table
+        handler = table.get((raw_state, text)) or table.get((raw_state, ANY)) or table.get((ANY, text))
+        return {'menu_handler': handler} if handler else False
+
+    @staticmethod
+    async def _dispatch(message, menu_handler, **data):
+        return await menu_handler.call(message, **data)
@@ -0,0 +1,27 @@
+from aiogram.fsm.state import State, StatesGroup
+
+
+class Form(StatesGroup):
+    waiting_for_date = State()
+    waiting_for_start = State()
+    waiting_for_end = State()
+    waiting_for_revenue_date = State()
+    waiting_for_revenue = State()
+    waiting_for_tips_date = State()
+    waiting_for_tips = State()
+    waiting_for_edit_date = State()
+    waiting_for_edit_field = State()
+    waiting_for_edit_value = State()
+    waiting_for_profit_date = State()
+    waiting_for_overwrite_confirm = State()
+    waiting_for_week_schedule = State()
+    waiting_for_week_confirmation = State()
+    waiting_for_quick_today = State()
+    waiting_for_shifts_count = State()
+    waiting_for_shift_data = State()
+    waiting_for_multiple_confirmation = State()
+    onboarding_step = State()
+    waiting_for_delete_date = State()
+    waiting_for_delete_confirmation = State()
+    waiting_for_export_format = State()
+    waiting_for_export_period = State()
@@ -0,0 +1,72 @@
+from functools import wraps
+import asyncio
+import logging
+import os
+import socket
+import time
+
+from sqlalchemy import Column, Float, MetaData, String, Table, create_engine, delete, insert
+from sqlalchemy.exc import IntegrityError
+
+logger = logging.getLogger(__name__)
+
+
+class JobLease:
+    """One row per (job, run) in the job store database
+
+    The replica that inserts the row first runs the job; the others see
+    the primary key conflict and skip it.
+    """
+
+    def __init__(self, url, owner=None, keep_days=30):
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        self.keep = keep_days * 86400
+        self.engine = create_engine(url)
+        metadata = MetaData()
+        self.table = Table(
+            'job_leases', metadata,
+            Column('job_id', String(191), primary_key=True),
+            Column('run_key', String(64), primary_key=True),
+            Column('owner', String(191), nullable=False),
+            Column('acquired_at', Float, nullable=False)
+        )
+        metadata.create_all(self.engine)
+
+    def acquire(self, job_id, run_key):
+        """True if this replica got the run, False if another one did"""
+        now = time.time()
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(insert(self.table).values(
+                    job_id=job_id, run_key=run_key, owner=self.owner, acquired_at=now
+                ))
+                conn.execute(delete(self.table).where(self.table.c.acquired_at < now - self.keep))
+            return True
+        except IntegrityError:
+            return False
+
+
+def leased(lease_getter, run_key):
+    """Decorator: run the job only if the lease for run_key(name) was acquired
+
+    lease_getter returns the JobLease in use (None - run unconditionally),
+    run_key gets the job function name and returns the key of this run.
+    """
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            lease = lease_getter()
+            if lease is not None:
+                key = run_key(func.__name__)
+                try:
+                    acquired = await asyncio.to_thread(lease.acquire, func.__name__, key)
+                except Exception as e:
+                    # Без базы лучше повторить напоминание, чем потерять его
+                    logger.error(f"❌ Job lease check failed for {func.__name__}: {e}")
+                    acquired = True
+                if not acquired:
+                    logger.info(f"⏭️ {func.__name__} ({key}) already ran on another replica")
+                    return None
+            return await func(*args, **kwargs)
+        return wrapper
+    return decorator
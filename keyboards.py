@@ -0,0 +1,121 @@
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.types import KeyboardButton, ReplyKeyboardMarkup
+from aiohttp import FormData
+
+from config import ADMIN_ID
+
+# id(markup) -> готовый JSON; клавиатуры ниже живут все время работы бота
+_registered = set()
+_serialized = {}
+
+
+def _keyboard(rows, **kwargs):
+    """Собрать клавиатуру один раз и зарегистрировать ее для кэша JSON"""
+    markup = ReplyKeyboardMarkup(
+        keyboard=[[KeyboardButton(text=text) for text in row] for row in rows],
+        resize_keyboard=True,
+        **kwargs
+    )
+    _registered.add(id(markup))
+    return markup
+
+
+_MAIN_ROWS = [
+    ["📅 Добавить смену", "💰 Выручка"],
+    ["💖 Чаевые", "📊 Прибыль"],
+    ["🎯 Сегодня", "🔄 Изменить"],
+    ["🗑️ Удалить", "📅 График"],
+    ["📅 Неделя", "📤 Экспорт"],
+    ["🌸 Помощь"],
+]
+
+MAIN_KEYBOARD = _keyboard(_MAIN_ROWS, input_field_placeholder="Выберите действие...")
+# Для администратора - с кнопкой статистики перед "Помощью"
+ADMIN_MAIN_KEYBOARD = _keyboard(
+    _MAIN_ROWS[:5] + [["📊 Статистика"]] + _MAIN_ROWS[5:],
+    input_field_placeholder="Выберите действие..."
+)
+
+ONBOARDING_KEYBOARD = _keyboard([["🚀 Начать пользоваться"], ["📚 Подробный обзор"]])
+CANCEL_KEYBOARD = _keyboard([["❌ Отмена"]])
+DATE_KEYBOARD = _keyboard([["📅 Сегодня", "📅 Вчера"], ["❌ Отмена"]])
+EDIT_KEYBOARD = _keyboard([["🕐 Начало", "🕘 Конец"], ["💰 Выручка", "💖 Чаевые"], ["❌ Отмена"]])
+DELETE_CONFIRMATION_KEYBOARD = _keyboard([["✅ Да, удалить", "❌ Нет, отмена"]])
+WEEK_CONFIRMATION_KEYBOARD = _keyboard([["✅ Да, добавить", "❌ Нет, отмена"]])
+EXPORT_KEYBOARD = _keyboard([["📊 CSV файл", "📈 Excel файл"], ["📋 Текстовая сводка", "📅 За период"], ["❌ Отмена"]])
+PERIOD_KEYBOARD = _keyboard([["📅 Неделя", "📅 Месяц"], ["📅 Квартал", "📅 Все данные"], ["❌ Отмена"]])
+
+
+def get_main_keyboard(user_id: int):
+    """Основная клавиатура в зависимости от прав пользователя"""
+    return ADMIN_MAIN_KEYBOARD if user_id == ADMIN_ID else MAIN_KEYBOARD
+
+
+def get_onboarding_keyboard():
+    """Клавиатура для онбординга"""
+    return ONBOARDING_KEYBOARD
+
+
+def get_cancel_keyboard():
+    """Клавиатура с кнопкой отмены"""
+    return CANCEL_KEYBOARD
+
+
+def get_date_keyboard():
+    """Клавиатура для быстрого выбора даты"""
+    return DATE_KEYBOARD
+
+
+def get_edit_keyboard():
+    """Клавиатура для выбора поля редактирования"""
+    return EDIT_KEYBOARD
+
+
+def get_delete_confirmation_keyboard():
+    """Клавиатура для подтверждения удаления"""
+    return DELETE_CONFIRMATION_KEYBOARD
+
+
+def get_week_confirmation_keyboard():
+    """Клавиатура для подтверждения добавления недели"""
+    return WEEK_CONFIRMATION_KEYBOARD
+
+
+def get_export_keyboard():
+    """Клавиатура для выбора формата экспорта"""
+    return EXPORT_KEYBOARD
+
+
+def get_period_keyboard():
+    """Клавиатура для выбора периода"""
+    return PERIOD_KEYBOARD
+
+
+class KeyboardCacheSession(AiohttpSession):
+    """aiohttp session sending registered keyboards as ready-made JSON
+
+    aiogram dumps and serializes reply_markup on every request. Registered
+    keyboards are serialized the same way on first use and then reused.
+    """
+
+    def build_form_data(self, bot, method):
+        markup = getattr(method, 'reply_markup', None)
+        if markup is None or id(markup) not in _registered:
+            return super().build_form_data(bot, method)
+
+        form = FormData(quote_fields=False)
+        files = {}
+        for key, value in method.model_dump(warnings=False, exclude={'reply_markup'}).items():
+            value = self.prepare_value(value, bot=bot, files=files)
+            if not value:
+                continue
+            form.add_field(key, value)
+
+        serialized = _serialized.get(id(markup))
+        if serialized is None:
+            serialized = _serialized[id(markup)] = self.prepare_value(markup, bot=bot, files=files)
+        form.add_field('reply_markup', serialized)
+
+        for key, value in files.items():
+            form.add_field(key, value.read(bot), filename=value.filename or key)
+        return form
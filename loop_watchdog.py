@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def _blocking_site(frame):
+    """Innermost frame that belongs to the bot itself, as 'file.py:function'"""
+    site = None
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if filename.startswith(PROJECT_DIR) and 'site-packages' not in filename:
+            site = f"{os.path.basename(filename)}:{frame.f_code.co_name}"
+            break
+        frame = frame.f_back
+    return site or 'unknown'
+
+
+class LoopWatchdog:
+    """Detects event-loop stalls and reports the stack that caused them.
+
+    A heartbeat coroutine stamps the time every interval; a daemon thread
+    notices when the stamp gets older than the threshold and captures the
+    loop thread's current stack, i.e. the code that is blocking the loop.
+    """
+
+    def __init__(self, threshold=0.25, interval=0.1):
+        self.threshold = threshold
+        self.interval = interval
+        self._last_beat = time.monotonic()
+        self._loop_thread_id = None
+        self._heartbeat_task = None
+        self._thread = None
+        self._stopped = threading.Event()
+        self._stall_reported = False
+
+    def start(self):
+        """Start watching the running event loop"""
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped.clear()
+        self._heartbeat_task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._monitor, name='loop-watchdog', daemon=True)
+        self._thread.start()
+        logger.info(f"🐕 Event loop watchdog started (threshold {self.threshold * 1000:.0f}ms)")
+
+    async def stop(self):
+        self._stopped.set()
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            try:
+                await self._heartbeat_task
+            except asyncio.CancelledError:
+                pass
+
+    async def _heartbeat(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - started - self.interval)
+            metrics.LOOP_LAG.observe(lag)
+            if self._stall_reported:
+                logger.warning(f"🐕 Event loop recovered after {lag * 1000:.0f}ms stall")
+                self._stall_reported = False
+            self._last_beat = now
+
+    def _monitor(self):
+        while not self._stopped.wait(self.interval / 2):
+            stalled_for = time.monotonic() - self._last_beat - self.interval
+            if stalled_for > self.threshold and not self._stall_reported:
+                self._stall_reported = True
+                self._report(stalled_for)
+
+    def _report(self, stalled_for):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+        site = _blocking_site(frame)
+        metrics.LOOP_STALLS.inc(site=site)
+        stack = ''.join(traceback.format_stack(frame))
+        logger.warning(
+            f"🐕 Event loop blocked for {stalled_for * 1000:.0f}ms+ in {site}\n{stack}"
+        )
+
+
+async def start_watchdog(enabled, threshold_ms, interval_ms):
+    """Create and start the watchdog if enabled in config (None otherwise)"""
+    if not enabled:
+        return None
+    watchdog = LoopWatchdog(threshold=threshold_ms / 1000, interval=interval_ms / 1000)
+    watchdog.start()
+    return watchdog
@@ -0,0 +1,275 @@
+from functools import wraps
+import bisect
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}"]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # per-bucket counts (last one is +Inf), sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _render_value(self, key, state):
+        counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', le))} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {total}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+HANDLER_LATENCY = REGISTRY.histogram(
+    'tanuki_handler_duration_seconds', 'Time spent in aiogram handlers', ['handler'])
+HANDLER_ERRORS = REGISTRY.counter(
+    'tanuki_handler_errors_total', 'Handlers that raised an exception', ['handler'])
+HANDLERS_IN_FLIGHT = REGISTRY.gauge(
+    'tanuki_handlers_in_flight', 'Handlers currently running')
+CHAT_QUEUED = REGISTRY.gauge(
+    'tanuki_chat_queued_updates', 'Updates waiting for an earlier update of the same chat')
+ADMISSION_IN_FLIGHT = REGISTRY.gauge(
+    'tanuki_admission_in_flight', 'Updates admitted and being handled')
+ADMISSION_QUEUE = REGISTRY.gauge(
+    'tanuki_admission_queue_depth', 'Updates waiting for admission')
+ADMISSION_WAIT = REGISTRY.histogram(
+    'tanuki_admission_wait_seconds', 'Time updates waited for admission')
+ADMISSION_SHED = REGISTRY.counter(
+    'tanuki_admission_shed_total', 'Updates rejected because a user or the whole admission queue was full', ['reason'])
+
+STORAGE_LATENCY = REGISTRY.histogram(
+    'tanuki_storage_duration_seconds', 'Time spent in storage backend calls', ['backend', 'method'])
+STORAGE_IN_FLIGHT = REGISTRY.gauge(
+    'tanuki_storage_in_flight', 'Storage calls currently running', ['backend'])
+
+SHEETS_CALLS = REGISTRY.counter(
+    'tanuki_sheets_api_calls_total', 'Google Sheets API calls by worksheet method', ['method'])
+SHEETS_THROTTLED = REGISTRY.counter(
+    'tanuki_sheets_throttled_total', 'Google Sheets API calls rejected with 429', ['method'])
+SHEETS_ERRORS = REGISTRY.counter(
+    'tanuki_sheets_api_errors_total', 'Google Sheets API calls that failed', ['method'])
+SHEETS_ACCOUNT_CALLS = REGISTRY.counter(
+    'tanuki_sheets_account_calls_total', 'Google Sheets API calls by service account', ['account'])
+SHEETS_REROUTED = REGISTRY.counter(
+    'tanuki_sheets_rerouted_total', 'Calls moved off the owning account (quota used or throttled)', ['account'])
+
+BREAKER_STATE = REGISTRY.gauge(
+    'tanuki_circuit_state', 'Circuit breaker state: 0 closed, 1 half-open, 2 open', ['breaker'])
+BREAKER_TRANSITIONS = REGISTRY.counter(
+    'tanuki_circuit_transitions_total', 'Circuit breaker state changes', ['breaker', 'state'])
+FAILOVER_CALLS = REGISTRY.counter(
+    'tanuki_failover_calls_total', 'Storage calls served by the fallback backend', ['method'])
+JOURNAL_PENDING = REGISTRY.gauge(
+    'tanuki_failover_journal_pending', 'Writes journaled during failover and not yet replayed')
+
+CHANGE_POLLS = REGISTRY.counter(
+    'tanuki_change_polls_total', 'Spreadsheet change polls by whether rows had to be read', ['result'])
+EXTERNAL_CHANGES = REGISTRY.counter(
+    'tanuki_external_changes_total', 'Shifts edited directly in the spreadsheet')
+
+CACHE_REQUESTS = REGISTRY.counter(
+    'tanuki_cache_requests_total', 'Cache lookups by result', ['cache', 'result'])
+
+JOB_LATENCY = REGISTRY.histogram(
+    'tanuki_job_duration_seconds', 'Time spent in scheduler jobs', ['job'])
+JOBS_IN_FLIGHT = REGISTRY.gauge(
+    'tanuki_jobs_in_flight', 'Scheduler jobs currently running')
+
+TELEGRAM_LATENCY = REGISTRY.histogram(
+    'tanuki_telegram_request_duration_seconds', 'Outbound Telegram Bot API requests', ['method'])
+TELEGRAM_ERRORS = REGISTRY.counter(
+    'tanuki_telegram_errors_total', 'Failed Telegram Bot API requests', ['method', 'error'])
+TELEGRAM_IN_FLIGHT = REGISTRY.gauge(
+    'tanuki_telegram_requests_in_flight', 'Outbound Telegram requests currently running')
+
+OUTBOX_QUEUE = REGISTRY.gauge(
+    'tanuki_outbox_waiting', 'Telegram requests waiting for a rate limit token', ['lane'])
+OUTBOX_WAIT = REGISTRY.histogram(
+    'tanuki_outbox_wait_seconds', 'Time spent waiting for a rate limit token', ['lane'])
+OUTBOX_MERGED = REGISTRY.counter(
+    'tanuki_outbox_merged_total', 'Queued messages merged into an earlier one to the same chat')
+TELEGRAM_RETRIES = REGISTRY.counter(
+    'tanuki_telegram_retries_total', 'Requests retried after a Telegram RetryAfter', ['method'])
+
+REPORT_LATENCY = REGISTRY.histogram(
+    'tanuki_report_duration_seconds', 'Report generation jobs in the worker pool', ['format'])
+REPORT_JOBS = REGISTRY.counter(
+    'tanuki_report_jobs_total', 'Report jobs by outcome', ['result'])
+EXPORT_JOBS = REGISTRY.counter(
+    'tanuki_export_jobs_total', 'Export queue jobs by outcome', ['result'])
+
+LOOP_LAG = REGISTRY.histogram(
+    'tanuki_event_loop_lag_seconds', 'Delay of the watchdog heartbeat on the event loop',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+LOOP_STALLS = REGISTRY.counter(
+    'tanuki_event_loop_stalls_total', 'Event loop stalls over the threshold by blocking code site', ['site'])
+
+
+def timed(histogram, in_flight=None, **labels):
+    """Decorator recording the duration of an async function"""
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            if in_flight:
+                in_flight.inc()
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started, **labels)
+                if in_flight:
+                    in_flight.dec()
+        return wrapper
+    return decorator
+
+
+def timed_job(func):
+    """Decorator for scheduler jobs"""
+    return timed(JOB_LATENCY, in_flight=JOBS_IN_FLIGHT, job=func.__name__)(func)
+
+
+async def start_metrics_server(port, host='0.0.0.0'):
+    """Serve REGISTRY on /metrics, returns the aiohttp runner (None if disabled)"""
+    if not port:
+        return None
+
+    from aiohttp import web
+
+    async def handle_metrics(request):
+        return web.Response(
+            text=REGISTRY.render(),
+            content_type='text/plain',
+            charset='utf-8',
+            headers={'X-Content-Type-Options': 'nosniff'}
+        )
+
+    async def handle_health(request):
+        return web.Response(text='ok')
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    app.router.add_get('/', handle_health)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"📈 Metrics available on http://{host}:{port}/metrics")
+    return runner
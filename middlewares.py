@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import time
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
+
+import metrics
+from account_pool import current_user
+from admission import admission
+from outbox import _permit_held, outbox
+
+logger = logging.getLogger(__name__)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner middleware timing every handler by its function name"""
+
+    async def __call__(self, handler, event, data):
+        # Кнопки меню идут через общий обработчик TextMenu, считаем по реальному
+        handler_object = data.get('menu_handler') or data.get('handler')
+        name = handler_object.callback.__name__ if handler_object else 'unknown'
+
+        metrics.HANDLERS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            metrics.HANDLER_ERRORS.inc(handler=name)
+            raise
+        finally:
+            metrics.HANDLER_LATENCY.observe(time.perf_counter() - started, handler=name)
+            metrics.HANDLERS_IN_FLIGHT.dec()
+
+
+class StorageUserMiddleware(BaseMiddleware):
+    """Outer update middleware: storage calls made for an update are routed by its user"""
+
+    async def __call__(self, handler, event, data):
+        user = data.get('event_from_user')
+        token = current_user.set(user.id if user else None)
+        try:
+            return await handler(event, data)
+        finally:
+            current_user.reset(token)
+
+
+BUSY_TEXT = "⏳ Бот сейчас перегружен, попробуйте еще раз через минуту"
+
+
+class AdmissionMiddleware(BaseMiddleware):
+    """Outer update middleware: admission control before any work is done
+
+    Updates over the in-flight limits wait in the controller's queue; once
+    it is full they are shed with a short "busy" reply instead of piling
+    up behind slow storage.
+    """
+
+    def __init__(self, controller=admission):
+        self.controller = controller
+
+    async def __call__(self, handler, event, data):
+        user = data.get('event_from_user')
+        if user is None:
+            return await handler(event, data)
+
+        if not await self.controller.acquire(user.id):
+            logger.warning(f"🚦 Overloaded: update from {user.id} rejected")
+            await self._reply_busy(event, data)
+            return None
+        try:
+            return await handler(event, data)
+        finally:
+            self.controller.release(user.id)
+
+    @staticmethod
+    async def _reply_busy(event, data):
+        bot = data.get('bot')
+        try:
+            if event.callback_query:
+                await bot.answer_callback_query(event.callback_query.id, BUSY_TEXT)
+            elif data.get('event_chat'):
+                await bot.send_message(data['event_chat'].id, BUSY_TEXT)
+        except Exception as e:
+            logger.error(f"❌ Could not send busy reply: {e}")
+
+
+class ChatOrderMiddleware(BaseMiddleware):
+    """Outer update middleware: updates of one chat run one at a time, in arrival order
+
+    Polling handles updates as concurrent tasks, so two quick answers of
+    one user could interleave their read-modify-write of a shift. Each chat
+    gets a FIFO lock, created with its first waiting update and dropped
+    once nothing waits on it; different chats never wait for each other.
+    """
+
+    def __init__(self):
+        # chat_id -> [asyncio.Lock, обновлений в работе или в очереди]
+        self._chats = {}
+
+    async def __call__(self, handler, event, data):
+        chat = data.get('event_chat')
+        if chat is None:
+            return await handler(event, data)
+
+        entry = self._chats.get(chat.id)
+        if entry is None:
+            entry = self._chats[chat.id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            lock = entry[0]
+            if lock.locked():
+                metrics.CHAT_QUEUED.inc()
+                try:
+                    await lock.acquire()
+                finally:
+                    metrics.CHAT_QUEUED.dec()
+            else:
+                await lock.acquire()
+            try:
+                return await handler(event, data)
+            finally:
+                lock.release()
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._chats[chat.id]
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    """Session middleware timing every outbound Bot API request"""
+
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+
+        metrics.TELEGRAM_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except TelegramAPIError as e:
+            metrics.TELEGRAM_ERRORS.inc(method=name, error=type(e).__name__)
+            raise
+        finally:
+            metrics.TELEGRAM_LATENCY.observe(time.perf_counter() - started, method=name)
+            metrics.TELEGRAM_IN_FLIGHT.dec()
+
+
+class RateLimitMiddleware(BaseRequestMiddleware):
+    """Session middleware passing chat requests through the outbox limits
+
+    Requests without chat_id (getUpdates, getMe...) are not limited. After
+    a RetryAfter the outbox is blocked for the given time and the request
+    is repeated, up to max_retries times.
+    """
+
+    def __init__(self, max_retries=3):
+        self.max_retries = max_retries
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, 'chat_id', None)
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        for attempt in range(self.max_retries + 1):
+            if attempt or not _permit_held.get():
+                await outbox.acquire(chat_id)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                metrics.TELEGRAM_RETRIES.inc(method=type(method).__name__)
+                logger.warning(f"⏳ Telegram asked to retry {type(method).__name__} in {e.retry_after}s")
+                outbox.block(e.retry_after)
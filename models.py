@@ -0,0 +1,273 @@
+from array import array
+from dataclasses import dataclass, replace
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+import logging
+
+logger = logging.getLogger(__name__)
+
+EPOCH = date(1970, 1, 1)
+DATE_FORMAT = "%d.%m.%Y"
+
+# Profit formula: (hours * 220) + tips + (revenue * 0.015)
+HOURLY_RATE = 22000            # kopecks per hour
+REVENUE_SHARE_PER_MILLE = 15   # 1.5% of revenue
+
+
+def parse_date(value):
+    """Convert 'dd.mm.yyyy' (or a date) to days since 1970-01-01"""
+    if isinstance(value, date):
+        return (value - EPOCH).days
+    return (datetime.strptime(str(value).strip(), DATE_FORMAT).date() - EPOCH).days
+
+
+def format_date(day):
+    """Convert days since 1970-01-01 back to 'dd.mm.yyyy'"""
+    return (EPOCH + timedelta(days=day)).strftime(DATE_FORMAT)
+
+
+def month_key(day):
+    """Month of a day as 'YYYY-MM'"""
+    value = EPOCH + timedelta(days=day)
+    return f"{value.year}-{value.month:02d}"
+
+
+def month_bounds(key):
+    """First and last day (days since 1970-01-01) of a 'YYYY-MM' month"""
+    year, month = map(int, key.split('-'))
+    first = date(year, month, 1)
+    following = date(year + month // 12, month % 12 + 1, 1)
+    return parse_date(first), parse_date(following) - 1
+
+
+def parse_time(value):
+    """Convert 'HH:MM' to minutes since midnight"""
+    hours, minutes = str(value).strip().split(':')
+    hours, minutes = int(hours), int(minutes)
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        raise ValueError(f"Invalid time: {value}")
+    return hours * 60 + minutes
+
+
+def format_time(minutes):
+    """Convert minutes since midnight to 'HH:MM'"""
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def parse_money(value):
+    """Parse a money value into integer kopecks, None for an empty cell"""
+    if value is None or str(value).strip() == '':
+        return None
+    try:
+        cleaned = str(value).replace(' ', '').replace('\xa0', '').replace(',', '.')
+        amount = Decimal(cleaned) * 100
+        return int(amount.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+    except (InvalidOperation, ValueError):
+        logger.warning(f"⚠️ Could not parse money value: {value}")
+        return None
+
+
+def format_money(kopecks):
+    """Format integer kopecks as '1234.50'"""
+    sign = '-' if kopecks < 0 else ''
+    rubles, kop = divmod(abs(kopecks), 100)
+    return f"{sign}{rubles}.{kop:02d}"
+
+
+def shift_minutes(start, end):
+    """Shift duration in minutes, handling overnight shifts"""
+    return (end - start) % 1440
+
+
+def calculate_profit(minutes, revenue, tips):
+    """Profit in kopecks: hourly rate for the worked time + tips + share of revenue"""
+    rate_income = (minutes * HOURLY_RATE + 30) // 60
+    revenue_share = ((revenue or 0) * REVENUE_SHARE_PER_MILLE + 500) // 1000
+    return rate_income + (tips or 0) + revenue_share
+
+
+@dataclass(frozen=True, slots=True)
+class Shift:
+    """One work shift.
+
+    day is days since 1970-01-01, start/end are minutes since midnight,
+    revenue/tips are kopecks (None while not entered yet).
+    """
+    day: int
+    start: int
+    end: int
+    revenue: int | None = None
+    tips: int | None = None
+
+    @classmethod
+    def from_row(cls, row):
+        """Build a shift from a sheet row ['Дата', 'Начало', 'Конец', 'Часы', 'Выручка', 'Чаевые', ...]"""
+        row = list(row) + [''] * (6 - len(row))
+        return cls(
+            day=parse_date(row[0]),
+            start=parse_time(row[1]),
+            end=parse_time(row[2]),
+            revenue=parse_money(row[4]),
+            tips=parse_money(row[5]),
+        )
+
+    @property
+    def date(self):
+        return EPOCH + timedelta(days=self.day)
+
+    @property
+    def date_str(self):
+        return format_date(self.day)
+
+    @property
+    def start_str(self):
+        return format_time(self.start)
+
+    @property
+    def end_str(self):
+        return format_time(self.end)
+
+    @property
+    def minutes(self):
+        return shift_minutes(self.start, self.end)
+
+    @property
+    def hours(self):
+        return round(self.minutes / 60, 2)
+
+    @property
+    def rate_income(self):
+        return calculate_profit(self.minutes, 0, 0)
+
+    @property
+    def revenue_share(self):
+        return calculate_profit(0, self.revenue, 0)
+
+    @property
+    def profit(self):
+        return calculate_profit(self.minutes, self.revenue, self.tips)
+
+    @property
+    def missing_fields(self):
+        """Names of financial fields that are still empty (zero counts as empty)"""
+        missing = []
+        if not self.revenue:
+            missing.append('выручка')
+        if not self.tips:
+            missing.append('чаевые')
+        return missing
+
+    @property
+    def is_complete(self):
+        return not self.missing_fields
+
+    def to_row(self):
+        """Sheet row for columns A:G, money as numbers in rubles"""
+        # Числа, а не текст '1234.50': в русской локали таблица не сложит текст
+        return [
+            self.date_str,
+            self.start_str,
+            self.end_str,
+            self.hours,
+            '' if self.revenue is None else self.revenue / 100,
+            '' if self.tips is None else self.tips / 100,
+            self.profit / 100,
+        ]
+
+
+def shifts_from_rows(rows):
+    """Bulk-convert sheet rows to shifts, skipping empty and malformed rows"""
+    shifts = []
+    for row in rows:
+        if not row or not str(row[0]).strip():
+            continue
+        try:
+            shifts.append(Shift.from_row(row))
+        except (ValueError, IndexError) as e:
+            logger.warning(f"⚠️ Skipping malformed row {row}: {e}")
+    return shifts
+
+
+def shift_after_write(current, method, *args):
+    """Shift stored after a successful storage write, None once deleted
+
+    Mirrors the backends' semantics so caches can follow writes without
+    reading the shift back: add_shift keeps revenue and tips unless
+    reset_financials is set, update_value changes a single field and
+    replace_shift (an edit made outside the bot) carries the new shift.
+    """
+    if method == 'delete_shift':
+        return None
+    if method == 'replace_shift':
+        return args[1]
+    if method == 'update_value':
+        return current and apply_field(current, args[1], args[2])
+    if method == 'add_shift':
+        date_msg, start, end = args[:3]
+        reset_financials = args[3] if len(args) > 3 else False
+        shift = Shift(parse_date(date_msg), parse_time(start), parse_time(end))
+        if current and not reset_financials:
+            shift = replace(current, start=shift.start, end=shift.end)
+        return shift
+    raise ValueError(f"Unknown write method: {method}")
+
+
+# Packed shift batches: 5 int64 per shift, -1 stands for a missing amount
+_PACKED_FIELDS = 5
+
+
+def pack_shifts(shifts):
+    """Serialize shifts to a compact bytes batch for worker processes"""
+    packed = array('q')
+    for shift in shifts:
+        packed.extend((
+            shift.day, shift.start, shift.end,
+            -1 if shift.revenue is None else shift.revenue,
+            -1 if shift.tips is None else shift.tips
+        ))
+    return packed.tobytes()
+
+
+def unpack_shifts(data):
+    """Inverse of pack_shifts"""
+    packed = array('q')
+    packed.frombytes(data)
+    shifts = []
+    for i in range(0, len(packed), _PACKED_FIELDS):
+        day, start, end, revenue, tips = packed[i:i + _PACKED_FIELDS]
+        shifts.append(Shift(
+            day, start, end,
+            None if revenue < 0 else revenue,
+            None if tips < 0 else tips
+        ))
+    return shifts
+
+
+# User-facing field names -> Shift attributes
+FIELD_MAPPING = {
+    'начало': 'start',
+    'конец': 'end',
+    'выручка': 'revenue',
+    'чай': 'tips'
+}
+
+
+def apply_field(shift, field, value):
+    """Return a copy of the shift with one field changed, None on invalid input"""
+    attr = FIELD_MAPPING.get(field.lower())
+    if not attr:
+        logger.error(f"❌ Unknown field: {field}")
+        return None
+
+    try:
+        if attr in ('start', 'end'):
+            parsed = parse_time(value)
+        else:
+            parsed = parse_money(value)
+            if parsed is None:
+                raise ValueError(value)
+    except ValueError:
+        logger.error(f"❌ Invalid value for {field}: {value}")
+        return None
+
+    return replace(shift, **{attr: parsed})
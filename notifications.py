@@ -1,61 +1,71 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
 from datetime import datetime, timedelta
 import pytz
 import logging
-from config import TIMEZONE, USER_ID
-import sheets
+from config import ARCHIVE_KEEP_MONTHS, JOB_MISFIRE_GRACE_SECONDS, JOBSTORE_URL, TIMEZONE, USER_ID
+from completeness import completeness
+from job_lease import JobLease, leased
+from metrics import timed_job
+from outbox import outbox
+from models import parse_date
+from storage import storage
 
 logger = logging.getLogger(__name__)
 
-async def check_incomplete_shifts():
-    """Проверяем смены без выручки или чаевых за последние 7 дней"""
+# Бот и лизы задаются в setup_scheduler: задачи хранятся в базе, поэтому
+# бот не передается им аргументом (его нельзя сериализовать)
+_bot = None
+_lease = None
+# Имя функции задачи -> ее CronTrigger, по нему считается ключ запуска
+_triggers = {}
+
+
+def _current_lease():
+    return _lease
+
+
+def _run_key(name):
+    """Ключ запуска: плановое время срабатывания, которое сейчас выполняется
+
+    Берется последнее время по расписанию задачи, не позже текущего, в
+    пределах JOB_MISFIRE_GRACE_SECONDS: запоздавший после рестарта запуск
+    получает тот же ключ, что и вовремя выполненный на другой реплике.
+    """
+    now = datetime.now(pytz.timezone(TIMEZONE))
+    trigger = _triggers.get(name)
+    scheduled = None
+    if trigger is not None:
+        fire = trigger.get_next_fire_time(None, now - timedelta(seconds=JOB_MISFIRE_GRACE_SECONDS + 60))
+        while fire is not None and fire <= now:
+            scheduled = fire
+            fire = trigger.get_next_fire_time(fire, fire + timedelta(seconds=1))
+    # Ручной запуск вне расписания - ключ по текущему времени
+    return (scheduled or now.replace(microsecond=0)).isoformat()
+
+
+async def check_incomplete_shifts(tracker=None):
+    """Смены без выручки или чаевых за последние 7 дней (исключая сегодня)"""
+    tracker = tracker or completeness
     try:
         if not USER_ID:
             return []
 
         tz = pytz.timezone(TIMEZONE)
-        today = datetime.now(tz).date()
+        today = parse_date(datetime.now(tz).date())
         
-        # Ищем смены за последние 7 дней без выручки или чаевых
-        incomplete_shifts = []
-        
-        for days_ago in range(1, 8):  # Проверяем последние 7 дней (исключая сегодня)
-            check_date = today - timedelta(days=days_ago)
-            date_str = check_date.strftime("%d.%m.%Y")
-            
-            # Проверяем существование смены
-            if await sheets.has_shift_today(date_str):
-                # Получаем полные данные смены
-                shift_data = await sheets.get_shift_data(date_str)
-                if shift_data:
-                    revenue = shift_data.get('revenue', '')
-                    tips = shift_data.get('tips', '')
-                    
-                    # Проверяем, заполнены ли выручка и чаевые
-                    is_revenue_filled = revenue and str(revenue).strip() != '' and str(revenue) != '0'
-                    is_tips_filled = tips and str(tips).strip() != '' and str(tips) != '0'
-                    
-                    if not is_revenue_filled or not is_tips_filled:
-                        incomplete_shifts.append({
-                            'date': date_str,
-                            'revenue': revenue if is_revenue_filled else None,
-                            'tips': tips if is_tips_filled else None,
-                            'missing_data': []
-                        })
-                        
-                        if not is_revenue_filled:
-                            incomplete_shifts[-1]['missing_data'].append('выручка')
-                        if not is_tips_filled:
-                            incomplete_shifts[-1]['missing_data'].append('чаевые')
-        
-        return incomplete_shifts
+        # Индекс обновляется при каждой записи, пересканировать хранилище не нужно
+        return await tracker.incomplete(today - 7, today - 1)
         
     except Exception as e:
         logger.error(f"❌ Error checking incomplete shifts: {e}")
         return []
 
-async def send_shift_reminder(bot):
+@timed_job
+@leased(_current_lease, _run_key)
+async def send_shift_reminder(bot=None):
     """Напоминание о смене в 10:00 с проверкой незаполненных данных"""
+    bot = bot or _bot
     try:
         if not USER_ID:
             logger.warning("USER_ID not set - skipping reminder")
@@ -70,7 +80,7 @@ async def send_shift_reminder(bot):
         messages = []
 
         # Проверяем сегодняшнюю смену
-        if await sheets.has_shift_today(today_str):
+        if await storage.has_shift_today(today_str):
             messages.append(
                 f"🌞 Доброе утро, котофей!\n"
                 f"Сегодня у тебя смена ({today_str}) 💪\n"
@@ -87,9 +97,8 @@ async def send_shift_reminder(bot):
             # Группируем по датам и показываем только последние 3
             incomplete_dates = []
             for shift in incomplete_shifts[:3]:
-                date_str = shift['date']
-                missing = " и ".join(shift['missing_data'])
-                incomplete_dates.append(f"• {date_str} (нет {missing})")
+                missing = " и ".join(shift.missing_fields)
+                incomplete_dates.append(f"• {shift.date_str} (нет {missing})")
             
             messages.append(
                 f"📝 Внимание!"
@@ -104,7 +113,7 @@ async def send_shift_reminder(bot):
 
         if messages:
             message_text = "\n\n".join(messages)
-            await bot.send_message(USER_ID, message_text)
+            await outbox.send_message(bot, USER_ID, message_text)
             logger.info("✅ Morning reminder sent successfully")
         else:
             logger.info("ℹ️ No reminders to send")
@@ -112,8 +121,11 @@ async def send_shift_reminder(bot):
     except Exception as e:
         logger.error(f"❌ Error sending shift reminder: {e}")
 
-async def send_evening_prompt(bot):
+@timed_job
+@leased(_current_lease, _run_key)
+async def send_evening_prompt(bot=None):
     """Напоминание вечером в день смены"""
+    bot = bot or _bot
     try:
         if not USER_ID:
             logger.warning("USER_ID not set - skipping evening prompt")
@@ -124,8 +136,9 @@ async def send_evening_prompt(bot):
         
         logger.info(f"🔔 Checking evening shift for {today}...")
 
-        if await sheets.has_shift_today(today):
-            await bot.send_message(
+        if await storage.has_shift_today(today):
+            await outbox.send_message(
+                bot,
                 USER_ID,
                 f"🌙 Привет, работничек!\n"
                 f"Надеюсь день прошел отлично!"
@@ -143,8 +156,11 @@ async def send_evening_prompt(bot):
     except Exception as e:
         logger.error(f"❌ Error sending evening prompt: {e}")
 
-async def send_weekly_summary(bot):
+@timed_job
+@leased(_current_lease, _run_key)
+async def send_weekly_summary(bot=None):
     """Еженедельная статистика в воскресенье вечером"""
+    bot = bot or _bot
     try:
         if not USER_ID:
             return
@@ -166,8 +182,7 @@ async def send_weekly_summary(bot):
         
         # Проверяем незаполненные данные за неделю
         incomplete_shifts = await check_incomplete_shifts()
-        weekly_incomplete = [s for s in incomplete_shifts 
-                           if start_date <= datetime.strptime(s['date'], "%d.%m.%Y").date() <= end_date]
+        weekly_incomplete = [s for s in incomplete_shifts if start_date <= s.date <= end_date]
         
         message_text = (
             f"📊 Воскресный вечер — в церковь не ходим, но самое время подвести итоги недели!\n"
@@ -177,9 +192,8 @@ async def send_weekly_summary(bot):
         if weekly_incomplete:
             incomplete_dates = []
             for shift in weekly_incomplete:
-                date_str = shift['date']
-                missing = " и ".join(shift['missing_data'])
-                incomplete_dates.append(f"• {date_str} (нет {missing})")
+                missing = " и ".join(shift.missing_fields)
+                incomplete_dates.append(f"• {shift.date_str} (нет {missing})")
             
             message_text += (
                 f"\n⚠️ Котик, обрати внимание:\n"
@@ -192,14 +206,17 @@ async def send_weekly_summary(bot):
         
         message_text += "\n\nИспользуй /stats чтобы посмотреть статистику за эту неделю 📈"
         
-        await bot.send_message(USER_ID, message_text)
+        await outbox.send_message(bot, USER_ID, message_text)
         logger.info(f"✅ Sent weekly summary reminder with {len(weekly_incomplete)} incomplete shifts")
             
     except Exception as e:
         logger.error(f"❌ Error sending weekly summary: {e}")
 
-async def send_data_completion_reminder(bot):
+@timed_job
+@leased(_current_lease, _run_key)
+async def send_data_completion_reminder(bot=None):
     """Отдельное напоминание о незаполненных данных (12:00)"""
+    bot = bot or _bot
     try:
         if not USER_ID:
             return
@@ -210,11 +227,11 @@ async def send_data_completion_reminder(bot):
             # Группируем по датам и показываем до 5
             incomplete_dates = []
             for shift in incomplete_shifts[:5]:
-                date_str = shift['date']
-                missing = " и ".join(shift['missing_data'])
-                incomplete_dates.append(f"• {date_str} (нет {missing})")
+                missing = " и ".join(shift.missing_fields)
+                incomplete_dates.append(f"• {shift.date_str} (нет {missing})")
             
-            await bot.send_message(
+            await outbox.send_message(
+                bot,
                 USER_ID,
                 f"📋 Напоминание о заполнении данных:\n"
                 f"У тебя есть {len(incomplete_shifts)} смен без выручки или чаевых.\n"
@@ -232,63 +249,116 @@ async def send_data_completion_reminder(bot):
     except Exception as e:
         logger.error(f"❌ Error sending data completion reminder: {e}")
 
+@timed_job
+@leased(_current_lease, _run_key)
+async def archive_closed_months(bot=None):
+    """Перенос закрытых месяцев из хранилища в архив (04:00)"""
+    try:
+        await storage.archive_closed_months(ARCHIVE_KEEP_MONTHS)
+    except Exception as e:
+        logger.error(f"❌ Error archiving closed months: {e}")
+
+@timed_job
+@leased(_current_lease, _run_key)
+async def compact_deleted_rows(bot=None):
+    """Удаление строк, помеченных при удалении смен, и сортировка листов по дате (03:30)"""
+    try:
+        await storage.compact()
+    except Exception as e:
+        logger.error(f"❌ Error compacting deleted rows: {e}")
+
+# id -> (функция, параметры cron)
+JOBS = {
+    # 10:00 — напоминание о смене + проверка незаполненных данных
+    "morning_reminder": (send_shift_reminder, {"hour": 10, "minute": 0}),
+    # 12:00 — отдельное напоминание о незаполненных данных
+    "data_completion_reminder": (send_data_completion_reminder, {"hour": 12, "minute": 0}),
+    # 22:00 — напоминание ввести данные
+    "evening_prompt": (send_evening_prompt, {"hour": 22, "minute": 0}),
+    # 20:00 по воскресеньям — недельная статистика
+    "weekly_summary": (send_weekly_summary, {"day_of_week": "sun", "hour": 20, "minute": 0}),
+}
+
+
+def _maintenance_jobs():
+    """Обслуживание хранилища: выполняется и без USER_ID, зависит от выбранного хранилища"""
+    jobs = {}
+    # 03:30 — удаление помеченных строк и сортировка листов (Google Sheets)
+    if hasattr(storage.backend, "compact"):
+        jobs["compact_deleted_rows"] = (compact_deleted_rows, {"hour": 3, "minute": 30})
+    # 04:00 — архивация закрытых месяцев (если задан ARCHIVE_DIR)
+    if storage.archive:
+        jobs["archive_closed_months"] = (archive_closed_months, {"hour": 4, "minute": 0})
+    return jobs
+
+
 def setup_scheduler(bot):
-    """Настройка планировщика уведомлений"""
-    if not USER_ID:
+    """Настройка планировщика уведомлений
+
+    Задачи хранятся в JOBSTORE_URL, поэтому пропущенные во время рестарта
+    запуски выполняются после старта (в пределах JOB_MISFIRE_GRACE_SECONDS,
+    несколько пропусков схлопываются в один), а лиза в той же базе не дает
+    двум репликам отправить одно напоминание дважды. Без USER_ID
+    запускаются только задачи обслуживания хранилища.
+    """
+    global _bot, _lease
+
+    jobs = _maintenance_jobs()
+    if USER_ID:
+        jobs.update(JOBS)
+    else:
         logger.warning("❌ USER_ID not set - notifications disabled")
+    if not jobs:
         return None
 
     try:
         tz = pytz.timezone(TIMEZONE)
-        scheduler = AsyncIOScheduler(timezone=tz)
-
-        # 10:00 — напоминание о смене + проверка незаполненных данных
-        scheduler.add_job(
-            send_shift_reminder, 
-            "cron", 
-            hour=10, 
-            minute=0, 
-            args=[bot],
-            id="morning_reminder"
-        )
+        _bot = bot
 
-        # 12:00 — отдельное напоминание о незаполненных данных
-        scheduler.add_job(
-            send_data_completion_reminder,
-            "cron",
-            hour=12,
-            minute=0,
-            args=[bot],
-            id="data_completion_reminder"
-        )
+        jobstores = {}
+        if JOBSTORE_URL:
+            from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+            jobstores["default"] = SQLAlchemyJobStore(url=JOBSTORE_URL)
+            _lease = JobLease(JOBSTORE_URL)
 
-        # 22:00 — напоминание ввести данные
-        scheduler.add_job(
-            send_evening_prompt, 
-            "cron", 
-            hour=22, 
-            minute=0, 
-            args=[bot],
-            id="evening_prompt"
+        scheduler = AsyncIOScheduler(
+            timezone=tz,
+            jobstores=jobstores,
+            job_defaults={"misfire_grace_time": JOB_MISFIRE_GRACE_SECONDS, "coalesce": True}
         )
 
-        # 20:00 по воскресеньям — недельная статистика
-        scheduler.add_job(
-            send_weekly_summary,
-            "cron",
-            day_of_week="sun",
-            hour=20,
-            minute=0,
-            args=[bot],
-            id="weekly_summary"
-        )
+        # На паузе, чтобы сохраненные задачи не пересчитали время следующего запуска
+        scheduler.start(paused=True)
+        for job_id, (func, cron) in jobs.items():
+            trigger = CronTrigger(timezone=tz, **cron)
+            _triggers[func.__name__] = trigger
+            job = scheduler.get_job(job_id)
+            if job is None:
+                scheduler.add_job(func, trigger, id=job_id, replace_existing=True)
+                continue
+
+            # Уже сохранена: оставляем время следующего запуска, чтобы догнать пропуски
+            job.modify(func=func, args=(), kwargs={})
+            if str(job.trigger) != str(trigger):
+                job.reschedule(trigger)
+
+        # Задачи, убранные из JOBS (или отключенные без USER_ID), остаются в базе
+        for job in scheduler.get_jobs():
+            if job.id not in jobs:
+                logger.info(f"🗑️ Removing stale job {job.id}")
+                job.remove()
+        scheduler.resume()
 
-        scheduler.start()
-        logger.info("✅ Scheduler started with 4 jobs:")
-        logger.info("   - 10:00 Morning shift reminder + incomplete data check")
-        logger.info("   - 12:00 Data completion reminder") 
-        logger.info("   - 22:00 Evening data prompt")
-        logger.info("   - 20:00 Sunday weekly summary")
+        logger.info(f"✅ Scheduler started with {len(jobs)} jobs ({'persistent' if JOBSTORE_URL else 'in-memory'} store):")
+        if USER_ID:
+            logger.info("   - 10:00 Morning shift reminder + incomplete data check")
+            logger.info("   - 12:00 Data completion reminder")
+            logger.info("   - 22:00 Evening data prompt")
+            logger.info("   - 20:00 Sunday weekly summary")
+        if "compact_deleted_rows" in jobs:
+            logger.info("   - 03:30 Compact deleted rows and re-sort sheets")
+        if "archive_closed_months" in jobs:
+            logger.info("   - 04:00 Archive closed months")
         
         return scheduler
         
@@ -0,0 +1,206 @@
+from bisect import insort
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import count
+import asyncio
+import logging
+import time
+
+import metrics
+from config import TELEGRAM_CHAT_BURST, TELEGRAM_CHAT_RATE, TELEGRAM_GLOBAL_RATE, TELEGRAM_RATE_LIMIT
+
+logger = logging.getLogger(__name__)
+
+# Полосы приоритета: ответы пользователю раньше напоминаний
+INTERACTIVE = 0
+BACKGROUND = 1
+LANES = {INTERACTIVE: 'interactive', BACKGROUND: 'background'}
+
+send_priority = ContextVar('send_priority', default=INTERACTIVE)
+# Разрешение уже получено (склеенная отправка из Outbox.send_message)
+_permit_held = ContextVar('permit_held', default=False)
+
+# Лимит длины текста сообщения Telegram
+MAX_MESSAGE_LENGTH = 4096
+
+
+@contextmanager
+def priority(lane):
+    """Все запросы к Telegram внутри блока идут с приоритетом lane"""
+    token = send_priority.set(lane)
+    try:
+        yield
+    finally:
+        send_priority.reset(token)
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now):
+        """Seconds until a token is available"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def idle(self, now):
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class Outbox:
+    """Central admission point for outbound Telegram requests
+
+    Every request for a chat waits for a token from the global bucket and
+    from that chat's bucket. Waiters are served by lane, then in arrival
+    order, skipping the ones whose chat has no token yet. A RetryAfter
+    from Telegram blocks the whole outbox for the given time.
+    """
+
+    def __init__(self, global_rate=30, chat_rate=1, chat_burst=3, enabled=True):
+        self.enabled = enabled
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats = {}
+        self._waiters = []
+        self._sequence = count()
+        self._blocked_until = 0.0
+        self._wakeup = None
+        self._dispatcher = None
+        self._pending = {}
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    async def acquire(self, chat_id, lane=None):
+        """Дождаться разрешения на один запрос в чат"""
+        if not self.enabled:
+            return
+        lane = send_priority.get() if lane is None else lane
+        future = asyncio.get_running_loop().create_future()
+        insort(self._waiters, (lane, next(self._sequence), chat_id, future))
+        metrics.OUTBOX_QUEUE.inc(lane=LANES[lane])
+        started = time.perf_counter()
+        self._kick()
+        try:
+            await future
+        finally:
+            metrics.OUTBOX_QUEUE.dec(lane=LANES[lane])
+            metrics.OUTBOX_WAIT.observe(time.perf_counter() - started, lane=LANES[lane])
+
+    def block(self, seconds):
+        """Telegram попросил подождать (RetryAfter)"""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        self._kick()
+
+    def _kick(self):
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def _sleep(self, seconds):
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _dispatch(self):
+        while self._waiters:
+            now = time.monotonic()
+            wait = max(self._blocked_until - now, self._global.delay(now))
+            if wait > 0:
+                await self._sleep(wait)
+                continue
+
+            chosen = None
+            chat_wait = None
+            for index, (_, _, chat_id, future) in enumerate(self._waiters):
+                if future.done():
+                    continue
+                delay = self._chat_bucket(chat_id).delay(now)
+                if delay == 0:
+                    chosen = index
+                    break
+                chat_wait = delay if chat_wait is None else min(chat_wait, delay)
+
+            if chosen is None:
+                # Ждем первый освободившийся чат или нового ожидающего
+                self._waiters = [waiter for waiter in self._waiters if not waiter[3].done()]
+                if self._waiters:
+                    await self._sleep(chat_wait)
+                continue
+
+            _, _, chat_id, future = self._waiters.pop(chosen)
+            self._global.take()
+            self._chat_bucket(chat_id).take()
+            future.set_result(None)
+
+            # Полные корзины неактивных чатов не нужны
+            if len(self._chats) > 1000:
+                self._chats = {chat: bucket for chat, bucket in self._chats.items() if not bucket.idle(now)}
+
+    async def send_message(self, bot, chat_id, text, lane=BACKGROUND, **kwargs):
+        """Отправка через очередь: тексты, ждущие отправки в один чат, склеиваются"""
+        future = asyncio.get_running_loop().create_future()
+        pending = self._pending.setdefault(chat_id, [])
+        pending.append((text, kwargs, future))
+        if len(pending) == 1:
+            asyncio.create_task(self._flush(bot, chat_id, lane))
+        return await future
+
+    async def _flush(self, bot, chat_id, lane):
+        pending = self._pending[chat_id]
+        try:
+            while pending:
+                # Пока ждем токен, в чат могут добавиться еще сообщения
+                await self.acquire(chat_id, lane)
+
+                text, kwargs, _ = pending[0]
+                batch = 1
+                while batch < len(pending) and pending[batch][1] == kwargs:
+                    merged = f"{text}\n\n{pending[batch][0]}"
+                    if len(merged) > MAX_MESSAGE_LENGTH:
+                        break
+                    text = merged
+                    batch += 1
+                futures = [item[2] for item in pending[:batch]]
+                del pending[:batch]
+                if batch > 1:
+                    metrics.OUTBOX_MERGED.inc(batch - 1)
+
+                token = _permit_held.set(True)
+                try:
+                    result = await bot.send_message(chat_id, text, **kwargs)
+                except Exception as e:
+                    for future in futures:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                finally:
+                    _permit_held.reset(token)
+                for future in futures:
+                    if not future.done():
+                        future.set_result(result)
+        finally:
+            if self._pending.get(chat_id) is pending and not pending:
+                del self._pending[chat_id]
+
+
+outbox = Outbox(TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_RATE, TELEGRAM_CHAT_BURST, TELEGRAM_RATE_LIMIT)
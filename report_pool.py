@@ -0,0 +1,111 @@
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+
+import metrics
+from config import REPORT_WORKERS
+from models import pack_shifts
+from reports import render_report
+
+logger = logging.getLogger(__name__)
+
+
+class ReportPool:
+    """Bounded worker pool for report generation, one job per user
+
+    A repeated request with the same parameters joins the running job,
+    a request with different parameters replaces it. cancel() drops the
+    user's job: a job still waiting for a worker never starts, the result
+    of an already running one is discarded.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self._executor = None
+        self._jobs = {}
+
+    def _get_executor(self):
+        if self._executor is None and self.workers > 0:
+            # fork копирует поток планировщика, event loop и сокеты бота - воркеры
+            # стартуют с чистого интерпретатора (spawn, где forkserver нет) и
+            # заново импортируют главный модуль, поэтому в нем нет подключений при импорте
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            logger.info(f"⚙️ Report pool started with {self.workers} workers")
+        return self._executor
+
+    def start(self):
+        """Start the worker processes now, so the first export does not wait for them
+
+        Returns the warm-up futures, done once every worker is up.
+        """
+        executor = self._get_executor()
+        if executor is None:
+            return []
+        # Процесс создается на задачу, пока свободных нет: по пустой задаче на воркер
+        return [executor.submit(os.getpid) for _ in range(self.workers)]
+
+    async def _run_job(self, packed, format_type, period, today):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            # REPORT_WORKERS=0: без процессов, в потоке по умолчанию
+            return await loop.run_in_executor(
+                self._get_executor(), render_report, packed, format_type, period, today
+            )
+        finally:
+            metrics.REPORT_LATENCY.observe(time.perf_counter() - started, format=format_type)
+
+    async def render(self, user_id, shifts, format_type, period, today):
+        """(количество смен, содержимое) отчета, None если задача отменена"""
+        key = (format_type, period, today)
+        current = self._jobs.get(user_id)
+        if current and current[0] == key and not current[1].done():
+            metrics.REPORT_JOBS.inc(result='joined')
+            job = current[1]
+        else:
+            if current:
+                current[1].cancel()
+            job = asyncio.ensure_future(self._run_job(pack_shifts(shifts), format_type, period, today))
+            self._jobs[user_id] = (key, job)
+
+        try:
+            result = await asyncio.shield(job)
+        except asyncio.CancelledError:
+            if not job.cancelled():
+                raise
+            metrics.REPORT_JOBS.inc(result='cancelled')
+            return None
+        except Exception:
+            metrics.REPORT_JOBS.inc(result='failed')
+            raise
+        finally:
+            if self._jobs.get(user_id, (None, None))[1] is job and job.done():
+                del self._jobs[user_id]
+
+        metrics.REPORT_JOBS.inc(result='done')
+        return result
+
+    def cancel(self, user_id):
+        """Отменить задачу пользователя, True если она была"""
+        current = self._jobs.pop(user_id, None)
+        if not current or current[1].done():
+            return False
+        current[1].cancel()
+        logger.info(f"🛑 Report job cancelled for user {user_id}")
+        return True
+
+    def shutdown(self):
+        for _, job in self._jobs.values():
+            job.cancel()
+        self._jobs.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+report_pool = ReportPool(REPORT_WORKERS)
@@ -0,0 +1,151 @@
+from datetime import datetime, timedelta
+import csv
+import io
+import logging
+
+from models import format_money, parse_date, unpack_shifts
+
+logger = logging.getLogger(__name__)
+
+PERIOD_DAYS = {
+    "week": 7,
+    "month": 30,
+    "quarter": 90
+}
+
+DAY_NAMES = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье"]
+
+
+def get_day_name(date_obj):
+    """Получить название дня недели на русском"""
+    try:
+        return DAY_NAMES[date_obj.weekday()]
+    except Exception as e:
+        logger.error(f"Error getting day name for {date_obj}: {e}")
+        return "День"
+
+
+def period_start_day(period, today=None):
+    """Первый день периода (дни с 1970-01-01), None для всего периода"""
+    if period not in PERIOD_DAYS:
+        return None
+    today = today or datetime.now().date()
+    return parse_date(today - timedelta(days=PERIOD_DAYS[period]))
+
+
+def filter_shifts_by_period(shifts, period, today=None):
+    """Фильтрация смен по периоду"""
+    start_day = period_start_day(period, today)
+    if not shifts or start_day is None:
+        return shifts or []
+    return [shift for shift in shifts if shift.day >= start_day]
+
+
+def generate_csv_file(shifts):
+    """Генерация CSV файла с данными смен"""
+    if not shifts:
+        return None
+
+    output = io.StringIO()
+    writer = csv.writer(output, delimiter=';', quoting=csv.QUOTE_MINIMAL)
+
+    # Заголовки
+    writer.writerow([
+        'Дата', 'День недели', 'Начало', 'Конец', 'Часы',
+        'Выручка', 'Чаевые', 'Прибыль', 'Ставка', 'Процент с выручки'
+    ])
+
+    # Данные
+    for shift in shifts:
+        writer.writerow([
+            shift.date_str,
+            get_day_name(shift.date),
+            shift.start_str,
+            shift.end_str,
+            shift.hours,
+            format_money(shift.revenue or 0),
+            format_money(shift.tips or 0),
+            format_money(shift.profit),
+            format_money(shift.rate_income),
+            format_money(shift.revenue_share)
+        ])
+
+    output.seek(0)
+    return output
+
+
+class SummaryTotals:
+    """Additive totals behind the text summary, updated shift by shift"""
+
+    __slots__ = ('shifts', 'minutes', 'revenue', 'tips', 'profit', 'rate_income', 'revenue_share')
+
+    def __init__(self, shifts=()):
+        self.shifts = self.minutes = self.revenue = self.tips = 0
+        self.profit = self.rate_income = self.revenue_share = 0
+        for shift in shifts:
+            self.add(shift)
+
+    def add(self, shift, sign=1):
+        self.shifts += sign
+        self.minutes += sign * shift.minutes
+        self.revenue += sign * (shift.revenue or 0)
+        self.tips += sign * (shift.tips or 0)
+        self.profit += sign * shift.profit
+        self.rate_income += sign * shift.rate_income
+        self.revenue_share += sign * shift.revenue_share
+
+    def remove(self, shift):
+        self.add(shift, -1)
+
+
+def format_summary(totals):
+    """Текст сводки по готовым итогам (суммы в копейках, форматируем один раз)"""
+    if not totals.shifts:
+        return "📊 Нет данных для отображения"
+
+    total_hours = totals.minutes / 60
+
+    summary = f"📊 **СТАТИСТИКА ЗА ВЕСЬ ПЕРИОД**\n\n"
+    summary += f"📅 Общее количество смен: {totals.shifts}\n"
+    summary += f"⏱ Общее время работы: {total_hours:.1f} часов\n"
+    summary += f"💰 Общая выручка: {format_money(totals.revenue)}₽\n"
+    summary += f"💖 Общие чаевые: {format_money(totals.tips)}₽\n"
+    summary += f"📊 Общая прибыль: {format_money(totals.profit)}₽\n\n"
+
+    summary += f"**ДЕТАЛИЗАЦИЯ ДОХОДОВ:**\n"
+    summary += f"• Почасовой доход: {format_money(totals.rate_income)}₽\n"
+    summary += f"• Процент с выручки: {format_money(totals.revenue_share)}₽\n"
+    summary += f"• Чаевые: {format_money(totals.tips)}₽\n\n"
+
+    if totals.minutes > 0:
+        avg_hourly = (totals.profit * 60 + totals.minutes // 2) // totals.minutes
+        summary += f"📈 Средний доход в час: {format_money(avg_hourly)}₽\n"
+
+    avg_shift = (totals.profit + totals.shifts // 2) // totals.shifts
+    summary += f"📈 Средний доход за смену: {format_money(avg_shift)}₽\n"
+
+    summary += f"\n🌸 *Отличная работа! Продолжай в том же духе!* 💪"
+
+    return summary
+
+
+def generate_text_summary(shifts):
+    """Генерация текстовой сводки"""
+    return format_summary(SummaryTotals(shifts or ()))
+
+
+def render_report(packed_shifts, format_type, period, today):
+    """Фильтрация и генерация отчета в процессе-воркере
+
+    Принимает смены, упакованные через pack_shifts, возвращает
+    (количество смен, содержимое): bytes для CSV/Excel, str для сводки.
+    """
+    shifts = filter_shifts_by_period(unpack_shifts(packed_shifts), period, today)
+    if not shifts:
+        return 0, None
+
+    if format_type == "text":
+        return len(shifts), generate_text_summary(shifts)
+
+    # UTF-8 with BOM for Excel
+    return len(shifts), generate_csv_file(shifts).getvalue().encode('utf-8-sig')
@@ -1,161 +1,579 @@
+from bisect import bisect_left, bisect_right
 import gspread
-from gspread import Worksheet
-from gspread.utils import ValueInputOption
+from contextlib import asynccontextmanager
+from functools import wraps
+from gspread.utils import ValueInputOption, ValueRenderOption, absolute_range_name
 import logging
-from datetime import datetime, timedelta
+from dataclasses import replace
 import os
 import asyncio
 import json
 
+import metrics
+from account_pool import AccountPool, current_user
+from circuit_breaker import note_error
+from config import SHEETS_ACCOUNT_QUOTA_PER_MINUTE, SHEETS_FORMULAS
+from models import (
+    FIELD_MAPPING, HOURLY_RATE, REVENUE_SHARE_PER_MILLE, Shift, apply_field, format_date, format_money,
+    month_bounds, month_key, parse_date, parse_money, parse_time, shifts_from_rows
+)
+
 logger = logging.getLogger(__name__)
 
-class GoogleSheetsManager:
+HEADERS = ['Дата', 'Начало', 'Конец', 'Часы', 'Выручка', 'Чаевые', 'Прибыль']
+
+# Смены лежат в листах по месяцам ('Смены 2026-10'), список листов - в индексе
+LEGACY_TITLE = 'Смены'
+MIGRATED_TITLE = 'Смены (до разбиения)'
+PARTITION_PREFIX = 'Смены '
+PARTITION_ROWS = 40
+INDEX_TITLE = 'Индекс'
+INDEX_HEADERS = ['Период', 'Лист', 'С', 'По']
+
+# Удаленная смена: дата с этой пометкой, строку потом убирает compact()
+TOMBSTONE = '🗑 '
+
+# SHEETS_FORMULAS: часы и прибыль считает одна ARRAYFORMULA в заголовке столбца,
+# ставки берутся с листа 'Ставки' (B1 - рублей в час, B2 - доля выручки в промилле)
+RATES_TITLE = 'Ставки'
+HOURS_FORMULA = '={"Часы";ARRAYFORMULA(IF(ISNUMBER(A2:A),ROUND(MOD(C2:C-B2:B,1)*24,2),""))}'
+PROFIT_FORMULA = (
+    '={"Прибыль";ARRAYFORMULA(IF(ISNUMBER(A2:A),'
+    "ROUND(MOD(C2:C-B2:B,1)*24*'Ставки'!B1,2)+F2:F+ROUND(E2:E*'Ставки'!B2/1000,2),\"\"))}"
+)
+FORMULA_HEADERS = HEADERS[:3] + [HOURS_FORMULA] + HEADERS[4:6] + [PROFIT_FORMULA]
+# Столбец листа для поля смены
+FIELD_COLUMNS = {'start': 'B', 'end': 'C', 'revenue': 'E', 'tips': 'F'}
+# Серийный номер 01.01.1970 в датах таблиц (UNFORMATTED_VALUE)
+SERIAL_EPOCH = 25569
+
+
+def partition_title(key):
+    return f"{PARTITION_PREFIX}{key}"
+
+
+def _runs(indexes):
+    """Sorted indexes -> [(start, end)] ranges of consecutive values, end exclusive"""
+    runs = []
+    for index in indexes:
+        if runs and runs[-1][1] == index:
+            runs[-1][1] = index + 1
+        else:
+            runs.append([index, index + 1])
+    return [tuple(run) for run in runs]
+
+
+def _cell_day(value):
+    """Day of a column A value, None for deleted, empty or malformed rows"""
+    value = str(value)
+    if not value.strip() or value.startswith(TOMBSTONE):
+        return None
+    try:
+        return parse_date(value)
+    except ValueError:
+        return None
+
+
+class DateColumn:
+    """Days in column A of a partition from row 2 down (None - no live shift)
+
+    Rows are kept sorted by date, so they are located by binary search.
+    A partition edited out of order by hand is searched linearly and read
+    whole until compact() sorts it again.
+    """
+
+    def __init__(self, values=()):
+        self.days = [_cell_day(value) for value in values]
+        self._reindex()
+
+    def _reindex(self):
+        self._live = [(day, index) for index, day in enumerate(self.days) if day is not None]
+        self.ordered = all(a[0] < b[0] for a, b in zip(self._live, self._live[1:]))
+
+    def row(self, day):
+        """Sheet row of the day, None if it has no row"""
+        if not self.ordered:
+            return self.days.index(day) + 2 if day in self.days else None
+        position = bisect_left(self._live, (day, -1))
+        if position < len(self._live) and self._live[position][0] == day:
+            return self._live[position][1] + 2
+        return None
+
+    def insertion_row(self, day):
+        """Row to insert a new day at to keep the order, None - append after the last row"""
+        if not self.ordered or not self._live or day > self._live[-1][0]:
+            return None
+        return self._live[bisect_left(self._live, (day, -1))][1] + 2
+
+    def span(self, first, last=None):
+        """(top, bottom) rows holding days first..last (None - unbounded), None if there are none"""
+        low = bisect_left(self._live, (first, -1))
+        high = len(self._live) if last is None else bisect_right(self._live, (last, len(self.days)))
+        if low >= high:
+            return None
+        return self._live[low][1] + 2, self._live[high - 1][1] + 2
+
+    def append(self, day):
+        self.days.append(day)
+        self._reindex()
+
+    def insert(self, row, day):
+        self.days.insert(row - 2, day)
+        self._reindex()
+
+    def set(self, row, day=None):
+        self.days[row - 2] = day
+        self._reindex()
+
+
+def _value_day(value):
+    """Day of an unformatted column A value (date serial or text)"""
+    if isinstance(value, (int, float)):
+        return int(value) - SERIAL_EPOCH
+    return _cell_day(value)
+
+
+def _title_key(title):
+    """Partition key of a worksheet title, None for other worksheets"""
+    if not title.startswith(PARTITION_PREFIX):
+        return None
+    key = title[len(PARTITION_PREFIX):]
+    try:
+        month_bounds(key)
+    except ValueError:
+        return None
+    return key
+
+
+def api_error_status(error):
+    """HTTP status of a gspread APIError"""
+    code = getattr(error, 'code', None)
+    if code is None and getattr(error, 'response', None) is not None:
+        code = error.response.status_code
+    return code
+
+
+class RowsLock:
+    """Shared by operations that find a row and then use its number,
+    exclusive for compaction, which moves rows"""
+
     def __init__(self):
+        self._users = 0
+        self._moving = False
+        self._changed = asyncio.Condition()
+
+    @asynccontextmanager
+    async def shared(self):
+        async with self._changed:
+            await self._changed.wait_for(lambda: not self._moving)
+            self._users += 1
+        try:
+            yield
+        finally:
+            async with self._changed:
+                self._users -= 1
+                self._changed.notify_all()
+
+    @asynccontextmanager
+    async def exclusive(self):
+        async with self._changed:
+            await self._changed.wait_for(lambda: not self._moving)
+            # Новые операции ждут, текущие дорабатывают
+            self._moving = True
+            await self._changed.wait_for(lambda: self._users == 0)
+        try:
+            yield
+        finally:
+            async with self._changed:
+                self._moving = False
+                self._changed.notify_all()
+
+
+def _row_operation(method):
+    """The method keeps a row number between API calls: compaction and
+    inserts into the same month wait for it"""
+    @wraps(method)
+    async def wrapper(self, date_msg, *args, **kwargs):
+        try:
+            key = month_key(parse_date(date_msg))
+        except ValueError:
+            key = None
+        async with self._rows.shared(), self._month_locks.setdefault(key, asyncio.Lock()):
+            return await method(self, date_msg, *args, **kwargs)
+    return wrapper
+
+
+class GoogleSheetsManager:
+    def __init__(self, client=None, sheet_id=None, formulas=None):
         self.client = None
+        # Несколько сервисных аккаунтов - запросы распределяются между ними
+        self.pool = None
+        self.formulas = SHEETS_FORMULAS if formulas is None else formulas
         self.spreadsheet = None
-        self.worksheet = None
+        self.index = None
+        # '2026-10' -> Worksheet
+        self.partitions = {}
+        self._partition_lock = asyncio.Lock()
+        self._rows = RowsLock()
+        self._month_locks = {}
+        # '2026-10' -> DateColumn; для записи колонка всегда перечитывается
+        self._dates = {}
         self.initialized = False
-        self._initialize()
+        self._initialize(client, sheet_id)
 
-    def _initialize(self):
-        """Initialize Google Sheets connection"""
+    def _initialize(self, client=None, sheet_id=None):
+        """Initialize Google Sheets connection (client/sheet_id override the environment)
+
+        GOOGLE_CREDENTIALS may hold one service account or a JSON list of
+        them (client - a list of clients); every account needs edit access
+        to the spreadsheet.
+        """
         try:
             # Get environment variables
             google_credentials = os.getenv('GOOGLE_CREDENTIALS')
-            sheet_id = os.getenv('SHEET_ID')
+            sheet_id = sheet_id or os.getenv('SHEET_ID')
             
-            if not google_credentials or not sheet_id:
+            if (client is None and not google_credentials) or not sheet_id:
                 logger.error("❌ GOOGLE_CREDENTIALS or SHEET_ID not found in environment")
                 return
 
-            # Parse JSON credentials
-            creds_dict = json.loads(google_credentials)
-            
-            # Initialize client
-            from google.oauth2.service_account import Credentials
-            scopes = ['https://www.googleapis.com/auth/spreadsheets']
-            credentials = Credentials.from_service_account_info(creds_dict, scopes=scopes)
-            
-            self.client = gspread.authorize(credentials)
+            if client is None:
+                # Parse JSON credentials
+                creds_list = json.loads(google_credentials)
+                if isinstance(creds_list, dict):
+                    creds_list = [creds_list]
+
+                # Initialize client
+                from google.oauth2.service_account import Credentials
+                # drive.metadata.readonly - время изменения таблицы для отслеживания ручных правок
+                scopes = [
+                    'https://www.googleapis.com/auth/spreadsheets',
+                    'https://www.googleapis.com/auth/drive.metadata.readonly'
+                ]
+                clients = {
+                    creds_dict.get('client_email', f'account{i}'): gspread.authorize(
+                        Credentials.from_service_account_info(creds_dict, scopes=scopes)
+                    )
+                    for i, creds_dict in enumerate(creds_list)
+                }
+            elif isinstance(client, (list, tuple)):
+                clients = {f'account{i}': item for i, item in enumerate(client)}
+            else:
+                clients = {'default': client}
+
+            client = next(iter(clients.values()))
+            if len(clients) > 1:
+                self.pool = AccountPool(
+                    {name: item.http_client for name, item in clients.items()},
+                    quota_per_minute=SHEETS_ACCOUNT_QUOTA_PER_MINUTE
+                )
+                logger.info(f"🔑 Google Sheets traffic is spread over {len(clients)} service accounts")
+
+            self.client = client
             self.spreadsheet = self.client.open_by_key(sheet_id)
-            
-            # Try to find worksheet
-            try:
-                self.worksheet = self.spreadsheet.worksheet('Смены')
-                logger.info("✅ Found existing 'Смены' worksheet")
-                
-                # Проверяем структуру колонок
-                self._verify_columns_structure()
-                
-            except gspread.WorksheetNotFound:
-                # Create new worksheet if doesn't exist
-                self.worksheet = self.spreadsheet.add_worksheet(title='Смены', rows=1000, cols=7)
-                # Add headers with correct structure
-                headers = ['Дата', 'Начало', 'Конец', 'Часы', 'Выручка', 'Чаевые', 'Прибыль']
-                self.worksheet.update('A1:G1', [headers])
-                logger.info("✅ Created new 'Смены' worksheet with correct structure")
-            
+
+            # Один запрос метаданных: все листы таблицы
+            worksheets = {worksheet.title: worksheet for worksheet in self.spreadsheet.worksheets()}
+            for title, worksheet in worksheets.items():
+                key = _title_key(title)
+                if key:
+                    self.partitions[key] = worksheet
+
+            self.index = worksheets.get(INDEX_TITLE)
+            if self.index is None:
+                self.index = self.spreadsheet.add_worksheet(title=INDEX_TITLE, rows=100, cols=len(INDEX_HEADERS))
+                self.index.update(range_name='A1:D1', values=[INDEX_HEADERS])
+                logger.info("✅ Created partition index worksheet")
+
+            if LEGACY_TITLE in worksheets:
+                self._migrate_legacy(worksheets[LEGACY_TITLE])
+            self._sync_index()
+            installed = self._formula_columns()
+            if self.formulas:
+                self._install_formulas(worksheets, installed)
+            elif installed:
+                self._remove_formulas(installed)
+
             self.initialized = True
-            logger.info("✅ Google Sheets initialized successfully")
+            logger.info(f"✅ Google Sheets initialized successfully ({len(self.partitions)} month partitions)")
             
         except Exception as e:
             logger.error(f"❌ Failed to initialize Google Sheets: {e}")
             self.initialized = False
 
-    def _verify_columns_structure(self):
-        """Verify and fix columns structure if needed"""
-        try:
-            headers = self.worksheet.row_values(1)
-            expected_headers = ['Дата', 'Начало', 'Конец', 'Часы', 'Выручка', 'Чаевые', 'Прибыль']
-            
-            if headers != expected_headers:
-                logger.warning(f"⚠️ Column structure mismatch. Current: {headers}")
-                logger.info("🔄 Updating column structure...")
-                
-                # Update headers
-                self.worksheet.update('A1:G1', [expected_headers])
-                logger.info("✅ Column structure updated successfully")
+    def _create_partition_sync(self, key, rows=PARTITION_ROWS):
+        """Create the worksheet of a month and register it in the index (startup only)"""
+        worksheet = self.spreadsheet.add_worksheet(title=partition_title(key), rows=rows + 1, cols=len(HEADERS))
+        worksheet.update(range_name='A1:G1', values=[HEADERS])
+        self.index.append_row(self._index_row(key), value_input_option=ValueInputOption.raw)
+        self.partitions[key] = worksheet
+        logger.info(f"✅ Created partition worksheet '{worksheet.title}'")
+        return worksheet
+
+    def _formula_columns(self):
+        """Partition title -> columns of D1/G1 holding a formula, only titles with any (startup only)"""
+        titles = [worksheet.title for worksheet in self.partitions.values()]
+        if not titles:
+            return {}
+        response = self.spreadsheet.values_batch_get(
+            [absolute_range_name(title, 'D1:G1') for title in titles],
+            params={'valueRenderOption': ValueRenderOption.formula}
+        )
+        installed = {}
+        for title, value_range in zip(titles, response.get('valueRanges', [])):
+            header = (value_range.get('values') or [[]])[0] + [''] * 4
+            columns = {column for column, value in (('D', header[0]), ('G', header[3])) if str(value).startswith('=')}
+            if columns:
+                installed[title] = columns
+        return installed
+
+    def _install_formulas(self, worksheets, installed):
+        """Rates sheet and formula columns in partitions still without them (startup only)"""
+        if RATES_TITLE not in worksheets:
+            self.spreadsheet.add_worksheet(title=RATES_TITLE, rows=2, cols=2)
+        # Листы с формулами не трогаем: иначе каждый рестарт стирал бы столбцы
+        titles = [
+            worksheet.title for worksheet in self.partitions.values()
+            if installed.get(worksheet.title) != {'D', 'G'}
+        ]
+        if titles:
+            # Посчитанные ботом значения не дадут формуле заполнить столбец
+            self.spreadsheet.values_batch_clear(body={'ranges': [
+                absolute_range_name(title, cells) for title in titles for cells in ('D2:D', 'G2:G')
+            ]})
+        data = [{
+            'range': absolute_range_name(RATES_TITLE, 'A1:B2'),
+            'values': [['Ставка в час, ₽', HOURLY_RATE / 100], ['Доля выручки, ‰', REVENUE_SHARE_PER_MILLE]]
+        }]
+        for title in titles:
+            data.append({'range': absolute_range_name(title, 'D1'), 'values': [[HOURS_FORMULA]]})
+            data.append({'range': absolute_range_name(title, 'G1'), 'values': [[PROFIT_FORMULA]]})
+        self.spreadsheet.values_batch_update({'valueInputOption': 'USER_ENTERED', 'data': data})
+        if titles:
+            logger.info(f"✅ Hours and profit formulas installed in {len(titles)} partitions")
+
+    def _remove_formulas(self, installed):
+        """SHEETS_FORMULAS is off: replace formula columns with computed values (startup only)"""
+        titles = list(installed)
+        response = self.spreadsheet.values_batch_get([absolute_range_name(title, 'A2:F') for title in titles])
+        data = []
+        for title, value_range in zip(titles, response.get('valueRanges', [])):
+            hours, profits = [], []
+            for row in value_range.get('values', []):
+                try:
+                    shift = None if _cell_day(row[0]) is None else Shift.from_row(row)
+                except (ValueError, IndexError):
+                    shift = None
+                # Удаленные и битые строки остаются без значений, как и при записи ботом
+                hours.append(['' if shift is None else shift.hours])
+                profits.append(['' if shift is None else shift.profit / 100])
+            data.append({'range': absolute_range_name(title, 'D1'), 'values': [[HEADERS[3]]] + hours})
+            data.append({'range': absolute_range_name(title, 'G1'), 'values': [[HEADERS[6]]] + profits})
+        self.spreadsheet.values_batch_update({'valueInputOption': 'USER_ENTERED', 'data': data})
+        logger.info(f"✅ Hours and profit formulas replaced with values in {len(titles)} partitions")
+
+    def _row_values(self, shift):
+        """Values for columns A:G; with formulas D and G stay with the sheet (None skips a cell)"""
+        row = shift.to_row()
+        if self.formulas:
+            row[3] = row[6] = None
+        return row
+
+    def _row_cells(self, shift):
+        """CellData for columns A:G of an updateCells request
+
+        updateCells takes typed values, not text to parse: the date and
+        times go as serial numbers with their display format, so the sheet
+        holds the same values a USER_ENTERED write would leave.
+        """
+        date_format = {'numberFormat': {'type': 'DATE', 'pattern': 'dd.mm.yyyy'}}
+        time_format = {'numberFormat': {'type': 'TIME', 'pattern': 'hh:mm'}}
+        cells = [
+            {'userEnteredValue': {'numberValue': shift.day + SERIAL_EPOCH}, 'userEnteredFormat': date_format},
+            {'userEnteredValue': {'numberValue': shift.start / 1440}, 'userEnteredFormat': time_format},
+            {'userEnteredValue': {'numberValue': shift.end / 1440}, 'userEnteredFormat': time_format},
+        ]
+        # Пустая ячейка под формулами D и G, иначе ARRAYFORMULA не развернется
+        for value in self._row_values(shift)[3:]:
+            cells.append({} if value in (None, '') else {'userEnteredValue': {'numberValue': value}})
+        return cells
+
+    @staticmethod
+    def _index_row(key):
+        first, last = month_bounds(key)
+        # RAW: иначе '2026-10' и даты превратятся в значения дат
+        return [key, partition_title(key), format_date(first), format_date(last)]
+
+    def _sync_index(self):
+        """Add partitions missing from the index (created by hand or by an interrupted run)"""
+        listed = {row[0] for row in self.index.get_all_values()[1:] if row}
+        missing = [self._index_row(key) for key in sorted(self.partitions) if key not in listed]
+        if missing:
+            self.index.append_rows(missing, value_input_option=ValueInputOption.raw)
+            logger.info(f"🔄 Added {len(missing)} partitions to the index")
+
+    def _migrate_legacy(self, legacy):
+        """Move rows of the single 'Смены' worksheet into month partitions
+
+        Rows already present in a partition are skipped, so an interrupted
+        migration can simply run again. The old worksheet is kept, renamed.
+        """
+        groups = {}
+        for row in legacy.get_all_values()[1:]:
+            if not row or not str(row[0]).strip():
+                continue
+            try:
+                key = month_key(parse_date(row[0]))
+            except ValueError:
+                logger.warning(f"⚠️ Skipping malformed legacy row {row}")
+                continue
+            groups.setdefault(key, []).append((list(row) + [''] * len(HEADERS))[:len(HEADERS)])
+
+        for key, rows in sorted(groups.items()):
+            worksheet = self.partitions.get(key)
+            if worksheet is None:
+                worksheet = self._create_partition_sync(key, rows=max(PARTITION_ROWS, len(rows)))
             else:
-                logger.info("✅ Column structure is correct")
-                
-        except Exception as e:
-            logger.error(f"❌ Error verifying column structure: {e}")
-
-    def _calculate_hours(self, start_time, end_time):
-        """Calculate hours between start and end time"""
+                present = set(worksheet.col_values(1)[1:])
+                rows = [row for row in rows if row[0] not in present]
+            if rows:
+                worksheet.append_rows(rows, value_input_option=ValueInputOption.user_entered)
+
+        legacy.update_title(MIGRATED_TITLE)
+        logger.info(f"✅ Migrated '{LEGACY_TITLE}' into {len(groups)} month partitions")
+
+    async def _api(self, target, method, *args, **kwargs):
+        """Call a worksheet/spreadsheet method in a worker thread, counting it for metrics
+
+        With an account pool the call goes out as the account that the ring
+        assigns to this spreadsheet and the current user.
+        """
+        account = None
+        if self.pool:
+            account = self.pool.choose(f"{self.spreadsheet.id}:{current_user.get() or ''}")
+            target = self.pool.bind(target, account)
+
+        metrics.SHEETS_CALLS.inc(method=method)
         try:
-            start = datetime.strptime(start_time, "%H:%M")
-            end = datetime.strptime(end_time, "%H:%M")
-            
-            # Handle overnight shifts
-            if end < start:
-                end += timedelta(days=1)
-            
-            duration = end - start
-            hours = duration.total_seconds() / 3600
-            return round(hours, 2)
+            return await asyncio.to_thread(getattr(target, method), *args, **kwargs)
         except Exception as e:
-            logger.error(f"❌ Error calculating hours: {e}")
-            return 0
-
-    def _parse_number(self, value):
-        """Parse number from string with various formats"""
-        if not value or str(value).strip() == '':
-            return 0.0
-        
-        try:
-            # Remove spaces and replace commas with dots
-            cleaned = str(value).replace(' ', '').replace(',', '.')
-            return float(cleaned)
-        except (ValueError, TypeError):
-            logger.warning(f"⚠️ Could not parse number: {value}")
-            return 0.0
-
-    def _calculate_profit(self, hours, revenue, tips):
-        """Calculate profit using formula: (hours * 220) + tips + (revenue * 0.015)"""
-        try:
-            # Parse numbers safely
-            hours_val = self._parse_number(hours)
-            revenue_val = self._parse_number(revenue)
-            tips_val = self._parse_number(tips)
-            
-            hourly_rate = 220
-            revenue_percentage = 0.015
-            
-            profit = (hours_val * hourly_rate) + tips_val + (revenue_val * revenue_percentage)
-            logger.info(f"💰 Profit calculation: ({hours_val}h * {hourly_rate}) + {tips_val} + ({revenue_val} * {revenue_percentage}) = {profit:.2f}")
-            return round(profit, 2)
-        except Exception as e:
-            logger.error(f"❌ Error calculating profit: {e}")
-            logger.error(f"❌ Values: hours='{hours}', revenue='{revenue}', tips='{tips}'")
-            return 0
-
-    async def _get_row_values(self, row):
-        """Get all values from a row with proper error handling"""
+            if api_error_status(e) == 429:
+                metrics.SHEETS_THROTTLED.inc(method=method)
+                if account:
+                    self.pool.throttled(account)
+            else:
+                metrics.SHEETS_ERRORS.inc(method=method)
+            # Методы ниже сами ловят ошибки и возвращают False/None, автомат их не увидит
+            note_error(e)
+            raise
+
+    async def _partition(self, day, create=False):
+        """Worksheet holding the given day, None if that month has no shifts yet"""
+        key = month_key(day)
+        worksheet = self.partitions.get(key)
+        if worksheet is not None or not create:
+            return worksheet
+
+        async with self._partition_lock:
+            if key in self.partitions:
+                return self.partitions[key]
+            worksheet = await self._api(
+                self.spreadsheet, 'add_worksheet',
+                title=partition_title(key), rows=PARTITION_ROWS + 1, cols=len(HEADERS)
+            )
+            await self._api(
+                worksheet, 'update',
+                range_name='A1:G1',
+                values=[FORMULA_HEADERS if self.formulas else HEADERS],
+                value_input_option=ValueInputOption.user_entered
+            )
+            await self._api(
+                self.index, 'append_row', self._index_row(key),
+                value_input_option=ValueInputOption.raw
+            )
+            self.partitions[key] = worksheet
+            self._dates[key] = DateColumn()
+            logger.info(f"✅ Created partition worksheet '{worksheet.title}'")
+            return worksheet
+
+    async def _find(self, day, create=False):
+        """(worksheet, row) of the shift on a day, row is None if there is none
+
+        Re-reads the month's date column (one small range read), so the row
+        number is current even after edits made by hand.
+        """
+        worksheet = await self._partition(day, create)
+        if worksheet is None:
+            return None, None
+        values = await self._api(worksheet, 'get', 'A2:A')
+        column = self._dates[month_key(day)] = DateColumn(row[0] if row else '' for row in values)
+        return worksheet, column.row(day)
+
+    async def _read_partitions(self, keys, first=None, last=None):
+        """Shifts of the given partitions with one batch range read
+
+        With a first day, a partition whose cached date column is sorted is
+        read only from the first to the last matching row. The bounding rows
+        are checked against the cache; partitions read whole (or with a stale
+        cache) refresh their date columns.
+        """
+        ranges = {}
+        for key in sorted(keys):
+            column = self._dates.get(key) if first is not None else None
+            if column is None or not column.ordered:
+                ranges[key] = None
+                continue
+            span = column.span(first, last)
+            if span is not None:
+                ranges[key] = span
+
+        if not ranges:
+            return []
+        response = await self._api(self.spreadsheet, 'values_batch_get', [
+            absolute_range_name(self.partitions[key].title, f'A{span[0]}:G{span[1]}' if span else 'A2:G')
+            for key, span in ranges.items()
+        ])
+
+        rows = []
+        stale = []
+        for (key, span), value_range in zip(ranges.items(), response.get('valueRanges', [])):
+            values = value_range.get('values', [])
+            if span is None:
+                self._dates[key] = DateColumn(row[0] if row else '' for row in values)
+            elif not values or (
+                _cell_day(values[0][0] if values[0] else '') != self._dates[key].days[span[0] - 2]
+                or _cell_day(values[-1][0] if values[-1] else '') != self._dates[key].days[span[1] - 2]
+            ):
+                # Строки сдвинули вручную - перечитаем лист целиком
+                stale.append(key)
+                continue
+            rows.extend(values)
+
+        shifts = shifts_from_rows(row for row in rows if not (row and str(row[0]).startswith(TOMBSTONE)))
+        if stale:
+            shifts.extend(await self._read_partitions(stale))
+        return shifts
+
+    async def _get_shift(self, worksheet, row):
+        """Read a row and convert it to a Shift (None if the row is malformed)"""
         try:
-            # Get the entire row to ensure we have all values
-            row_data = await asyncio.to_thread(self.worksheet.row_values, row)
-            
-            # Ensure we have at least 7 columns
-            while len(row_data) < 7:
-                row_data.append('')
-            
-            return {
-                'date': row_data[0] if len(row_data) > 0 else '',
-                'start': row_data[1] if len(row_data) > 1 else '',
-                'end': row_data[2] if len(row_data) > 2 else '',
-                'hours': row_data[3] if len(row_data) > 3 else '',
-                'revenue': row_data[4] if len(row_data) > 4 else '',
-                'tips': row_data[5] if len(row_data) > 5 else '',
-                'profit': row_data[6] if len(row_data) > 6 else ''
-            }
+            row_data = await self._api(worksheet, 'row_values', row)
+            return Shift.from_row(row_data)
         except Exception as e:
-            logger.error(f"❌ Error getting row values: {e}")
-            return {
-                'date': '', 'start': '', 'end': '', 'hours': '', 
-                'revenue': '', 'tips': '', 'profit': ''
-            }
+            logger.error(f"❌ Error reading shift from row {row}: {e}")
+            return None
 
+    async def _write_shift(self, worksheet, row, shift, first_column='A'):
+        """Write a shift into an existing row starting at the given column"""
+        values = self._row_values(shift)[ord(first_column) - ord('A'):]
+        await self._api(
+            worksheet, 'update',
+            range_name=f'{first_column}{row}:G{row}',
+            values=[values],
+            value_input_option=ValueInputOption.user_entered
+        )
+
+    @_row_operation
     async def add_shift(self, date_msg, start, end, reset_financials=False):
         """Add shift to spreadsheet with optional financial data reset"""
         if not self.initialized:
@@ -163,74 +581,68 @@ class GoogleSheetsManager:
             return False
 
         try:
-            # Validate date
-            date_obj = datetime.strptime(date_msg, "%d.%m.%Y").date()
-            formatted_date = date_obj.strftime("%d.%m.%Y")
-            
-            # Validate time
-            datetime.strptime(start, "%H:%M")
-            datetime.strptime(end, "%H:%M")
-            
-            # Calculate hours
-            hours = self._calculate_hours(start, end)
-            
+            # Validate date and time
+            shift = Shift(day=parse_date(date_msg), start=parse_time(start), end=parse_time(end))
+
             # Find existing record
             try:
-                cell = await asyncio.to_thread(self.worksheet.find, formatted_date)
-                if cell:
+                worksheet, row = await self._find(shift.day, create=True)
+                column = self._dates[month_key(shift.day)]
+                if row and self.formulas and not reset_financials:
+                    # Выручка и чаевые остаются в строке, прибыль пересчитает формула
+                    await self._api(
+                        worksheet, 'update',
+                        range_name=f'B{row}:C{row}',
+                        values=[[shift.start_str, shift.end_str]],
+                        value_input_option=ValueInputOption.user_entered
+                    )
+                    logger.info(f"📝 Updated existing shift: {shift.date_str}, hours: {shift.hours}")
+                elif row:
                     # Update existing record
-                    row = cell.row
-                    
-                    if reset_financials:
+                    existing = None if reset_financials else await self._get_shift(worksheet, row)
+
+                    if existing is None:
                         # Полностью перезаписываем строку с обнулением финансовых данных
-                        new_row = [formatted_date, start, end, hours, '', '', '']
-                        await asyncio.to_thread(
-                            self.worksheet.update,
-                            f'A{row}:G{row}',
-                            [new_row],
-                            value_input_option=ValueInputOption.user_entered
-                        )
-                        logger.info(f"📝 Updated existing shift with financial reset: {formatted_date}, hours: {hours}")
+                        await self._write_shift(worksheet, row, shift)
+                        logger.info(f"📝 Updated existing shift with financial reset: {shift.date_str}, hours: {shift.hours}")
                     else:
-                        # Обновляем только время и часы
-                        await asyncio.to_thread(
-                            self.worksheet.update,
-                            f'B{row}:D{row}',
-                            [[start, end, hours]],
-                            value_input_option=ValueInputOption.user_entered
-                        )
-                        
-                        # Пересчитываем прибыль на основе существующих данных
-                        row_values = await self._get_row_values(row)
-                        
-                        revenue = row_values['revenue'] if row_values['revenue'] else "0"
-                        tips = row_values['tips'] if row_values['tips'] else "0"
-                        
-                        profit = self._calculate_profit(hours, revenue, tips)
-                        await asyncio.to_thread(
-                            self.worksheet.update,
-                            f'G{row}',  # G: прибыль
-                            [[profit]],
-                            value_input_option=ValueInputOption.user_entered
-                        )
-                        logger.info(f"📝 Updated existing shift: {formatted_date}, hours: {hours}, profit: {profit}")
-                else:
-                    # Add new record - для новой смены рассчитываем базовую прибыль только от часов
-                    profit = self._calculate_profit(hours, 0, 0)
-                    new_row = [formatted_date, start, end, hours, '', '', profit]
-                    await asyncio.to_thread(
-                        self.worksheet.append_row,
-                        new_row,
+                        # Обновляем время, сохраняя выручку и чаевые, и пересчитываем прибыль
+                        shift = replace(existing, start=shift.start, end=shift.end)
+                        await self._write_shift(worksheet, row, shift, first_column='B')
+                        logger.info(f"📝 Updated existing shift: {shift.date_str}, hours: {shift.hours}, profit: {format_money(shift.profit)}")
+                elif column.insertion_row(shift.day) is None:
+                    # Add new record - для новой смены прибыль считается только от часов
+                    await self._api(
+                        worksheet, 'append_row',
+                        self._row_values(shift),
                         value_input_option=ValueInputOption.user_entered
                     )
-                    logger.info(f"✅ Added new shift: {formatted_date}, hours: {hours}, profit: {profit}")
-                
+                    column.append(shift.day)
+                    logger.info(f"✅ Added new shift: {shift.date_str}, hours: {shift.hours}, profit: {format_money(shift.profit)}")
+                else:
+                    # Смена задним числом: вставляем строку на место по дате, лист остается отсортированным
+                    # Вставка и запись строки одним запросом: между ними лист не бывает с пустой строкой
+                    row = column.insertion_row(shift.day)
+                    await self._api(self.spreadsheet, 'batch_update', {'requests': [
+                        {'insertDimension': {
+                            'range': {'sheetId': worksheet.id, 'dimension': 'ROWS', 'startIndex': row - 1, 'endIndex': row},
+                            'inheritFromBefore': True
+                        }},
+                        {'updateCells': {
+                            'start': {'sheetId': worksheet.id, 'rowIndex': row - 1, 'columnIndex': 0},
+                            'rows': [{'values': self._row_cells(shift)}],
+                            'fields': 'userEnteredValue,userEnteredFormat.numberFormat'
+                        }}
+                    ]})
+                    column.insert(row, shift.day)
+                    logger.info(f"✅ Added new shift: {shift.date_str}, hours: {shift.hours}, profit: {format_money(shift.profit)}")
+
                 return True
-                
+
             except Exception as e:
                 logger.error(f"❌ Error in sheet operation: {e}")
                 return False
-                
+
         except ValueError as e:
             logger.error(f"❌ Invalid date/time format: {e}")
             return False
@@ -238,6 +650,7 @@ class GoogleSheetsManager:
             logger.error(f"❌ Error adding shift: {e}")
             return False
 
+    @_row_operation
     async def update_value(self, date_msg, field, value):
         """Update value in spreadsheet with proper profit calculation"""
         if not self.initialized:
@@ -245,115 +658,84 @@ class GoogleSheetsManager:
             return False
 
         try:
-            date_obj = datetime.strptime(date_msg, "%d.%m.%Y").date()
-            formatted_date = date_obj.strftime("%d.%m.%Y")
-            
+            formatted_date = format_date(parse_date(date_msg))
+
             # Find date
-            cell = await asyncio.to_thread(self.worksheet.find, formatted_date)
-            if not cell:
+            worksheet, row = await self._find(parse_date(date_msg))
+            if not row:
                 logger.warning(f"Date not found: {formatted_date}")
                 return False
 
-            row = cell.row
-            
-            # Get current values BEFORE update
-            row_values = await self._get_row_values(row)
-            logger.info(f"📊 Current values before update: {row_values}")
-            
-            # Mapping fields to columns
-            column_mapping = {
-                'начало': 'B',    # Начало
-                'конец': 'C',     # Конец
-                'выручка': 'E',   # Выручка
-                'чай': 'F'        # Чаевые
-            }
-            
-            column = column_mapping.get(field.lower())
-            if not column:
-                logger.error(f"Unknown field: {field}")
+            if self.formulas:
+                return await self._write_field(worksheet, row, parse_date(date_msg), field, value)
+
+            current = await self._get_shift(worksheet, row)
+            if current is None:
                 return False
 
-            # Update the field
-            await asyncio.to_thread(
-                self.worksheet.update,
-                f'{column}{row}',
-                [[value]],
-                value_input_option=ValueInputOption.user_entered
-            )
-            
-            # Get updated values for profit calculation
-            await asyncio.sleep(0.5)  # Small delay to ensure update is processed
-            updated_values = await self._get_row_values(row)
-            
-            # Use the updated value for the field we just changed
-            if field.lower() == 'выручка':
-                revenue = value
-                tips = updated_values['tips']
-            elif field.lower() == 'чай':
-                revenue = updated_values['revenue']
-                tips = value
-            else:
-                revenue = updated_values['revenue']
-                tips = updated_values['tips']
-            
-            # Always use current hours from the row
-            hours = updated_values['hours']
-            
-            logger.info(f"📊 Values for profit calculation: hours='{hours}', revenue='{revenue}', tips='{tips}'")
-            
-            # Calculate profit with current values
-            profit = self._calculate_profit(hours, revenue, tips)
-            
-            # Update profit cell
-            await asyncio.to_thread(
-                self.worksheet.update,
-                f'G{row}',  # G: прибыль
-                [[profit]],
-                value_input_option=ValueInputOption.user_entered
-            )
-            
-            logger.info(f"✅ Updated {field} for {formatted_date} and recalculated profit: {profit}")
+            updated = apply_field(current, field, value)
+            if updated is None:
+                return False
+
+            # Одна запись B:G - новое значение и пересчитанная прибыль
+            await self._write_shift(worksheet, row, updated, first_column='B')
+
+            logger.info(f"✅ Updated {field} for {formatted_date} and recalculated profit: {format_money(updated.profit)}")
             return True
-            
+
         except Exception as e:
             logger.error(f"❌ Error updating value: {e}")
             return False
 
-    async def get_profit(self, date_msg):
-        """Get profit for date using current data"""
-        if not self.initialized:
-            logger.error("Google Sheets not initialized")
+    async def _write_field(self, worksheet, row, day, field, value):
+        """Formula mode: one cell write, hours and profit are recalculated by the sheet"""
+        parsed = apply_field(Shift(day, 0, 0), field, value)
+        if parsed is None:
+            return False
+        column = FIELD_COLUMNS[FIELD_MAPPING[field.lower()]]
+        cell = self._row_values(parsed)[ord(column) - ord('A')]
+        await self._api(
+            worksheet, 'update',
+            range_name=f'{column}{row}',
+            values=[[cell]],
+            value_input_option=ValueInputOption.user_entered
+        )
+        logger.info(f"✅ Updated {field} for {format_date(day)}, profit is recalculated by the sheet")
+        return True
+
+    @_row_operation
+    async def _sheet_profit(self, date_msg):
+        """Formula mode: profit in kopecks from one unformatted read of the cached row, None if unknown"""
+        day = parse_date(date_msg)
+        key = month_key(day)
+        column = self._dates.get(key)
+        row = column.row(day) if column is not None and key in self.partitions else None
+        if not row:
+            return None
+        values = await self._api(
+            self.partitions[key], 'get', f'A{row}:G{row}',
+            value_render_option=ValueRenderOption.unformatted
+        )
+        cells = values[0] if values else []
+        # Формула еще не пересчитана или строка сдвинулась - посчитаем по данным строки
+        if len(cells) < len(HEADERS) or _value_day(cells[0]) != day or not isinstance(cells[6], (int, float)):
             return None
+        return parse_money(cells[6])
 
-        try:
-            date_obj = datetime.strptime(date_msg, "%d.%m.%Y").date()
-            formatted_date = date_obj.strftime("%d.%m.%Y")
-            
-            cell = await asyncio.to_thread(self.worksheet.find, formatted_date)
-            if not cell:
-                return None
+    async def get_profit(self, date_msg):
+        """Get profit for date using current data"""
+        if self.formulas and self.initialized:
+            try:
+                profit = await self._sheet_profit(date_msg)
+                if profit is not None:
+                    return format_money(profit)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not read profit computed by the sheet: {e}")
 
-            row = cell.row
-            
-            # Get all values using our helper function
-            row_values = await self._get_row_values(row)
-            
-            hours = row_values['hours']
-            revenue = row_values['revenue']
-            tips = row_values['tips']
-            
-            logger.info(f"📊 Values for profit get: hours='{hours}', revenue='{revenue}', tips='{tips}'")
-            
-            # Calculate profit using current formula and values
-            profit = self._calculate_profit(hours, revenue, tips)
-            
-            logger.info(f"📊 Profit calculation result: {profit}")
-            
-            return str(profit)
-                
-        except Exception as e:
-            logger.error(f"❌ Error getting profit: {e}")
+        shift = await self.get_shift_data(date_msg)
+        if shift is None:
             return None
+        return format_money(shift.profit)
 
     async def check_shift_exists(self, date_msg):
         """Check if shift exists"""
@@ -362,42 +744,44 @@ class GoogleSheetsManager:
             return False
 
         try:
-            date_obj = datetime.strptime(date_msg, "%d.%m.%Y").date()
-            formatted_date = date_obj.strftime("%d.%m.%Y")
-            
-            cell = await asyncio.to_thread(self.worksheet.find, formatted_date)
-            return cell is not None
-            
+            _, row = await self._find(parse_date(date_msg))
+            return row is not None
+
         except Exception as e:
             logger.error(f"❌ Error checking shift existence: {e}")
             return False
 
+    @_row_operation
     async def delete_shift(self, date_msg):
-        """Delete shift by date"""
+        """Delete shift by date: one cell write marks the row, compact() removes it later"""
         if not self.initialized:
             logger.error("Google Sheets not initialized")
             return False
 
         try:
-            date_obj = datetime.strptime(date_msg, "%d.%m.%Y").date()
-            formatted_date = date_obj.strftime("%d.%m.%Y")
-            
-            cell = await asyncio.to_thread(self.worksheet.find, formatted_date)
-            if not cell:
+            formatted_date = format_date(parse_date(date_msg))
+
+            worksheet, row = await self._find(parse_date(date_msg))
+            if not row:
                 logger.warning(f"Shift not found for deletion: {formatted_date}")
                 return False
 
-            row = cell.row
-            
-            # Delete the entire row
-            await asyncio.to_thread(self.worksheet.delete_rows, row)
+            # Помечаем строку вместо delete_rows: номера остальных строк не сдвигаются
+            await self._api(
+                worksheet, 'update',
+                range_name=f'A{row}',
+                values=[[f"{TOMBSTONE}{formatted_date}"]],
+                value_input_option=ValueInputOption.raw
+            )
+            self._dates[month_key(parse_date(date_msg))].set(row)
             logger.info(f"✅ Deleted shift: {formatted_date}")
             return True
-            
+
         except Exception as e:
             logger.error(f"❌ Error deleting shift: {e}")
             return False
 
+    @_row_operation
     async def get_shift_data(self, date_msg):
         """Get complete shift data for a specific date"""
         if not self.initialized:
@@ -405,29 +789,22 @@ class GoogleSheetsManager:
             return None
 
         try:
-            date_obj = datetime.strptime(date_msg, "%d.%m.%Y").date()
-            formatted_date = date_obj.strftime("%d.%m.%Y")
-            
-            cell = await asyncio.to_thread(self.worksheet.find, formatted_date)
-            if not cell:
+            day = parse_date(date_msg)
+            key = month_key(day)
+            column = self._dates.get(key)
+            row = column.row(day) if column is not None and key in self.partitions else None
+            if row:
+                # Строка из кэша дат - одно чтение, если дата в ней совпала
+                values = await self._api(self.partitions[key], 'row_values', row)
+                if values and _cell_day(values[0]) == day:
+                    return Shift.from_row(values)
+
+            worksheet, row = await self._find(day)
+            if not row:
                 return None
 
-            row = cell.row
-            row_values = await self._get_row_values(row)
-            
-            return {
-                'date': row_values['date'],
-                'start': row_values['start'],
-                'end': row_values['end'],
-                'hours': row_values['hours'],
-                'revenue': row_values['revenue'],
-                'tips': row_values['tips'],
-                'profit': row_values['profit'],
-                'is_complete': bool(row_values['revenue'] and row_values['tips'] and 
-                                  str(row_values['revenue']).strip() != '' and 
-                                  str(row_values['tips']).strip() != '')
-            }
-            
+            return await self._get_shift(worksheet, row)
+
         except Exception as e:
             logger.error(f"❌ Error getting shift data: {e}")
             return None
@@ -439,29 +816,170 @@ class GoogleSheetsManager:
             return []
 
         try:
-            # Get all records except header
-            records = await asyncio.to_thread(self.worksheet.get_all_records)
-            shifts = []
-            
-            for record in records:
-                if record.get('Дата'):  # Only include rows with date
-                    shifts.append({
-                        'date': record.get('Дата', ''),
-                        'start': record.get('Начало', ''),
-                        'end': record.get('Конец', ''),
-                        'hours': record.get('Часы', 0),
-                        'revenue': record.get('Выручка', 0),
-                        'tips': record.get('Чаевые', 0),
-                        'profit': record.get('Прибыль', 0)
-                    })
-            
-            logger.info(f"📊 Retrieved {len(shifts)} shifts from Google Sheets")
+            # One batch read of every partition, rows converted in bulk
+            shifts = await self._read_partitions(self.partitions)
+
+            logger.debug(f"📊 Retrieved {len(shifts)} shifts from Google Sheets")
             return shifts
-            
+
         except Exception as e:
             logger.error(f"❌ Error getting all shifts: {e}")
             return []
 
+    async def get_shifts_in_period(self, start_date, end_date=None):
+        """Shifts between two dates (no end - up to the last one), reading only overlapping partitions"""
+        if not self.initialized:
+            logger.error("Google Sheets not initialized")
+            return []
+
+        try:
+            first = parse_date(start_date)
+            last = parse_date(end_date) if end_date is not None else None
+            keys = [
+                key for key in self.partitions
+                if month_bounds(key)[1] >= first and (last is None or month_bounds(key)[0] <= last)
+            ]
+            shifts = await self._read_partitions(keys, first, last)
+            return sorted(
+                (shift for shift in shifts if shift.day >= first and (last is None or shift.day <= last)),
+                key=lambda shift: shift.day
+            )
+
+        except Exception as e:
+            logger.error(f"❌ Error getting shifts in period: {e}")
+            return []
+
+    async def compact(self):
+        """Remove rows marked as deleted and re-sort partitions that lost date order, with one batch request"""
+        if not self.initialized:
+            logger.error("Google Sheets not initialized")
+            return 0
+
+        try:
+            async with self._rows.exclusive():
+                keys = sorted(self.partitions)
+                if not keys:
+                    return 0
+                response = await self._api(
+                    self.spreadsheet, 'values_batch_get',
+                    [absolute_range_name(self.partitions[key].title, 'A2:A') for key in keys]
+                )
+
+                requests = []
+                removed = 0
+                resorted = 0
+                for key, value_range in zip(keys, response.get('valueRanges', [])):
+                    values = value_range.get('values', [])
+                    # Индекс строки с нуля: первая строка данных (A2) - 1
+                    indexes = [
+                        index for index, row in enumerate(values, start=1)
+                        if row and str(row[0]).startswith(TOMBSTONE)
+                    ]
+                    removed += len(indexes)
+                    # С конца листа, чтобы удаление не сдвигало следующие диапазоны
+                    for start, end in reversed(_runs(indexes)):
+                        requests.append({'deleteDimension': {'range': {
+                            'sheetId': self.partitions[key].id,
+                            'dimension': 'ROWS',
+                            'startIndex': start,
+                            'endIndex': end
+                        }}})
+
+                    # Запросы выполняются по порядку: сортируем уже без удаленных строк
+                    if not DateColumn(row[0] if row else '' for row in values).ordered:
+                        resorted += 1
+                        requests.append({'sortRange': {
+                            'range': {
+                                'sheetId': self.partitions[key].id,
+                                'startRowIndex': 1,
+                                'endRowIndex': 1 + len(values) - len(indexes),
+                                'startColumnIndex': 0,
+                                'endColumnIndex': len(HEADERS)
+                            },
+                            'sortSpecs': [{'dimensionIndex': 0, 'sortOrder': 'ASCENDING'}]
+                        }})
+
+                if requests:
+                    await self._api(self.spreadsheet, 'batch_update', {'requests': requests})
+                    # Номера строк сдвинулись - колонки дат перечитаются при следующем обращении
+                    self._dates.clear()
+                    logger.info(f"🧹 Compacted {removed} deleted rows, re-sorted {resorted} partitions in one batch")
+                return removed
+
+        except Exception as e:
+            logger.error(f"❌ Error compacting deleted rows: {e}")
+            return 0
+
+    async def revision(self):
+        """Drive modifiedTime of the spreadsheet (moves on any edit), None if Drive API is unavailable"""
+        try:
+            return await self._api(self.spreadsheet, 'get_lastUpdateTime')
+        except gspread.exceptions.APIError as e:
+            if api_error_status(e) in (403, 404):
+                return None
+            raise
+
+    async def snapshot(self):
+        """All live shifts, re-listing partitions first; raises on errors instead of returning []"""
+        worksheets = await self._api(self.spreadsheet, 'worksheets')
+        partitions = {}
+        for worksheet in worksheets:
+            key = _title_key(worksheet.title)
+            if key:
+                partitions[key] = worksheet
+        async with self._partition_lock:
+            # Листы могли добавить вручную или другие реплики
+            self.partitions = partitions
+        return await self._read_partitions(self.partitions)
+
+    async def delete_month(self, key):
+        """Drop the worksheet of a month (archived elsewhere) and its index row"""
+        if not self.initialized:
+            logger.error("Google Sheets not initialized")
+            return False
+
+        try:
+            async with self._partition_lock:
+                worksheet = self.partitions.get(key)
+                if worksheet is not None:
+                    await self._api(self.spreadsheet, 'del_worksheet', worksheet)
+                    del self.partitions[key]
+                    self._dates.pop(key, None)
+                cell = await self._api(self.index, 'find', key, in_column=1)
+                if cell:
+                    await self._api(self.index, 'delete_rows', cell.row)
+            logger.info(f"✅ Dropped partition worksheet for {key}")
+            return True
+
+        except Exception as e:
+            logger.error(f"❌ Error dropping month {key}: {e}")
+            return False
+
+    async def insert_shifts(self, shifts):
+        """Append shifts of months that have no rows yet (restoring an archived month), sorted by date"""
+        if not self.initialized:
+            logger.error("Google Sheets not initialized")
+            return False
+
+        try:
+            groups = {}
+            for shift in shifts:
+                groups.setdefault(month_key(shift.day), []).append(shift)
+            for key, month in sorted(groups.items()):
+                worksheet = await self._partition(month[0].day, create=True)
+                await self._api(
+                    worksheet, 'append_rows',
+                    [self._row_values(shift) for shift in sorted(month, key=lambda shift: shift.day)],
+                    value_input_option=ValueInputOption.user_entered
+                )
+                # Если в месяце уже были строки, порядок восстановит compact()
+                self._dates.pop(key, None)
+            return True
+
+        except Exception as e:
+            logger.error(f"❌ Error inserting shifts: {e}")
+            return False
+
     async def has_shift_today(self, date_msg):
         """Check if shift exists for given date (for notifications)"""
         return await self.check_shift_exists(date_msg)
@@ -494,6 +1012,10 @@ async def get_shift_data(date_msg):
 async def get_all_shifts():
     return await sheets_manager.get_all_shifts()
 
+# Function for period reads (exports)
+async def get_shifts_in_period(start_date, end_date=None):
+    return await sheets_manager.get_shifts_in_period(start_date, end_date)
+
 # Function for notifications
 async def has_shift_today(date_msg):
     """Check if shift exists for today (for notifications)"""
@@ -0,0 +1,250 @@
+from datetime import date
+import logging
+import os
+import time
+
+import metrics
+from models import format_date, format_money, month_bounds, month_key, parse_date
+from config import (
+    BREAKER_ERROR_RATE, BREAKER_MIN_CALLS, BREAKER_OPEN_SECONDS, BREAKER_SLOW_CALL_MS, BREAKER_WINDOW,
+    ARCHIVE_DIR, SHEETS_CALL_TIMEOUT_MS, SHEETS_FAILOVER
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Storage:
+    """Selected storage backend; every call is timed for metrics
+
+    With an archive, closed months live in ShiftArchive files instead of
+    the backend: reads merge both, and a write to an archived month first
+    moves that month back into the backend.
+    """
+
+    def __init__(self, backend, name, archive=None):
+        self.backend = backend
+        self.name = name
+        self.archive = archive
+        # Растет при каждой успешной записи, ключ для кэшей производных данных
+        self.data_version = 0
+        self._listeners = []
+
+    def subscribe(self, listener):
+        """listener(method, args) is called after every successful write"""
+        self._listeners.append(listener)
+
+    async def start(self):
+        """Start background work of the backend, if it has any"""
+        if hasattr(self.backend, 'start'):
+            await self.backend.start()
+
+    async def stop(self):
+        if hasattr(self.backend, 'stop'):
+            await self.backend.stop()
+
+    async def _call(self, method, *args, **kwargs):
+        labels = {'backend': self.name}
+        metrics.STORAGE_IN_FLIGHT.inc(**labels)
+        started = time.perf_counter()
+        try:
+            return await getattr(self.backend, method)(*args, **kwargs)
+        finally:
+            metrics.STORAGE_LATENCY.observe(time.perf_counter() - started, method=method, **labels)
+            metrics.STORAGE_IN_FLIGHT.dec(**labels)
+
+    def _archived(self, date_msg):
+        """True if the date's month is in the archive"""
+        if not self.archive or not self.archive.months:
+            return False
+        try:
+            return self.archive.has(parse_date(date_msg))
+        except ValueError:
+            return False
+
+    def _merge(self, archived, live):
+        """Archived shifts plus live ones; live copies of archived months are leftovers"""
+        if not self.archive.months:
+            return live
+        return archived + [shift for shift in live if not self.archive.has(shift.day)]
+
+    async def _restore(self, date_msg):
+        """Move an archived month back into the backend before it is edited"""
+        key = month_key(parse_date(date_msg))
+        if not await self._call('insert_shifts', self.archive.month(key)):
+            logger.error(f"❌ Could not restore archived month {key}")
+            return False
+        self.archive.remove(key)
+        logger.info(f"📤 Restored archived month {key} for editing")
+        return True
+
+    async def _write(self, method, *args, **kwargs):
+        if self._archived(args[0]) and not await self._restore(args[0]):
+            return False
+        result = await self._call(method, *args, **kwargs)
+        if result:
+            self._notify(method, args)
+        return result
+
+    def _notify(self, method, args):
+        self.data_version += 1
+        for listener in self._listeners:
+            try:
+                listener(method, args)
+            except Exception as e:
+                logger.error(f"❌ Storage listener failed after {method}: {e}")
+
+    async def apply_external(self, changes):
+        """Shifts changed outside the bot (day -> Shift or None); caches follow as after writes"""
+        if hasattr(self.backend, 'apply_external'):
+            await self.backend.apply_external(changes)
+        for day, shift in sorted(changes.items()):
+            self._notify('replace_shift', (format_date(day), shift))
+
+    async def add_shift(self, date_msg, start, end, reset_financials=False):
+        return await self._write('add_shift', date_msg, start, end, reset_financials)
+
+    async def update_value(self, date_msg, field, value):
+        return await self._write('update_value', date_msg, field, value)
+
+    async def get_profit(self, date_msg):
+        if self._archived(date_msg):
+            shift = self.archive.shift(parse_date(date_msg))
+            return format_money(shift.profit) if shift else None
+        return await self._call('get_profit', date_msg)
+
+    async def check_shift_exists(self, date_msg):
+        if self._archived(date_msg):
+            return self.archive.shift(parse_date(date_msg)) is not None
+        return await self._call('check_shift_exists', date_msg)
+
+    async def has_shift_today(self, date_msg):
+        if self._archived(date_msg):
+            return self.archive.shift(parse_date(date_msg)) is not None
+        return await self._call('has_shift_today', date_msg)
+
+    async def delete_shift(self, date_msg):
+        return await self._write('delete_shift', date_msg)
+
+    async def get_shift_data(self, date_msg):
+        if self._archived(date_msg):
+            return self.archive.shift(parse_date(date_msg))
+        return await self._call('get_shift_data', date_msg)
+
+    async def get_all_shifts(self):
+        shifts = await self._call('get_all_shifts')
+        if not self.archive:
+            return shifts
+        return self._merge(self.archive.shifts(), shifts)
+
+    async def get_shifts_in_period(self, start_date, end_date=None):
+        shifts = await self._call('get_shifts_in_period', start_date, end_date)
+        if not self.archive:
+            return shifts
+        last = parse_date(end_date) if end_date is not None else None
+        return self._merge(self.archive.shifts(parse_date(start_date), last), shifts)
+
+    async def archive_closed_months(self, keep_months):
+        """Move months older than the last keep_months (current included) into the archive"""
+        if not self.archive:
+            return 0
+
+        today = date.today()
+        index = today.year * 12 + today.month - keep_months
+        cutoff, _ = month_bounds(f"{index // 12}-{index % 12 + 1:02d}")
+        shifts = await self._call('get_shifts_in_period', format_date(0), format_date(cutoff - 1))
+
+        months = {}
+        for shift in shifts:
+            months.setdefault(month_key(shift.day), []).append(shift)
+
+        archived = 0
+        for key, month in sorted(months.items()):
+            previous = self.archive.month(key) if key in self.archive.months else None
+            if previous is not None:
+                # Месяц уже в архиве, а в хранилище остались строки - живые новее
+                merged = {shift.day: shift for shift in previous}
+                merged.update((shift.day, shift) for shift in month)
+                month = list(merged.values())
+            self.archive.write(key, month)
+            if await self._call('delete_month', key):
+                archived += 1
+                continue
+
+            # Строки остались в хранилище: архив не должен их дублировать
+            logger.error(f"❌ Could not drop {key} from storage, archive file rolled back")
+            if previous is None:
+                self.archive.remove(key)
+            else:
+                self.archive.write(key, previous)
+        if archived:
+            logger.info(f"📦 Archived {archived} closed months")
+        return archived
+
+    async def compact(self):
+        """Remove rows of deleted shifts and restore date order if the backend needs it (Google Sheets)"""
+        if not hasattr(self.backend, 'compact'):
+            return 0
+        return await self._call('compact')
+
+
+def _failover(primary):
+    """Google Sheets behind a circuit breaker with SQLite as the fallback"""
+    from circuit_breaker import CircuitBreaker
+    from database import db_manager
+    from failover import FailoverBackend, WriteJournal
+
+    breaker = CircuitBreaker(
+        'google_sheets',
+        window=BREAKER_WINDOW,
+        min_calls=BREAKER_MIN_CALLS,
+        error_rate=BREAKER_ERROR_RATE,
+        slow_call_seconds=BREAKER_SLOW_CALL_MS / 1000,
+        open_seconds=BREAKER_OPEN_SECONDS,
+        timeout=SHEETS_CALL_TIMEOUT_MS / 1000
+    )
+    return FailoverBackend(primary, db_manager, breaker, WriteJournal(db_manager.db_path))
+
+
+def _archive():
+    if not ARCHIVE_DIR:
+        return None
+    from archive import ShiftArchive
+    return ShiftArchive(ARCHIVE_DIR)
+
+
+def _select_backend():
+    """Выбор хранилища по STORAGE_TYPE с откатом на SQLite: (backend, name)"""
+    storage_type = os.getenv('STORAGE_TYPE', 'google_sheets').lower()
+
+    if storage_type == 'google_sheets':
+        try:
+            from sheets import sheets_manager
+            if not sheets_manager.initialized:
+                raise RuntimeError("Google Sheets not initialized")
+            if SHEETS_FAILOVER:
+                logger.info("✅ Using Google Sheets storage with SQLite failover")
+                return _failover(sheets_manager), 'google_sheets'
+            logger.info("✅ Using Google Sheets storage")
+            return sheets_manager, 'google_sheets'
+        except Exception as e:
+            logger.error(f"❌ Failed to use Google Sheets: {e}")
+            # Fallback to SQLite если Google Sheets не работает
+
+    from database import db_manager
+    logger.info("✅ Using SQLite storage")
+    return db_manager, 'sqlite'
+
+
+def setup_storage():
+    """Подключить хранилище (в main(), не при импорте)
+
+    Процессы отчетов заново импортируют главный модуль, и подключение при
+    импорте открывало бы таблицу и мигрировало базу в каждом из них.
+    """
+    storage.backend, storage.name = _select_backend()
+    storage.archive = _archive()
+    return storage
+
+
+# Хранилище выбирается в setup_storage(), подписчики и кэши создаются раньше
+storage = Storage(None, None)
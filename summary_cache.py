@@ -0,0 +1,117 @@
+from bisect import bisect_left, insort
+from datetime import datetime
+import logging
+
+import metrics
+from models import parse_date, shift_after_write
+from reports import PERIOD_DAYS, SummaryTotals, format_summary, period_start_day
+from storage import storage
+
+logger = logging.getLogger(__name__)
+
+
+class SummaryCache:
+    """Text summaries kept up to date by the storage write path
+
+    Shifts are loaded once and then follow every write through
+    Storage.subscribe, as does the running total for the whole history.
+    Days are kept as a sorted key list, so a period summary is a bisect
+    plus a sum over that period only. The summary data is shared by all
+    users, so cached texts are keyed by (period, day). A write drops only
+    the texts whose period contains the changed day.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self._shifts = None
+        self._days = []
+        self._totals = None
+        self._version = None
+        self._texts = {}
+        storage.subscribe(self._on_write)
+
+    def invalidate(self):
+        """Забыть все, следующий запрос перечитает смены из хранилища"""
+        self._shifts = None
+        self._days = []
+        self._totals = None
+        self._version = None
+        self._texts.clear()
+
+    async def _load(self):
+        version = self.storage.data_version
+        shifts = await self.storage.get_all_shifts() or []
+        if self.storage.data_version != version:
+            # Запись во время чтения: результат годится только для этого запроса
+            return {shift.day: shift for shift in shifts}
+
+        self._shifts = {shift.day: shift for shift in shifts}
+        self._days = sorted(self._shifts)
+        self._totals = SummaryTotals(shifts)
+        self._version = version
+        return self._shifts
+
+    async def summary(self, period, today=None):
+        """(количество смен, текст сводки) за период из кэша или по кэшированным сменам"""
+        today = today or datetime.now().date()
+        key = (period, parse_date(today))
+        cached = self._texts.get(key)
+        if cached is not None and self._version == self.storage.data_version:
+            metrics.CACHE_REQUESTS.inc(cache='summary', result='hit')
+            return cached
+        metrics.CACHE_REQUESTS.inc(cache='summary', result='miss')
+
+        if self._shifts is None or self._version != self.storage.data_version:
+            self.invalidate()
+            shifts = await self._load()
+        else:
+            shifts = self._shifts
+
+        start_day = period_start_day(period, today)
+        if shifts is self._shifts:
+            if start_day is None:
+                totals = self._totals
+            else:
+                first = bisect_left(self._days, start_day)
+                totals = SummaryTotals(shifts[day] for day in self._days[first:])
+            result = totals.shifts, format_summary(totals)
+            # Сводки за прошлые дни больше не понадобятся
+            self._texts = {k: v for k, v in self._texts.items() if k[1] == key[1]}
+            self._texts[key] = result
+        else:
+            totals = SummaryTotals(
+                shift for shift in shifts.values() if start_day is None or shift.day >= start_day
+            )
+            result = totals.shifts, format_summary(totals)
+        return result
+
+    def _on_write(self, method, args):
+        if self._shifts is None:
+            return
+        if self._version != self.storage.data_version - 1:
+            # Пропущена запись (например, при загрузке) - проще перечитать
+            self.invalidate()
+            return
+
+        day = parse_date(args[0])
+        current = self._shifts.get(day)
+        updated = shift_after_write(current, method, *args)
+
+        if current is not None:
+            self._totals.remove(current)
+            del self._shifts[day]
+            del self._days[bisect_left(self._days, day)]
+        if updated is not None:
+            self._totals.add(updated)
+            self._shifts[day] = updated
+            insort(self._days, day)
+        self._version = self.storage.data_version
+
+        # Сбрасываем только сводки, в период которых попадает измененный день
+        for key in list(self._texts):
+            period, today = key
+            if period not in PERIOD_DAYS or day >= today - PERIOD_DAYS[period]:
+                del self._texts[key]
+
+
+summary_cache = SummaryCache(storage)